@@ -0,0 +1,137 @@
+"""
+Normalización de las fechas de las citas.
+
+El modelo agenda con texto libre en hora de Colombia ('2025-10-15 10:30 AM',
+'15/10/2025 14:00', '2025-10-15 10:30 a. m.', ...). parse_fecha_cita lo
+convierte a un datetime con zona horaria y normalize_fecha_cita a ISO-8601 UTC
+('2025-10-15T15:30:00Z'), que es lo que se guarda en
+cita_examen_medico.fecha_cita_utc: como texto ordena igual que el tiempo, así
+que "próximo horario libre", "citas de esta semana" o "citas activas" son
+consultas por rango sobre un índice.
+"""
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+# Zona horaria en la que se expresan las citas
+CITAS_TIMEZONE = os.getenv("CITAS_TIMEZONE", "America/Bogota")
+
+UTC_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Formatos aceptados además de ISO-8601 (datetime.fromisoformat)
+_FORMATS = (
+    "%Y-%m-%d %I:%M %p",
+    "%Y-%m-%d %I:%M:%S %p",
+    "%Y-%m-%d %I %p",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d %I:%M %p",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %I:%M %p",
+    "%d/%m/%Y",
+    "%d-%m-%Y %H:%M",
+    "%d-%m-%Y %I:%M %p",
+    "%d-%m-%Y",
+)
+
+# "a.m.", "a. m.", "am", "p.m." -> "AM"/"PM"
+_MERIDIEM_RE = re.compile(r"\s*(?<![^\W\d_])([ap])\.?\s?m\.?(?![^\W\d_])", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+# Solo fecha, sin hora: '2025-10-15', '2025/10/15', '15/10/2025', '15-10-2025'
+_DATE_ONLY_RE = re.compile(r"\d{4}[-/]\d{1,2}[-/]\d{1,2}|\d{1,2}[-/]\d{1,2}[-/]\d{4}")
+
+logger = logging.getLogger(__name__)
+
+
+def _load_timezone(name: str):
+    if ZoneInfo is not None:
+        try:
+            return ZoneInfo(name)
+        except Exception:
+            logger.warning("⚠️ Zona horaria '%s' no disponible, usando UTC-5", name)
+    # Colombia no tiene horario de verano
+    return timezone(timedelta(hours=-5))
+
+
+LOCAL_TIMEZONE = _load_timezone(CITAS_TIMEZONE)
+
+
+def parse_fecha_cita(texto: Optional[str]) -> Optional[datetime]:
+    """
+    Interpreta la fecha y hora de una cita.
+
+    Las fechas sin zona horaria se toman en CITAS_TIMEZONE.
+
+    Args:
+        texto: Fecha como la escribió el modelo o el usuario
+
+    Returns:
+        datetime en UTC, o None si el texto no se reconoce
+    """
+    if not texto:
+        return None
+    texto = _SPACES_RE.sub(" ", str(texto).strip())
+    texto = _MERIDIEM_RE.sub(lambda m: f" {m.group(1).upper()}M", texto).strip()
+
+    fecha = None
+    try:
+        fecha = datetime.fromisoformat(texto.replace("Z", "+00:00"))
+    except ValueError:
+        for formato in _FORMATS:
+            try:
+                fecha = datetime.strptime(texto, formato)
+                break
+            except ValueError:
+                continue
+    if fecha is None:
+        return None
+
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=LOCAL_TIMEZONE)
+    return fecha.astimezone(timezone.utc)
+
+
+@lru_cache(maxsize=4096)
+def normalize_fecha_cita(texto: Optional[str]) -> Optional[str]:
+    """Fecha de una cita en ISO-8601 UTC ('2025-10-15T15:30:00Z'), o None si no se reconoce"""
+    fecha = parse_fecha_cita(texto)
+    return fecha.strftime(UTC_FORMAT) if fecha else None
+
+
+def slot_key(fecha_cita: str) -> str:
+    """
+    Clave del horario en capacidad_horario.
+
+    Es la fecha normalizada, así '2025-10-15 10:30 AM' y '2025-10-15 10:30'
+    ocupan el mismo horario; si el texto no se reconoce se usa tal cual.
+    """
+    return normalize_fecha_cita(fecha_cita) or fecha_cita
+
+
+def is_date_only(texto: Optional[str]) -> bool:
+    """Indica si el texto es solo una fecha (parse_fecha_cita lo toma como la medianoche de ese día)"""
+    return bool(texto) and _DATE_ONLY_RE.fullmatch(str(texto).strip()) is not None
+
+
+def to_utc_iso(fecha: datetime) -> str:
+    """datetime (sin zona: hora local de las citas) a ISO-8601 UTC"""
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=LOCAL_TIMEZONE)
+    return fecha.astimezone(timezone.utc).strftime(UTC_FORMAT)
+
+
+def from_utc_iso(valor: str) -> datetime:
+    """ISO-8601 UTC guardado en la base a datetime en la hora local de las citas"""
+    return datetime.strptime(valor, UTC_FORMAT).replace(tzinfo=timezone.utc).astimezone(LOCAL_TIMEZONE)
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime(UTC_FORMAT)
@@ -0,0 +1,163 @@
+"""
+Codificadores de audio para las grabaciones.
+
+Todos exponen la misma interfaz que wave.Wave_write usada por el grabador
+(writeframesraw / close), así el formato de almacenamiento es intercambiable.
+FLAC y Opus usan soundfile (libsndfile) si está instalado; si no, se usa WAV.
+
+Durante la llamada el audio se escribe siempre como WAV (copiar PCM es barato
+y corre en el event loop); la compresión a FLAC/Opus se hace al guardar la
+grabación, en los hilos del recording_sink (encode_wav_file).
+"""
+import logging
+import os
+import struct
+import wave
+from typing import Iterator, Optional, Tuple
+
+try:
+    import soundfile
+except ImportError:  # soundfile es opcional
+    soundfile = None
+
+RECORDING_AUDIO_FORMAT = os.getenv("RECORDING_AUDIO_FORMAT", "opus")
+
+# formato -> (extensión, media type, formato libsndfile, subtipo libsndfile)
+AUDIO_FORMATS = {
+    "wav": ("wav", "audio/wav", None, None),
+    "flac": ("flac", "audio/flac", "FLAC", "PCM_16"),
+    "opus": ("opus", "audio/ogg", "OGG", "OPUS"),
+}
+
+logger = logging.getLogger(__name__)
+
+_fallback_warned = set()
+
+
+class WavEncoder:
+    """Escribe PCM16 sin compresión en un WAV"""
+
+    def __init__(self, path: str, sample_rate: int, channels: int):
+        self.path = path
+        self._wav = wave.open(path, 'wb')
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+
+    def writeframesraw(self, data: bytes):
+        # writeframesraw no reescribe el header en cada chunk; se corrige al cerrar
+        self._wav.writeframesraw(data)
+
+    def close(self):
+        self._wav.close()
+
+
+class SoundFileEncoder:
+    """Comprime PCM16 en streaming con libsndfile (FLAC u Ogg/Opus)"""
+
+    def __init__(self, path: str, sample_rate: int, channels: int, format: str, subtype: str):
+        self.path = path
+        self.channels = channels
+        self._file = soundfile.SoundFile(path, mode='w', samplerate=sample_rate,
+                                         channels=channels, format=format, subtype=subtype)
+
+    def writeframesraw(self, data: bytes):
+        frame_size = 2 * self.channels
+        usable = len(data) - len(data) % frame_size
+        if usable:
+            self._file.buffer_write(data[:usable], dtype='int16')
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def resolve_audio_format(audio_format: str) -> str:
+    """Retorna el formato a usar, cayendo a WAV si no está disponible"""
+    audio_format = (audio_format or "wav").lower()
+    if audio_format not in AUDIO_FORMATS:
+        logger.warning("⚠️ Formato de audio desconocido '%s', usando wav", audio_format)
+        return "wav"
+    if audio_format != "wav" and soundfile is None:
+        if audio_format not in _fallback_warned:
+            _fallback_warned.add(audio_format)
+            logger.warning("⚠️ soundfile no está instalado, las grabaciones se guardan en wav en lugar de %s", audio_format)
+        return "wav"
+    return audio_format
+
+
+def audio_extension(audio_format: str) -> str:
+    return AUDIO_FORMATS[audio_format][0]
+
+
+def audio_media_type(audio_format: str) -> str:
+    return AUDIO_FORMATS[audio_format][1]
+
+
+def open_encoder(path: str, audio_format: str, sample_rate: int, channels: int):
+    """Abre el codificador correspondiente al formato"""
+    _, _, sf_format, sf_subtype = AUDIO_FORMATS[audio_format]
+    if sf_format is None:
+        return WavEncoder(path, sample_rate, channels)
+    return SoundFileEncoder(path, sample_rate, channels, sf_format, sf_subtype)
+
+
+def encode_wav_file(wav_path: str, path: str, audio_format: str, block_frames: int = 24000) -> None:
+    """
+    Comprime un WAV PCM16 al formato indicado leyéndolo por bloques (bloqueante).
+
+    Args:
+        wav_path: WAV escrito durante la llamada
+        path: Archivo de salida
+        audio_format: "flac" u "opus"
+        block_frames: Frames leídos y codificados por iteración
+    """
+    with wave.open(wav_path, 'rb') as source:
+        encoder = open_encoder(path, audio_format, source.getframerate(), source.getnchannels())
+        try:
+            while True:
+                block = source.readframes(block_frames)
+                if not block:
+                    break
+                encoder.writeframesraw(block)
+        finally:
+            encoder.close()
+
+
+def find_audio_file(recordings_dir: str, base_name: str) -> Optional[Tuple[str, str]]:
+    """
+    Busca el archivo de audio de una grabación en cualquiera de los formatos.
+
+    Returns:
+        (ruta, formato) o None si la grabación no tiene audio
+    """
+    for audio_format, (extension, _, _, _) in AUDIO_FORMATS.items():
+        path = os.path.join(recordings_dir, f"{base_name}_audio.{extension}")
+        if os.path.exists(path):
+            return path, audio_format
+    return None
+
+
+def _wav_header(sample_rate: int, channels: int, frames: int) -> bytes:
+    """Header RIFF/WAVE para PCM16 con la cantidad de frames conocida"""
+    data_size = frames * channels * 2
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16,
+        b'data', data_size
+    )
+
+
+def transcode_to_wav(path: str, block_frames: int = 24000) -> Iterator[bytes]:
+    """Decodifica un FLAC/Opus y lo entrega como WAV PCM16 por bloques"""
+    if soundfile is None:
+        raise RuntimeError("soundfile no está instalado, no se puede decodificar el audio")
+
+    with soundfile.SoundFile(path) as audio:
+        yield _wav_header(audio.samplerate, audio.channels, audio.frames)
+        while True:
+            block = audio.buffer_read(block_frames, dtype='int16')
+            if not block:
+                break
+            yield bytes(block)
@@ -0,0 +1,103 @@
+"""
+Mezclador de audio en dos canales (llamante / asistente) para grabaciones.
+
+Cada stream PCM16 se ubica en un reloj de muestras común que arranca con la
+llamada. Las muestras se escriben en un ring buffer estéreo preasignado y se
+vuelcan al archivo por bloques, por lo que la memoria por llamada es fija.
+"""
+import time
+from typing import Callable, Optional
+
+CALLER_CHANNEL = 0      # Canal izquierdo
+ASSISTANT_CHANNEL = 1   # Canal derecho
+
+
+class DualChannelMixer:
+    """Alinea audio del llamante y del asistente en un archivo PCM16 estéreo"""
+
+    def __init__(self, writer, sample_rate: int = 24000, buffer_seconds: float = 30.0,
+                 flush_seconds: float = 1.0, jitter_seconds: float = 0.5,
+                 start_time: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            writer: Objeto con writeframesraw(bytes) y close() (ej. wave.Wave_write estéreo)
+            sample_rate: Frecuencia de muestreo de ambos canales
+            buffer_seconds: Capacidad del ring buffer en segundos
+            flush_seconds: Tamaño mínimo del bloque que se vuelca al archivo
+            jitter_seconds: Margen antes de considerar definitivo un tramo de audio
+            start_time: Instante (según clock) que corresponde a la muestra 0
+            clock: Reloj monotónico usado para ubicar los chunks
+        """
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.clock = clock
+        self.start_time = clock() if start_time is None else start_time
+        self.capacity = int(buffer_seconds * sample_rate)
+        self.flush_frames = int(flush_seconds * sample_rate)
+        self.jitter_frames = int(jitter_seconds * sample_rate)
+
+        # 2 canales x 2 bytes por muestra, preasignado una sola vez
+        self._buffer = bytearray(self.capacity * 4)
+        self._samples = memoryview(self._buffer).cast('h')
+        self._flushed = 0                 # Frames ya escritos al archivo
+        self._cursors = [0, 0]            # Siguiente frame libre de cada canal
+        self.frames_written = 0
+        self.forced_flushes = 0
+
+    def _now_frame(self) -> int:
+        return int((self.clock() - self.start_time) * self.sample_rate)
+
+    def write(self, channel: int, pcm: bytes, arrival: Optional[float] = None) -> None:
+        """
+        Ubica un chunk PCM16 mono en el canal indicado.
+
+        El chunk empieza en su instante de llegada, o justo después del chunk
+        anterior del mismo canal si éste aún no terminó de sonar (el asistente
+        envía el audio más rápido que tiempo real).
+        """
+        if len(pcm) % 2:
+            pcm = pcm[:-1]
+        samples = memoryview(pcm).cast('h')
+        if not samples:
+            return
+
+        arrival_frame = self._now_frame() if arrival is None else int((arrival - self.start_time) * self.sample_rate)
+        start = max(self._cursors[channel], arrival_frame, self._flushed)
+        end = start + len(samples)
+
+        # Si el chunk no cabe en el buffer, se vuelca lo más antiguo aunque el otro canal no haya llegado
+        if end - self._flushed > self.capacity:
+            self.forced_flushes += 1
+            self._flush_until(end - self.capacity)
+
+        offset = 0
+        position = start
+        while position < end:
+            slot = position % self.capacity
+            count = min(end - position, self.capacity - slot)
+            self._samples[slot * 2 + channel:(slot + count) * 2 + channel:2] = samples[offset:offset + count]
+            offset += count
+            position += count
+        self._cursors[channel] = end
+
+        # Todo lo anterior al instante actual (menos el margen) ya no puede cambiar
+        safe_frame = min(self._now_frame() - self.jitter_frames, max(self._cursors))
+        if safe_frame - self._flushed >= self.flush_frames:
+            self._flush_until(safe_frame)
+
+    def _flush_until(self, frame: int) -> None:
+        """Escribe al archivo los frames [flushed, frame) y los deja en silencio en el buffer"""
+        while self._flushed < frame:
+            slot = self._flushed % self.capacity
+            count = min(frame - self._flushed, self.capacity - slot)
+            region = slice(slot * 4, (slot + count) * 4)
+            self.writer.writeframesraw(bytes(self._buffer[region]))
+            self._buffer[region] = bytes(count * 4)
+            self._flushed += count
+            self.frames_written += count
+
+    def close(self) -> None:
+        """Vuelca todo el audio pendiente y cierra el archivo"""
+        self._flush_until(max(self._cursors))
+        self.writer.close()
+        self._samples.release()
@@ -0,0 +1,151 @@
+"""
+Índice en memoria de la ocupación de horarios por ciudad.
+
+Permite responder "¿cuáles son los próximos horarios libres en Cali?" en una
+sola llamada, sin que el modelo pruebe horario por horario con
+verificar_disponibilidad_citas. Por ciudad guarda los horarios con citas
+(clave ISO-8601 UTC, igual que capacidad_horario) en una lista ordenada y sus
+contadores; se reconstruye desde capacidad_horario al arrancar y se actualiza
+en crear_cita y eliminar_cita.
+
+La base de datos sigue siendo la autoridad: crear_cita valida el cupo de forma
+atómica, así que si el índice queda desactualizado (p. ej. otro proceso agendó)
+lo peor que pasa es que se ofrezca un horario que crear_cita rechaza.
+"""
+import bisect
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from appointment_dates import LOCAL_TIMEZONE, to_utc_iso
+
+# Grilla de horarios que se ofrecen (hora local de las citas)
+CITAS_SLOT_MINUTES = int(os.getenv("CITAS_SLOT_MINUTES", 30))
+CITAS_HORA_APERTURA = int(os.getenv("CITAS_HORA_APERTURA", 7))
+CITAS_HORA_CIERRE = int(os.getenv("CITAS_HORA_CIERRE", 17))
+# 0 = lunes ... 6 = domingo
+CITAS_DIAS_ATENCION = frozenset(int(day) for day in os.getenv("CITAS_DIAS_ATENCION", "0,1,2,3,4,5").split(",") if day.strip())
+
+logger = logging.getLogger(__name__)
+
+
+class AvailabilityIndex:
+    """Horarios ocupados por ciudad: lista ordenada de claves + contador por clave"""
+
+    def __init__(self, slot_minutes: int = CITAS_SLOT_MINUTES, opening_hour: int = CITAS_HORA_APERTURA,
+                 closing_hour: int = CITAS_HORA_CIERRE, working_days: Iterable[int] = CITAS_DIAS_ATENCION):
+        self.slot_minutes = slot_minutes
+        self.opening_hour = opening_hour
+        self.closing_hour = closing_hour
+        self.working_days = frozenset(working_days)
+        self.db_path: Optional[str] = None
+        self._slots: Dict[str, List[str]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def is_loaded(self, db_path: str) -> bool:
+        return self.db_path == os.path.abspath(db_path)
+
+    def rebuild(self, db_path: str, rows: Iterable[Tuple[str, str, int]]) -> None:
+        """
+        Reemplaza el contenido del índice.
+
+        Args:
+            db_path: Base de datos de la que vienen las filas (las actualizaciones
+                de otras bases se ignoran)
+            rows: (ciudad, horario UTC, citas_agendadas) de capacidad_horario
+        """
+        counts: Dict[str, Dict[str, int]] = {}
+        for ciudad, horario, citas_agendadas in rows:
+            if citas_agendadas > 0:
+                counts.setdefault(ciudad, {})[horario] = citas_agendadas
+
+        with self._lock:
+            self._counts = counts
+            self._slots = {ciudad: sorted(horarios) for ciudad, horarios in counts.items()}
+            self.db_path = os.path.abspath(db_path)
+        logger.info("📅 Índice de disponibilidad cargado: %s horarios con citas en %s ciudades",
+                    sum(len(horarios) for horarios in counts.values()), len(counts))
+
+    def record(self, db_path: str, ciudad: str, horario: Optional[str], delta: int) -> None:
+        """Suma delta (+1 al agendar, -1 al eliminar) a las citas de un horario"""
+        if not horario or not ciudad or not self.is_loaded(db_path):
+            return
+
+        with self._lock:
+            counts = self._counts.setdefault(ciudad, {})
+            slots = self._slots.setdefault(ciudad, [])
+            citas = counts.get(horario, 0) + delta
+            if citas > 0:
+                if horario not in counts:
+                    bisect.insort(slots, horario)
+                counts[horario] = citas
+            elif horario in counts:
+                del counts[horario]
+                slots.pop(bisect.bisect_left(slots, horario))
+
+    def booked(self, ciudad: str, desde: str, hasta: str) -> Dict[str, int]:
+        """Horarios con citas de una ciudad en [desde, hasta) (claves UTC)"""
+        with self._lock:
+            slots = self._slots.get(ciudad, [])
+            counts = self._counts.get(ciudad, {})
+            start = bisect.bisect_left(slots, desde)
+            end = bisect.bisect_left(slots, hasta)
+            return {horario: counts[horario] for horario in slots[start:end]}
+
+    def _next_slot(self, fecha: datetime) -> datetime:
+        """Primer horario de atención en o después de fecha (hora local)"""
+        minutos = fecha.hour * 60 + fecha.minute + (1 if fecha.second or fecha.microsecond else 0)
+        minutos = -(-minutos // self.slot_minutes) * self.slot_minutes
+        fecha = fecha.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=minutos)
+
+        while True:
+            apertura = fecha.replace(hour=self.opening_hour, minute=0)
+            cierre = fecha.replace(hour=self.closing_hour, minute=0)
+            if fecha.weekday() in self.working_days and fecha < cierre:
+                return max(fecha, apertura)
+            fecha = (fecha + timedelta(days=1)).replace(hour=self.opening_hour, minute=0)
+
+    def find_open_slots(self, ciudad: str, desde: datetime, hasta: datetime, cantidad: int,
+                        capacidad: int) -> List[Tuple[datetime, int]]:
+        """
+        Próximos horarios con cupo en una ciudad.
+
+        Args:
+            ciudad: Ciudad tal como se guarda en las citas
+            desde: Inicio de la búsqueda (con zona horaria)
+            hasta: Fin de la búsqueda (con zona horaria)
+            cantidad: Máximo de horarios a retornar
+            capacidad: Citas permitidas por horario
+
+        Returns:
+            Lista de (horario en hora local, citas ya agendadas)
+        """
+        if not self.working_days or self.opening_hour >= self.closing_hour:
+            return []
+
+        desde = desde.astimezone(LOCAL_TIMEZONE)
+        hasta = hasta.astimezone(LOCAL_TIMEZONE)
+        ocupados = self.booked(ciudad, to_utc_iso(desde), to_utc_iso(hasta))
+
+        libres = []
+        fecha = self._next_slot(desde)
+        while fecha < hasta and len(libres) < cantidad:
+            citas = ocupados.get(to_utc_iso(fecha), 0)
+            if citas < capacidad:
+                libres.append((fecha, citas))
+            fecha = self._next_slot(fecha + timedelta(minutes=self.slot_minutes))
+        return libres
+
+    def get_metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "ciudades": len(self._counts),
+                "horarios_con_citas": sum(len(horarios) for horarios in self._counts.values())
+            }
+
+
+# Índice compartido por database.py y database_async.py
+availability_index = AvailabilityIndex()
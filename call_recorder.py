@@ -1,19 +1,196 @@
 import asyncio
+import binascii
 import json
+import logging
 import os
-import wave
 import base64
+import random
+import threading
+import time
+from array import array
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+from recording_sink import recording_sink
+from audio_mixer import DualChannelMixer, CALLER_CHANNEL, ASSISTANT_CHANNEL
+from audio_encoders import (
+    RECORDING_AUDIO_FORMAT, resolve_audio_format, audio_extension, open_encoder, encode_wav_file
+)
+from recordings_catalog import RecordingsCatalog
+from event_bus import event_bus
+
+try:
+    import pybase64
+except ImportError:  # pybase64 es opcional (decodificación base64 con SIMD)
+    pybase64 = None
+
+logger = logging.getLogger(__name__)
+
+# Tópico del bus donde se publican altas/bajas de grabaciones y llamadas en vivo
+RECORDINGS_TOPIC = "recordings"
+
+# Formato de audio de OpenAI Realtime API: PCM16 24kHz mono
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+
+# Eventos del WebSocket que traen audio: tipo -> (origen, campo con el base64).
+# El WebSocket lateral de una llamada SIP solo envía el audio del asistente
+# (input_audio_buffer.append es un evento del cliente, nunca llega del servidor)
+AUDIO_EVENTS = {
+    "response.audio.delta": ("assistant", "delta"),
+    "response.output_audio.delta": ("assistant", "delta"),
+}
+
+# Grabación estéreo (llamante / asistente). Experimental: todavía no hay una fuente
+# de audio del llamante conectada a CallRecorder.ingest_caller_audio, así que el
+# canal del llamante queda en silencio (se avisa al guardar) y el archivo ocupa el doble
+RECORDING_DUAL_CHANNEL = os.getenv("RECORDING_DUAL_CHANNEL", "false").lower() in ("1", "true", "yes")
+
+# Límites por llamada: 30 minutos de audio y 10.000 eventos de texto
+MAX_AUDIO_BYTES = SAMPLE_RATE * SAMPLE_WIDTH * 60 * 30
+MAX_LOG_ENTRIES = 10000
+
+# Política de grabación por llamada:
+#   full: audio y transcripción
+#   transcript: solo la transcripción (el audio no se decodifica)
+#   sampled: audio completo en una fracción de las llamadas, solo transcripción en el resto
+#   off: no se graba nada
+RECORDING_POLICIES = ("full", "transcript", "sampled", "off")
+RECORDING_POLICY = os.getenv("RECORDING_POLICY", "full")
+RECORDING_SAMPLED_FRACTION = float(os.getenv("RECORDING_SAMPLED_FRACTION", 0.1))
+
+# Modo diferido: el base64 se acumula y se decodifica por lotes
+RECORDING_AUDIO_DEFERRED = os.getenv("RECORDING_AUDIO_DEFERRED", "false").lower() in ("1", "true", "yes")
+DEFERRED_FLUSH_SECONDS = 0.25
+DEFERRED_FLUSH_BYTES = 256 * 1024
+
+
+def decode_base64(data: str) -> bytes:
+    """Decodifica base64 estricto; con pybase64 instalado usa su decodificador SIMD"""
+    if pybase64 is not None:
+        return pybase64.b64decode(data, validate=True)
+    return binascii.a2b_base64(data)
+
+
+def resolve_recording_policy(policy: str, sampled_fraction: float = RECORDING_SAMPLED_FRACTION) -> str:
+    """Política efectiva de una llamada ("full", "transcript" u "off"); "sampled" se sortea aquí"""
+    policy = (policy or "full").lower()
+    if policy not in RECORDING_POLICIES:
+        logger.warning("⚠️ Política de grabación desconocida '%s', usando full", policy)
+        return "full"
+    if policy == "sampled":
+        return "full" if random.random() < sampled_fraction else "transcript"
+    return policy
+
+
+class DeferredAudioBuffer:
+    """
+    Acumula los deltas de audio de un canal sin decodificarlos.
+
+    Guarda los strings base64 tal como llegan y su instante de llegada en un
+    array compacto; decode() los decodifica con una sola llamada a
+    decode_base64 por tramo y retorna cada chunk PCM (como memoryview)
+    con su instante de llegada.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.arrivals = array('d')
+        self.encoded_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def append(self, audio_data: str, arrival: float) -> None:
+        self.chunks.append(audio_data)
+        self.arrivals.append(arrival)
+        self.encoded_bytes += len(audio_data)
+
+    def decode(self) -> List[Tuple[memoryview, float]]:
+        """Decodifica y vacía el buffer"""
+        chunks, arrivals = self.chunks, self.arrivals
+        self.chunks, self.arrivals, self.encoded_bytes = [], array('d'), 0
+
+        decoded = []
+        group_start = 0
+        for index, chunk in enumerate(chunks):
+            # El base64 solo se puede concatenar hasta un chunk con padding ("=")
+            if chunk.endswith("=") or len(chunk) % 4 or index == len(chunks) - 1:
+                group = chunks[group_start:index + 1]
+                try:
+                    pcm = memoryview(decode_base64("".join(group)))
+                except (binascii.Error, ValueError):
+                    # Un chunk inválido no debe perder el resto del tramo
+                    pcm = None
+                position = 0
+                for offset, part in enumerate(group, group_start):
+                    if pcm is None:
+                        try:
+                            decoded.append((memoryview(base64.b64decode(part)), arrivals[offset]))
+                        except (binascii.Error, ValueError) as e:
+                            logger.warning("⚠️ Error procesando audio: %s", e, extra={"rate_limit_key": "audio.error"})
+                        continue
+                    size = len(part) // 4 * 3 - (2 if part.endswith("==") else 1 if part.endswith("=") else 0)
+                    decoded.append((pcm[position:position + size], arrivals[offset]))
+                    position += size
+                group_start = index + 1
+        return decoded
+
 
 class CallRecorder:
     """Clase para grabar llamadas desde el WebSocket de OpenAI Realtime API"""
     
-    def __init__(self, recordings_dir: str = "recordings"):
+    def __init__(self, recordings_dir: str = "recordings",
+                 max_audio_bytes: int = MAX_AUDIO_BYTES,
+                 max_log_entries: int = MAX_LOG_ENTRIES,
+                 stream_audio: bool = True,
+                 dual_channel: bool = RECORDING_DUAL_CHANNEL,
+                 audio_format: str = RECORDING_AUDIO_FORMAT,
+                 catalog: Optional[RecordingsCatalog] = None,
+                 policy: str = RECORDING_POLICY,
+                 deferred_audio: bool = RECORDING_AUDIO_DEFERRED):
+        """
+        Args:
+            recordings_dir: Directorio donde se guardan las grabaciones
+            max_audio_bytes: Máximo de bytes de audio por llamada
+            max_log_entries: Máximo de eventos de texto por llamada
+            stream_audio: Si es True, el audio se escribe al WAV a medida que llega
+                (memoria constante); si es False se acumula y se escribe al final
+            dual_channel: En modo streaming, graba un WAV estéreo con el llamante
+                en el canal izquierdo y el asistente en el derecho (experimental:
+                requiere alimentar ingest_caller_audio, que nada llama todavía)
+            audio_format: Formato de almacenamiento del audio ("wav", "flac" u "opus")
+            catalog: Catálogo donde se registra la grabación al guardarla
+            policy: Política de grabación ("full", "transcript", "sampled" u "off")
+            deferred_audio: Acumula el audio en base64 y lo decodifica por lotes
+                en lugar de decodificar cada delta al llegar
+        """
         self.recordings_dir = recordings_dir
+        self.max_audio_bytes = max_audio_bytes
+        self.max_log_entries = max_log_entries
+        self.stream_audio = stream_audio
+        self.dual_channel = dual_channel and stream_audio
+        self.audio_format = resolve_audio_format(audio_format)
+        self.catalog = catalog
+        self.policy = resolve_recording_policy(policy)
+        self.records_audio = self.policy == "full"
+        self.records_transcript = self.policy != "off"
+        self.deferred_audio = deferred_audio
+        self._deferred: Dict[str, DeferredAudioBuffer] = {"assistant": DeferredAudioBuffer(), "caller": DeferredAudioBuffer()}
         self.current_call_id: Optional[str] = None
+        self.base_filename: Optional[str] = None
+        self.audio_file: Optional[str] = None
+        self.live_audio_file: Optional[str] = None
+        self._audio_writer = None
+        self._mixer: Optional[DualChannelMixer] = None
+        self._clock_start: Optional[float] = None
         self.audio_chunks = []
+        self.audio_chunk_count = 0
+        self.caller_audio_chunks = 0
+        self.audio_bytes = 0
         self.conversation_log = []
+        self.dropped_audio_chunks = 0
+        self.dropped_log_entries = 0
         self.start_time: Optional[datetime] = None
         
         # Crear directorio si no existe
@@ -23,37 +200,137 @@ class CallRecorder:
         """Inicia una nueva grabación"""
         self.current_call_id = call_id
         self.audio_chunks = []
+        self.audio_chunk_count = 0
+        self.caller_audio_chunks = 0
+        self.audio_bytes = 0
         self.conversation_log = []
+        self.dropped_audio_chunks = 0
+        self.dropped_log_entries = 0
         self.start_time = datetime.now()
+        self._clock_start = time.monotonic()
+        self.base_filename = f"{self.start_time.strftime('%Y%m%d_%H%M%S')}_{call_id}"
+        self.audio_file = os.path.join(
+            self.recordings_dir, f"{self.base_filename}_audio.{audio_extension(self.audio_format)}"
+        )
+        # Durante la llamada se escribe WAV; si el formato es FLAC/Opus se comprime al guardar
+        self.live_audio_file = os.path.join(self.recordings_dir, f"{self.base_filename}_audio.wav")
         
-        print(f"🔴 Iniciando grabación para call_id: {call_id}")
+        logger.info("🔴 Iniciando grabación para call_id: %s (política: %s)", call_id, self.policy)
+
+    def _write_audio(self, audio_bytes: bytes, source: str, arrival: Optional[float] = None):
+        """
+        Agrega frames PCM16 al WAV de la llamada (se abre con el primer chunk).
+
+        Corre en el event loop, así que solo copia PCM: la compresión a
+        FLAC/Opus se hace en write_recording_files, fuera del loop.
+        """
+        if self._audio_writer is None:
+            self._audio_writer = open_encoder(
+                self.live_audio_file, "wav", SAMPLE_RATE, 2 if self.dual_channel else CHANNELS
+            )
+            if self.dual_channel:
+                # La muestra 0 corresponde al inicio de la llamada en ambos canales
+                self._mixer = DualChannelMixer(self._audio_writer, sample_rate=SAMPLE_RATE,
+                                               start_time=self._clock_start)
+
+        if self._mixer is not None:
+            channel = CALLER_CHANNEL if source == "caller" else ASSISTANT_CHANNEL
+            self._mixer.write(channel, audio_bytes, arrival)
+        else:
+            self._audio_writer.writeframesraw(audio_bytes)
+
+    def ingest_caller_audio(self, audio_bytes: bytes):
+        """
+        Agrega audio PCM16 24kHz del llamante (ej. desde un tap de medios SIP).
+
+        El WebSocket lateral de una llamada SIP no reenvía el audio de entrada,
+        así que el canal del llamante solo se alimenta por este método; en una
+        grabación mono (dual_channel=False) el audio se descarta.
+        """
+        if not self.records_audio:
+            return
+        # El audio diferido del asistente debe ubicarse en el mezclador antes que éste
+        if self.deferred_audio:
+            self.flush_deferred_audio()
+        self._store_audio(audio_bytes, "caller")
+
+    def _store_audio(self, audio_bytes: bytes, source: str, arrival: Optional[float] = None):
+        """Guarda un chunk de audio decodificado respetando el límite de la llamada"""
+        if self.audio_bytes + len(audio_bytes) > self.max_audio_bytes:
+            self.dropped_audio_chunks += 1
+            return
+        if source == "caller" and not self.dual_channel:
+            # Una grabación mono solo contiene al asistente
+            return
+        self.audio_bytes += len(audio_bytes)
+        self.audio_chunk_count += 1
+        if source == "caller":
+            self.caller_audio_chunks += 1
+        if self.stream_audio:
+            self._write_audio(audio_bytes, source, arrival)
+        else:
+            # (segundos desde el inicio de la llamada, origen, PCM)
+            arrival = time.monotonic() if arrival is None else arrival
+            self.audio_chunks.append((arrival - self._clock_start, source, bytes(audio_bytes)))
+
+    def _append_log(self, entry: dict):
+        """Agrega una entrada al log respetando el límite de la llamada"""
+        if len(self.conversation_log) >= self.max_log_entries:
+            self.dropped_log_entries += 1
+            return
+        self.conversation_log.append(entry)
     
+    def record_audio(self, audio_data: str, source: str):
+        """
+        Decodifica y almacena un delta de audio en base64.
+
+        Es el camino rápido de handle_websocket_message: se llama decenas de
+        veces por segundo por llamada, así que no escribe en consola. Si la
+        política no graba audio no hace nada; en modo diferido solo guarda el
+        string y decodifica por lotes.
+        """
+        if not audio_data or not self.records_audio:
+            return
+
+        if self.deferred_audio:
+            arrival = time.monotonic()
+            pending = self._deferred[source]
+            pending.append(audio_data, arrival)
+            if (arrival - pending.arrivals[0] >= DEFERRED_FLUSH_SECONDS
+                    or pending.encoded_bytes >= DEFERRED_FLUSH_BYTES):
+                self.flush_deferred_audio()
+            return
+
+        try:
+            self._store_audio(decode_base64(audio_data), source)
+        except Exception as e:
+            logger.warning("⚠️ Error procesando audio: %s", e, extra={"rate_limit_key": "audio.error"})
+
+    def flush_deferred_audio(self):
+        """Decodifica en bloque el audio diferido y lo pasa al archivo o a la memoria"""
+        for source, pending in self._deferred.items():
+            if not pending:
+                continue
+            for pcm, arrival in pending.decode():
+                self._store_audio(pcm, source, arrival)
+
     async def process_audio_chunk(self, message_data: dict):
         """Procesa chunks de audio del WebSocket"""
         message_type = message_data.get("type")
 
-        # Probar ambos tipos de eventos: response.audio.delta y response.audio_transcript.delta
-        if message_type in ["response.audio.delta", "response.output_audio.delta"]:
-            audio_data = message_data.get("delta", "")
+        # Audio del asistente (response.audio.delta / response.output_audio.delta)
+        if message_type in AUDIO_EVENTS:
+            source, field = AUDIO_EVENTS[message_type]
+            audio_data = message_data.get(field, "")
             if audio_data:
-                # Decodificar audio base64 y almacenar
-                try:
-                    audio_bytes = base64.b64decode(audio_data)
-                    self.audio_chunks.append({
-                        "timestamp": datetime.now().isoformat(),
-                        "source": "assistant",
-                        "data": audio_bytes
-                    })
-                    # Log cada 10 chunks para no saturar
-                    if len(self.audio_chunks) % 10 == 0:
-                        print(f"🎵 Audio chunks capturados: {len(self.audio_chunks)} (evento: {message_type})")
-                except Exception as e:
-                    print(f"⚠️ Error procesando audio: {e}")
+                self.record_audio(audio_data, source)
             else:
-                print(f"⚠️ {message_type} sin data")
+                logger.debug("⚠️ %s sin data", message_type, extra={"rate_limit_key": "audio.empty"})
     
     async def log_conversation(self, message_data: dict):
         """Registra la conversación en texto"""
+        if not self.records_transcript:
+            return
         message_type = message_data.get("type", "")
         timestamp = datetime.now().isoformat()
         
@@ -61,7 +338,7 @@ class CallRecorder:
         if message_type == "response.output_audio_transcript.delta":
             transcript = message_data.get("delta", "")
             if transcript.strip():
-                self.conversation_log.append({
+                self._append_log({
                     "timestamp": timestamp,
                     "speaker": "assistant",
                     "text": transcript,
@@ -72,7 +349,7 @@ class CallRecorder:
         elif message_type == "conversation.item.input_audio_transcription.completed":
             transcript = message_data.get("transcript", "")
             if transcript.strip():
-                self.conversation_log.append({
+                self._append_log({
                     "timestamp": timestamp,
                     "speaker": "user",
                     "text": transcript,
@@ -81,85 +358,160 @@ class CallRecorder:
         
         # Otros eventos importantes
         elif message_type in ["session.created", "response.created", "response.done"]:
-            self.conversation_log.append({
+            self._append_log({
                 "timestamp": timestamp,
                 "event": message_type,
                 "data": message_data
             })
     
     async def save_recording(self) -> dict:
-        """Guarda la grabación completa"""
+        """
+        Guarda la grabación completa.
+
+        Los datos de la llamada se separan del grabador en el loop y la escritura
+        a disco (JSON, WAV y resumen) se delega al recording_sink, que la ejecuta
+        en su pool de hilos. La corrutina espera el resultado sin bloquear el loop.
+        """
         if not self.current_call_id:
             return {"error": "No hay grabación activa"}
 
-        print(f"💾 Guardando grabación - Audio chunks: {len(self.audio_chunks)}, Conversación: {len(self.conversation_log)}")
+        if self.policy == "off":
+            call_id, self.current_call_id = self.current_call_id, None
+            return {"call_id": call_id, "policy": "off"}
 
-        timestamp_str = self.start_time.strftime("%Y%m%d_%H%M%S")
-        base_filename = f"{timestamp_str}_{self.current_call_id}"
+        if self.deferred_audio:
+            self.flush_deferred_audio()
+
+        logger.info("💾 Guardando grabación - Audio chunks: %s, Conversación: %s", self.audio_chunk_count, len(self.conversation_log))
+        if self.dual_channel and self.audio_chunk_count and not self.caller_audio_chunks:
+            logger.warning("⚠️ Grabación estéreo sin audio del llamante: el canal izquierdo queda en silencio "
+                           "(nada alimenta ingest_caller_audio)", extra={"call_id": self.current_call_id})
+
+        snapshot = {
+            "call_id": self.current_call_id,
+            "base_filename": self.base_filename,
+            "recordings_dir": self.recordings_dir,
+            "start_time": self.start_time,
+            "end_time": datetime.now(),
+            "conversation_log": self.conversation_log,
+            "audio_file": self.audio_file,
+            "live_audio_file": self.live_audio_file,
+            "audio_chunk_count": self.audio_chunk_count,
+            "audio_bytes": self.audio_bytes,
+            "audio_chunks": self.audio_chunks,
+            "audio_writer": self._audio_writer,
+            "audio_format": self.audio_format,
+            "audio_mixer": self._mixer,
+            "dual_channel": self.dual_channel,
+            "dropped_audio_chunks": self.dropped_audio_chunks,
+            "dropped_log_entries": self.dropped_log_entries,
+            "catalog": self.catalog,
+            "policy": self.policy,
+        }
+
+        # Limpiar datos de la grabación actual (el snapshot es dueño de los buffers)
+        self.current_call_id = None
+        self.base_filename = None
+        self.audio_file = None
+        self.live_audio_file = None
+        self._audio_writer = None
+        self._mixer = None
+        self.audio_chunks = []
+        self.audio_chunk_count = 0
+        self.caller_audio_chunks = 0
+        self.audio_bytes = 0
+        self.conversation_log = []
+        self.start_time = None
 
-        results = {}
-        
         try:
-            # 1. Guardar log de conversación
-            conversation_file = os.path.join(self.recordings_dir, f"{base_filename}_conversation.json")
-            
-            conversation_data = {
-                "call_id": self.current_call_id,
-                "start_time": self.start_time.isoformat(),
-                "end_time": datetime.now().isoformat(),
-                "duration_seconds": (datetime.now() - self.start_time).total_seconds(),
-                "conversation": self.conversation_log,
-                "total_messages": len(self.conversation_log),
-                "audio_chunks_count": len(self.audio_chunks)
-            }
-            
-            with open(conversation_file, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(conversation_data, indent=2, ensure_ascii=False))
-            
-            results["conversation_file"] = conversation_file
-            
-            # 2. Guardar audio chunks como archivo WAV reproducible
-            if self.audio_chunks:
-                audio_file = os.path.join(self.recordings_dir, f"{base_filename}_audio.wav")
-
-                # Combinar todos los chunks de audio
-                audio_data = b''
-                for chunk in self.audio_chunks:
-                    audio_data += chunk["data"]
-
-                # Guardar como WAV
-                # OpenAI Realtime API usa PCM16 24kHz mono
-                with wave.open(audio_file, 'wb') as wav_file:
-                    wav_file.setnchannels(1)  # Mono
-                    wav_file.setsampwidth(2)  # 16-bit (2 bytes)
-                    wav_file.setframerate(24000)  # 24kHz
-                    wav_file.writeframes(audio_data)
-
-                results["audio_file"] = audio_file
-                results["audio_chunks"] = len(self.audio_chunks)
-
-                print(f"🎵 Audio guardado: {len(audio_data)} bytes → {audio_file}")
-            
-            # 3. Crear resumen de la grabación
-            summary_file = os.path.join(self.recordings_dir, f"{base_filename}_summary.txt")
-            
-            # Extraer texto completo de la conversación
-            user_texts = []
-            assistant_texts = []
-            
-            for entry in self.conversation_log:
-                if entry.get("speaker") == "user":
-                    user_texts.append(entry.get("text", ""))
-                elif entry.get("speaker") == "assistant":
-                    assistant_texts.append(entry.get("text", ""))
-            
-            summary_content = f"""RESUMEN DE LLAMADA
+            return await recording_sink.submit(write_recording_files, snapshot)
+        except Exception as e:
+            logger.exception("❌ Error guardando grabación")
+            return {"error": str(e)}
+
+
+def write_recording_files(snapshot: dict) -> dict:
+    """Escribe a disco la conversación, el audio y el resumen de una llamada (bloqueante)"""
+    call_id = snapshot["call_id"]
+    base_filename = snapshot["base_filename"]
+    recordings_dir = snapshot["recordings_dir"]
+    start_time = snapshot["start_time"]
+    conversation_log = snapshot["conversation_log"]
+    audio_file = snapshot["audio_file"]
+    audio_chunk_count = snapshot["audio_chunk_count"]
+    has_audio = audio_chunk_count > 0
+    duration_seconds = (snapshot["end_time"] - start_time).total_seconds()
+
+    results = {}
+
+    try:
+        # 1. Guardar log de conversación
+        conversation_file = os.path.join(recordings_dir, f"{base_filename}_conversation.json")
+
+        conversation_data = {
+            "call_id": call_id,
+            "start_time": start_time.isoformat(),
+            "end_time": snapshot["end_time"].isoformat(),
+            "duration_seconds": duration_seconds,
+            "conversation": conversation_log,
+            "total_messages": len(conversation_log),
+            "audio_chunks_count": audio_chunk_count,
+            "dropped_audio_chunks": snapshot["dropped_audio_chunks"],
+            "dropped_log_entries": snapshot["dropped_log_entries"]
+        }
+
+        with open(conversation_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(conversation_data, indent=2, ensure_ascii=False))
+
+        results["conversation_file"] = conversation_file
+
+        # 2. Guardar audio como archivo WAV reproducible
+        if has_audio:
+            audio_writer = snapshot["audio_writer"]
+            if snapshot["audio_mixer"] is not None:
+                # Vuelca lo que queda en el ring buffer estéreo y cierra el archivo
+                snapshot["audio_mixer"].close()
+            elif audio_writer is not None:
+                # El audio ya está en disco; al cerrar se corrige el header
+                audio_writer.close()
+
+            if audio_writer is not None and snapshot["live_audio_file"] != audio_file:
+                # Comprimir el WAV de la llamada a FLAC/Opus (aquí, en el hilo del sink)
+                encode_wav_file(snapshot["live_audio_file"], audio_file, snapshot["audio_format"])
+                os.remove(snapshot["live_audio_file"])
+            elif audio_writer is None:
+                # Modo en memoria: unir los chunks una sola vez (evita concatenación cuadrática)
+                encoder = open_encoder(audio_file, snapshot["audio_format"], SAMPLE_RATE, CHANNELS)
+                encoder.writeframesraw(b''.join(data for _, _, data in snapshot["audio_chunks"]))
+                encoder.close()
+
+            results["audio_file"] = audio_file
+            results["audio_chunks"] = audio_chunk_count
+            results["audio_channels"] = 2 if snapshot["dual_channel"] else 1
+            results["audio_format"] = snapshot["audio_format"]
+
+            logger.debug("🎵 Audio guardado: %s bytes → %s", snapshot['audio_bytes'], audio_file)
+
+        # 3. Crear resumen de la grabación
+        summary_file = os.path.join(recordings_dir, f"{base_filename}_summary.txt")
+
+        # Extraer texto completo de la conversación
+        user_texts = []
+        assistant_texts = []
+
+        for entry in conversation_log:
+            if entry.get("speaker") == "user":
+                user_texts.append(entry.get("text", ""))
+            elif entry.get("speaker") == "assistant":
+                assistant_texts.append(entry.get("text", ""))
+
+        summary_content = f"""RESUMEN DE LLAMADA
 =====================================
-Call ID: {self.current_call_id}
-Inicio: {self.start_time.strftime('%Y-%m-%d %H:%M:%S')}
-Duración: {conversation_data['duration_seconds']:.1f} segundos
-Total mensajes: {len(self.conversation_log)}
-Chunks de audio: {len(self.audio_chunks)}
+Call ID: {call_id}
+Inicio: {start_time.strftime('%Y-%m-%d %H:%M:%S')}
+Duración: {duration_seconds:.1f} segundos
+Total mensajes: {len(conversation_log)}
+Chunks de audio: {audio_chunk_count}
 
 CONVERSACIÓN USUARIO:
 {' '.join(user_texts)}
@@ -169,68 +521,111 @@ CONVERSACIÓN ASISTENTE:
 
 ARCHIVOS GENERADOS:
 - Conversación: {os.path.basename(conversation_file)}
-- Audio: {os.path.basename(audio_file) if self.audio_chunks else 'No disponible'}
+- Audio: {os.path.basename(audio_file) if has_audio else 'No disponible'}
 - Resumen: {os.path.basename(summary_file)}
 """
-            
-            with open(summary_file, 'w', encoding='utf-8') as f:
-                f.write(summary_content)
-            
-            results["summary_file"] = summary_file
-            results["call_id"] = self.current_call_id
-            results["duration"] = conversation_data['duration_seconds']
-            
-            print(f"✅ Grabación guardada: {base_filename}")
-            
-        except Exception as e:
-            print(f"❌ Error guardando grabación: {e}")
-            results["error"] = str(e)
-        
-        # Limpiar datos de la grabación actual
-        self.current_call_id = None
-        self.audio_chunks = []
-        self.conversation_log = []
-        self.start_time = None
-        
+
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write(summary_content)
+
+        results["summary_file"] = summary_file
+        results["call_id"] = call_id
+        results["duration"] = duration_seconds
+        results["policy"] = snapshot["policy"]
+
+        # 4. Registrar la grabación en el catálogo
+        if snapshot["catalog"] is not None:
+            snapshot["catalog"].add({
+                "base_name": base_filename,
+                "call_id": call_id,
+                "started_at": start_time.isoformat(timespec="seconds"),
+                "duration_seconds": duration_seconds,
+                "total_messages": len(conversation_log),
+                "summary_file": os.path.basename(summary_file),
+                "conversation_file": os.path.basename(conversation_file),
+                "audio_file": os.path.basename(audio_file) if has_audio else None,
+                "audio_format": snapshot["audio_format"] if has_audio else None,
+            })
+
+        logger.info("✅ Grabación guardada: %s", base_filename, extra={"call_id": snapshot["call_id"]})
+
+    except Exception as e:
+        logger.exception("❌ Error guardando grabación")
+        results["error"] = str(e)
+    finally:
+        if snapshot["audio_writer"] is not None:
+            snapshot["audio_writer"].close()
+
+    return results
+
+
+class RecorderPool:
+    """Mantiene un CallRecorder independiente por cada llamada activa (clave: call_id)"""
+
+    def __init__(self, recordings_dir: str = "recordings", **recorder_options):
+        self.recordings_dir = recordings_dir
+        self.recorder_options = recorder_options
+        self.recorders: Dict[str, CallRecorder] = {}
+        # El catálogo (recordings/catalog.db) se abre al usarlo por primera vez o al
+        # arrancar el servidor: importar el módulo no crea archivos
+        self._catalog: Optional[RecordingsCatalog] = None
+        self._catalog_lock = threading.Lock()
+
+    @property
+    def catalog(self) -> RecordingsCatalog:
+        return self._catalog or self.open_catalog()
+
+    def open_catalog(self) -> RecordingsCatalog:
+        """Abre el catálogo (bloqueante: la primera vez indexa las grabaciones en disco)"""
+        with self._catalog_lock:
+            if self._catalog is None:
+                self._catalog = RecordingsCatalog(self.recordings_dir)
+            return self._catalog
+
+    def acquire(self, call_id: str) -> CallRecorder:
+        """Crea e inicia el grabador de una llamada (o retorna el existente)"""
+        recorder = self.recorders.get(call_id)
+        if recorder is None:
+            recorder = CallRecorder(recordings_dir=self.recordings_dir, catalog=self.catalog,
+                                    **self.recorder_options)
+            recorder.start_recording(call_id)
+            self.recorders[call_id] = recorder
+        return recorder
+
+    def get(self, call_id: str) -> Optional[CallRecorder]:
+        return self.recorders.get(call_id)
+
+    async def release(self, call_id: str) -> dict:
+        """Guarda la grabación de la llamada y libera su grabador"""
+        recorder = self.recorders.pop(call_id, None)
+        if recorder is None:
+            return {"error": f"No hay grabación activa para {call_id}"}
+
+        base_filename = recorder.base_filename
+        results = await recorder.save_recording()
+
+        if "error" not in results:
+            recording = await asyncio.to_thread(self.catalog.get, base_filename)
+            if recording:
+                event_bus.publish(RECORDINGS_TOPIC, {"type": "recording.saved", "recording": recording})
         return results
-    
-    def get_recordings_list(self) -> list:
-        """Lista todas las grabaciones disponibles"""
-        recordings = []
-        
-        try:
-            for file in os.listdir(self.recordings_dir):
-                if file.endswith('_summary.txt'):
-                    # Extraer información del nombre del archivo
-                    base_name = file.replace('_summary.txt', '')
-                    parts = base_name.split('_')
-                    
-                    if len(parts) >= 2:
-                        timestamp_str = parts[0]
-                        call_id = '_'.join(parts[1:])
-                        
-                        # Verificar archivos relacionados
-                        conversation_file = f"{base_name}_conversation.json"
-                        audio_file = f"{base_name}_audio.wav"
-
-                        recordings.append({
-                            "timestamp": timestamp_str,
-                            "call_id": call_id,
-                            "base_name": base_name,
-                            "files": {
-                                "summary": file,
-                                "conversation": conversation_file if os.path.exists(os.path.join(self.recordings_dir, conversation_file)) else None,
-                                "audio": audio_file if os.path.exists(os.path.join(self.recordings_dir, audio_file)) else None
-                            }
-                        })
-            
-            # Ordenar por timestamp (más reciente primero)
-            recordings.sort(key=lambda x: x["timestamp"], reverse=True)
-            
-        except Exception as e:
-            print(f"❌ Error listando grabaciones: {e}")
-        
-        return recordings
 
-# Instancia global del grabador
-call_recorder = CallRecorder()
\ No newline at end of file
+    def active_call_ids(self) -> list:
+        return list(self.recorders.keys())
+
+    async def get_recordings_list(self, **filters) -> dict:
+        """
+        Lista las grabaciones desde el catálogo (ver RecordingsCatalog.list).
+
+        El catálogo es sqlite3 síncrono y los hilos del recording_sink toman su
+        lock al registrar grabaciones, así que desde el loop se consulta en un hilo.
+        """
+        return await asyncio.to_thread(self.catalog.list, **filters)
+
+    async def delete_recording(self, base_name: str) -> bool:
+        """Elimina una grabación del catálogo"""
+        return await asyncio.to_thread(self.catalog.delete, base_name)
+
+
+# Pool global de grabadores (uno por llamada)
+recorder_pool = RecorderPool()
\ No newline at end of file
@@ -3,12 +3,15 @@ Módulo para gestionar el caché de conversaciones de WhatsApp en Redis
 """
 import redis
 import json
+import logging
 import os
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class ConversationCache:
     """Gestiona el caché de conversaciones en Redis con TTL de 1 hora"""
 
@@ -31,10 +34,9 @@ class ConversationCache:
             )
             # Test connection
             self.redis_client.ping()
-            print(f"✅ Conectado a Redis exitosamente")
+            logger.info("✅ Conectado a Redis exitosamente")
         except Exception as e:
-            print(f"⚠️ Error conectando a Redis: {e}")
-            print(f"⚠️ Se continuará sin caché de conversaciones")
+            logger.warning("⚠️ Error conectando a Redis: %s. Se continuará sin caché de conversaciones", e)
             self.redis_client = None
 
     def _get_key(self, remote_jid: str) -> str:
@@ -60,14 +62,14 @@ class ConversationCache:
 
             if conversation_json:
                 conversation = json.loads(conversation_json)
-                print(f"📥 Conversación recuperada de Redis: {len(conversation)} mensajes")
+                logger.debug("📥 Conversación recuperada de Redis: %s mensajes", len(conversation))
                 return conversation
             else:
-                print(f"📭 No hay conversación en caché para {remote_jid}")
+                logger.debug("📭 No hay conversación en caché para %s", remote_jid)
                 return None
 
         except Exception as e:
-            print(f"⚠️ Error obteniendo conversación de Redis: {e}")
+            logger.warning("⚠️ Error obteniendo conversación de Redis: %s", e)
             return None
 
     def save_conversation(self, remote_jid: str, conversation: List[Dict]) -> bool:
@@ -95,11 +97,11 @@ class ConversationCache:
                 conversation_json
             )
 
-            print(f"💾 Conversación guardada en Redis: {len(conversation)} mensajes (TTL: {self.ttl_seconds}s)")
+            logger.debug("💾 Conversación guardada en Redis: %s mensajes (TTL: %ss)", len(conversation), self.ttl_seconds)
             return True
 
         except Exception as e:
-            print(f"⚠️ Error guardando conversación en Redis: {e}")
+            logger.warning("⚠️ Error guardando conversación en Redis: %s", e)
             return False
 
     def append_message(self, remote_jid: str, role: str, content: str,
@@ -141,7 +143,7 @@ class ConversationCache:
             return self.save_conversation(remote_jid, conversation)
 
         except Exception as e:
-            print(f"⚠️ Error agregando mensaje a conversación: {e}")
+            logger.warning("⚠️ Error agregando mensaje a conversación: %s", e)
             return False
 
     def delete_conversation(self, remote_jid: str) -> bool:
@@ -160,11 +162,11 @@ class ConversationCache:
         try:
             key = self._get_key(remote_jid)
             self.redis_client.delete(key)
-            print(f"🗑️ Conversación eliminada de Redis")
+            logger.info("🗑️ Conversación eliminada de Redis")
             return True
 
         except Exception as e:
-            print(f"⚠️ Error eliminando conversación de Redis: {e}")
+            logger.warning("⚠️ Error eliminando conversación de Redis: %s", e)
             return False
 
     def get_ttl(self, remote_jid: str) -> Optional[int]:
@@ -190,7 +192,7 @@ class ConversationCache:
                 return None
 
         except Exception as e:
-            print(f"⚠️ Error obteniendo TTL: {e}")
+            logger.warning("⚠️ Error obteniendo TTL: %s", e)
             return None
 
 
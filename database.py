@@ -34,108 +34,543 @@ Tabla cita_examen_medico
 
 '''
 
+import logging
 import sqlite3
 import os 
-from typing import Optional, Tuple, List, Dict, Any, Union
+import threading
+from contextlib import contextmanager
+from typing import Optional, Tuple, List, Dict, Any, Union, Iterator
 import re
 
+from datetime import datetime, timedelta, timezone
+
+from appointment_dates import is_date_only, normalize_fecha_cita, parse_fecha_cita, slot_key, utc_now_iso
+from availability_index import availability_index
+
 DB_NAME = "database.db"
 
+logger = logging.getLogger(__name__)
+
+# Espera ante bloqueos de escritura antes de fallar con "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# Sentencias preparadas que cada conexión mantiene compiladas (por texto SQL)
+SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", 128))
+
+
+class ConnectionManager:
+    """
+    Conexiones SQLite persistentes: una por hilo y por archivo de base de datos.
+
+    Cada hilo (el event loop, los hilos del executor de FunctionManager) reutiliza
+    su propia conexión, así que no se paga sqlite3.connect en cada consulta y las
+    sentencias preparadas quedan en el caché de la conexión. Las conexiones usan
+    WAL (lectores no bloquean al escritor) y synchronous=NORMAL.
+    """
+
+    def __init__(self, busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS,
+                 cached_statements: int = SQLITE_CACHED_STATEMENTS):
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        # Cambia con close_all() para que cada hilo descarte sus conexiones cerradas
+        self._generation = 0
+
+    def get_connection(self, db_path: str = DB_NAME) -> sqlite3.Connection:
+        """Retorna la conexión del hilo actual para db_path (la abre si no existe)"""
+        if getattr(self._local, "generation", None) != self._generation:
+            self._local.connections = {}
+            self._local.generation = self._generation
+
+        key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+        conn = self._local.connections.get(key)
+        if conn is None:
+            conn = self._connect(key)
+            self._local.connections[key] = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self, db_path: str) -> sqlite3.Connection:
+        # check_same_thread=False solo para poder cerrarlas desde close_all() al apagar
+        conn = sqlite3.connect(
+            db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    @contextmanager
+    def transaction(self, db_path: str = DB_NAME) -> Iterator[sqlite3.Connection]:
+        """Conexión del hilo con commit al salir o rollback si hubo una excepción"""
+        conn = self.get_connection(db_path)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def close_thread(self) -> None:
+        """Cierra las conexiones del hilo actual"""
+        connections = getattr(self._local, "connections", {})
+        with self._lock:
+            for conn in connections.values():
+                conn.close()
+                if conn in self._connections:
+                    self._connections.remove(conn)
+        self._local.connections = {}
+
+    def close_all(self) -> None:
+        """Cierra todas las conexiones abiertas (al apagar el servidor)"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._generation += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"open_connections": len(self._connections)}
+
+
+# Conexiones compartidas por todas las funciones de este módulo
+connection_manager = ConnectionManager()
+
+
+def close_connections() -> None:
+    """Cierra las conexiones SQLite de todos los hilos"""
+    connection_manager.close_all()
+
+
+
+# SQL y conversión de filas compartidos con database_async
+SQL_OBTENER_USUARIO = '''
+    SELECT * FROM usuarios WHERE cedula = ?
+'''
+SQL_OBTENER_EXAMENES_MEDICOS = '''
+    SELECT * FROM examenes_medicos WHERE id_usuario = ?
+'''
+SQL_OBTENER_CITA_EXAMEN_MEDICO = '''
+    SELECT * FROM cita_examen_medico WHERE id_usuario = ?
+'''
+SQL_LISTAR_USUARIOS = '''
+    SELECT * FROM usuarios
+'''
+SQL_CAPACIDAD_HORARIO = '''
+    SELECT citas_agendadas FROM capacidad_horario WHERE ciudad = ? AND horario = ?
+'''
+SQL_USUARIO_POR_ID = 'SELECT id, nombre, apellido, cedula FROM usuarios WHERE id = ?'
+# Citas desde ahora en adelante; las de fecha no reconocida se incluyen para que el modelo decida
+SQL_CITAS_USUARIO = '''
+    SELECT
+        c.id,
+        c.fecha_cita,
+        c.ciudad,
+        c.direccion_usuario,
+        c.time_creacion
+    FROM cita_examen_medico c
+    WHERE c.id_usuario = ? AND (c.fecha_cita_utc >= ? OR c.fecha_cita_utc IS NULL)
+    ORDER BY c.fecha_cita_utc
+'''
+SQL_USUARIO_PARA_CITA = 'SELECT id, nombre, apellido, correo, cedula FROM usuarios WHERE id = ?'
+# Verifica el cupo e inserta en una sola sentencia (bajo el bloqueo de escritura):
+# dos reservas simultáneas no pueden ver ambas el mismo cupo libre. El trigger
+# trg_capacidad_cita_insert incrementa capacidad_horario en la misma transacción.
+SQL_INSERTAR_CITA_CON_CUPO = '''
+    INSERT INTO cita_examen_medico (id_usuario, fecha_cita, fecha_cita_utc, ciudad, direccion_usuario)
+    SELECT ?, ?, ?, ?, ?
+    WHERE COALESCE(
+        (SELECT citas_agendadas FROM capacidad_horario WHERE ciudad = ? AND horario = ?), 0
+    ) < ?
+'''
+SQL_CITA_POR_ID = '''
+    SELECT
+        c.id,
+        c.fecha_cita,
+        c.ciudad,
+        c.direccion_usuario,
+        c.time_creacion,
+        u.cedula as identificacion,
+        u.nombre,
+        u.apellido,
+        u.correo
+    FROM cita_examen_medico c
+    JOIN usuarios u ON c.id_usuario = u.id
+    WHERE c.id = ?
+'''
+# Listado paginado por keyset sobre (fecha_cita_utc, id), de la cita más reciente a la más
+# antigua; consulta_pagina_citas agrega el WHERE y el ORDER BY
+SQL_PAGINA_CITAS = '''
+    SELECT
+        c.id,
+        c.fecha_cita,
+        c.fecha_cita_utc,
+        c.ciudad,
+        c.direccion_usuario,
+        c.time_creacion,
+        u.cedula as identificacion,
+        u.nombre,
+        u.apellido
+    FROM cita_examen_medico c
+    JOIN usuarios u ON c.id_usuario = u.id
+'''
+SQL_ELIMINAR_CITA = '''
+    DELETE FROM cita_examen_medico WHERE id = ?
+'''
+SQL_HORARIO_CITA = '''
+    SELECT ciudad, fecha_cita_utc FROM cita_examen_medico WHERE id = ?
+'''
+# Horarios futuros con citas (solo claves normalizadas) para el índice de disponibilidad
+SQL_CAPACIDAD_FUTURA = '''
+    SELECT ciudad, horario, citas_agendadas FROM capacidad_horario
+    WHERE horario >= ? AND horario GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]T*Z'
+'''
+
+# Citas permitidas en el mismo horario y ciudad
+MAX_CITAS_POR_HORARIO = 5
+
+# Tamaño de página del listado de citas
+CITAS_POR_PAGINA = 100
+MAX_CITAS_POR_PAGINA = 500
+DIRECCION_POR_CONFIRMAR = "Por confirmar - Se contactará para confirmar dirección"
+
+
+def parametros_insertar_cita(id_usuario: int, fecha_cita: str, ciudad: str) -> Tuple:
+    return (id_usuario, fecha_cita, normalize_fecha_cita(fecha_cita), ciudad, DIRECCION_POR_CONFIRMAR,
+            ciudad, slot_key(fecha_cita), MAX_CITAS_POR_HORARIO)
+
+
+def citas_agendadas_desde_fila(row) -> int:
+    return row[0] if row else 0
+
+
+def resultado_disponibilidad(fecha_cita: str, ciudad: str, citas_programadas: int) -> Dict[str, Any]:
+    disponible = citas_programadas < MAX_CITAS_POR_HORARIO
+
+    return {
+        "disponible": disponible,
+        "ciudad": ciudad,
+        "fecha_cita": fecha_cita,
+        "citas_programadas": citas_programadas,
+        "mensaje": f"{'✅ Hay disponibilidad' if disponible else '❌ No hay disponibilidad'} para {fecha_cita} en {ciudad}. Citas programadas: {citas_programadas}"
+    }
+
+
+def rango_busqueda_horarios(desde: Optional[str], hasta: Optional[str]) -> Tuple[datetime, datetime]:
+    """
+    Ventana de búsqueda: desde ahora (o desde) hasta 14 días después, máximo 60 días.
+
+    Un hasta sin hora ('2025-10-15') incluye todo ese día, así desde=hasta
+    pregunta por los horarios de un solo día.
+    """
+    ahora = datetime.now(timezone.utc)
+    inicio = parse_fecha_cita(desde) if desde else None
+    if desde and inicio is None:
+        raise ValueError(f"No se reconoce la fecha '{desde}'")
+    inicio = max(inicio or ahora, ahora)
+
+    fin = parse_fecha_cita(hasta) if hasta else None
+    if hasta and fin is None:
+        raise ValueError(f"No se reconoce la fecha '{hasta}'")
+    if is_date_only(hasta):
+        fin += timedelta(days=1)
+    fin = min(fin or inicio + timedelta(days=14), inicio + timedelta(days=60))
+    return inicio, fin
+
+
+def resultado_horarios_disponibles(ciudad: str, libres: List[Tuple[datetime, int]]) -> Dict[str, Any]:
+    horarios = [{
+        "fecha_cita": fecha.strftime("%Y-%m-%d %I:%M %p"),
+        "citas_programadas": citas,
+        "cupos_disponibles": MAX_CITAS_POR_HORARIO - citas
+    } for fecha, citas in libres]
+
+    if horarios:
+        mensaje = f"✅ Próximos horarios disponibles en {ciudad}: " + ", ".join(h["fecha_cita"] for h in horarios)
+    else:
+        mensaje = f"❌ No hay horarios disponibles en {ciudad} en el rango consultado"
+    return {
+        "success": True,
+        "ciudad": ciudad,
+        "total_horarios": len(horarios),
+        "horarios": horarios,
+        "mensaje": mensaje
+    }
+
+
+def resultado_sin_cupo(fecha_cita: str, ciudad: str, citas_programadas: int) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": f"No hay disponibilidad para {fecha_cita} en {ciudad}",
+        "citas_programadas": citas_programadas
+    }
+
+
+def cita_usuario_desde_fila(row) -> Dict[str, Any]:
+    return {
+        "cita_id": row["id"],
+        "fecha_cita": row["fecha_cita"],
+        "ciudad": row["ciudad"],
+        "direccion": row["direccion_usuario"],
+        "fecha_creacion": row["time_creacion"]
+    }
+
+
+def resultado_citas_usuario(usuario, id_usuario: int, citas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "nombre_paciente": f"{usuario['nombre']} {usuario['apellido']}",
+        "cedula": usuario['cedula'],
+        "id_usuario": id_usuario,
+        "total_citas": len(citas),
+        "citas": citas,
+        "mensaje": f"Se encontraron {len(citas)} citas para {usuario['nombre']} {usuario['apellido']}"
+    }
+
+
+def correo_confirmacion_cita(cita_id: int, nombre_completo: str, cedula: str, fecha_cita: str,
+                             tipo_examen: str, ciudad: str) -> Tuple[str, str]:
+    """Retorna (asunto, cuerpo) del correo de confirmación de una cita"""
+    subject = f"Confirmación de Cita - Pasteur Laboratorios Clínicos"
+    body = f"""Estimado/a {nombre_completo}:
+
+Reciba un cordial saludo de parte de Pasteur Laboratorios Clínicos.
+
+Le confirmamos que su cita ha sido agendada exitosamente con los siguientes detalles:
+
+📋 DETALLES DE LA CITA:
+• ID de Cita: #{cita_id}
+• Paciente: {nombre_completo}
+• Cédula: {cedula}
+• Fecha y Hora: {fecha_cita}
+• Tipo de Examen: {tipo_examen}
+• Ciudad: {ciudad}
+• Dirección: Se confirmará por teléfono
+
+⏰ IMPORTANTE:
+• Por favor llegue 15 minutos antes de su cita
+• Traiga su documento de identidad
+• Si requiere ayuno u otra preparación, se le informará previamente
+
+📞 Si necesita cancelar o reprogramar su cita, por favor contacte a nuestro centro.
+
+Quedamos atentos a cualquier inquietud.
+
+Cordialmente,
+Pasteur Laboratorios Clínicos
+Más de 75 años cuidando su salud
+"""
+    return subject, body
+
+
+def resultado_cita_creada(cita_id: int, usuario, fecha_cita: str, tipo_examen: str, ciudad: str,
+                          correo_enviado: bool) -> Dict[str, Any]:
+    """usuario es la fila de SQL_USUARIO_PARA_CITA: (id, nombre, apellido, correo, cedula)"""
+    id_usuario, nombre, apellido, correo, cedula = usuario
+    nombre_completo = f"{nombre} {apellido}"
+    return {
+        "success": True,
+        "cita_id": cita_id,
+        "id_usuario": id_usuario,
+        "cedula": cedula,
+        "nombre": nombre_completo,
+        "correo": correo,
+        "fecha_cita": fecha_cita,
+        "tipo_examen": tipo_examen,
+        "ciudad": ciudad,
+        "correo_enviado": correo_enviado,
+        "mensaje": f"✅ Cita #{cita_id} creada exitosamente para {nombre_completo} el {fecha_cita} en {ciudad}. Confirmación enviada al correo {correo}."
+    }
+
+
+def cita_detalle_desde_fila(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "fecha_cita": row["fecha_cita"],
+        "ciudad": row["ciudad"],
+        "direccion": row["direccion_usuario"],
+        "fecha_creacion": row["time_creacion"],
+        "paciente": {
+            "identificacion": row["identificacion"],
+            "nombre": row["nombre"],
+            "apellido": row["apellido"],
+            "correo": row["correo"]
+        }
+    }
+
+
+def cita_listado_desde_fila(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "fecha_cita": row["fecha_cita"],
+        "fecha_cita_utc": row["fecha_cita_utc"],
+        "ciudad": row["ciudad"],
+        "direccion": row["direccion_usuario"],
+        "fecha_creacion": row["time_creacion"],
+        "paciente_nombre": f"{row['nombre']} {row['apellido']}",
+        "identificacion": row["identificacion"]
+    }
+
+
+def codificar_cursor_citas(fecha_cita_utc: Optional[str], cita_id: int) -> str:
+    """Cursor opaco de la siguiente página: '<fecha_cita_utc>~<id>' ('~<id>' si la fecha no se normalizó)"""
+    return f"{fecha_cita_utc or ''}~{cita_id}"
+
+
+def decodificar_cursor_citas(cursor: str) -> Tuple[Optional[str], int]:
+    fecha_cita_utc, separador, cita_id = cursor.rpartition("~")
+    if not separador or not cita_id.isdigit():
+        raise ValueError(f"Cursor de paginación inválido: '{cursor}'")
+    return fecha_cita_utc or None, int(cita_id)
+
+
+def consultas_pagina_citas(ciudad: Optional[str] = None, desde: Optional[str] = None, hasta: Optional[str] = None,
+                           despues: Optional[str] = None) -> List[Tuple[str, tuple]]:
+    """
+    Consultas de una página del listado de citas, a ejecutar en orden con LIMIT como último parámetro.
+
+    La paginación es por keyset sobre (fecha_cita_utc, id): cada página continúa
+    donde terminó la anterior usando idx_cita_fecha_utc o idx_cita_ciudad_fecha_utc,
+    así el costo no crece con el número de página ni con el tamaño de la tabla.
+    Las citas cuya fecha no se pudo normalizar (fecha_cita_utc NULL) van al final,
+    ordenadas por id, y solo se listan si no se filtra por fecha.
+
+    Args:
+        ciudad: Solo citas de esta ciudad
+        desde: Solo citas en o después de esta fecha
+        hasta: Solo citas antes de esta fecha
+        despues: Cursor de la página anterior (codificar_cursor_citas)
+
+    Returns:
+        Lista de (sql, parámetros sin el LIMIT)
+    """
+    filtros, params = [], []
+    if ciudad:
+        filtros.append("c.ciudad = ?")
+        params.append(ciudad)
+    for valor, operador in ((desde, ">="), (hasta, "<")):
+        if valor:
+            fecha_utc = normalize_fecha_cita(valor)
+            if fecha_utc is None:
+                raise ValueError(f"No se reconoce la fecha '{valor}'")
+            filtros.append(f"c.fecha_cita_utc {operador} ?")
+            params.append(fecha_utc)
+
+    fecha_cursor, id_cursor = decodificar_cursor_citas(despues) if despues else (None, None)
+    consultas = []
+    if despues is None or fecha_cursor is not None:
+        keyset = ["(c.fecha_cita_utc, c.id) < (?, ?)"] if despues else ["c.fecha_cita_utc IS NOT NULL"]
+        consultas.append((
+            f"{SQL_PAGINA_CITAS} WHERE {' AND '.join(filtros + keyset)} ORDER BY c.fecha_cita_utc DESC, c.id DESC LIMIT ?",
+            tuple(params) + ((fecha_cursor, id_cursor) if despues else ())
+        ))
+    if not desde and not hasta:
+        keyset = ["c.fecha_cita_utc IS NULL"] + (["c.id < ?"] if fecha_cursor is None and despues else [])
+        consultas.append((
+            f"{SQL_PAGINA_CITAS} WHERE {' AND '.join(filtros + keyset)} ORDER BY c.id DESC LIMIT ?",
+            tuple(params) + ((id_cursor,) if fecha_cursor is None and despues else ())
+        ))
+    return consultas
+
+
+def limite_pagina_citas(limite: Optional[int]) -> int:
+    return max(1, min(int(limite or CITAS_POR_PAGINA), MAX_CITAS_POR_PAGINA))
+
+
+def resultado_pagina_citas(rows: list, limite: int) -> Dict[str, Any]:
+    """Página del listado a partir de hasta limite + 1 filas (la fila extra indica que hay más)"""
+    citas = [cita_listado_desde_fila(row) for row in rows[:limite]]
+    siguiente = None
+    if len(rows) > limite:
+        ultima = citas[-1]
+        siguiente = codificar_cursor_citas(ultima["fecha_cita_utc"], ultima["id"])
+    return {
+        "citas": citas,
+        "total": len(citas),
+        "siguiente": siguiente
+    }
 
 
 def obtener_usuario(identificacion: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM usuarios WHERE cedula = ?
-    ''', (identificacion,))
+    cursor.execute(SQL_OBTENER_USUARIO, (identificacion,))
     return cursor.fetchone()
 
 def crear_usuario(identificacion: int, nombre: str, apellido: str, correo: str, direccion: str, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO usuarios (identificacion, nombre, apellido, correo, direccion) VALUES (?, ?, ?, ?, ?)
-    ''', (identificacion, nombre, apellido, correo, direccion))
-    conn.commit()
-    conn.close()
+    with connection_manager.transaction(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO usuarios (identificacion, nombre, apellido, correo, direccion) VALUES (?, ?, ?, ?, ?)
+        ''', (identificacion, nombre, apellido, correo, direccion))
     return cursor.lastrowid
 
 
 def actualizar_usuario(identificacion: int, nombre: str, apellido: str, correo: str, direccion: str, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE usuarios SET nombre = ?, apellido = ?, correo = ?, direccion = ? WHERE identificacion = ?
-    ''', (nombre, apellido, correo, direccion, identificacion))
-    conn.commit()
-    conn.close()
+    with connection_manager.transaction(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE usuarios SET nombre = ?, apellido = ?, correo = ?, direccion = ? WHERE identificacion = ?
+        ''', (nombre, apellido, correo, direccion, identificacion))
     return cursor.rowcount
 
 def eliminar_usuario(identificacion: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        DELETE FROM usuarios WHERE identificacion = ?
-    ''', (identificacion,))
-    conn.commit()
-    conn.close()
-    return cursor.rowcount  
+    with connection_manager.transaction(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM usuarios WHERE identificacion = ?
+        ''', (identificacion,))
+    return cursor.rowcount
 
 def obtener_examenes_medicos(id_usuario: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM examenes_medicos WHERE id_usuario = ?
-    ''', (id_usuario,))
+    cursor.execute(SQL_OBTENER_EXAMENES_MEDICOS, (id_usuario,))
     return cursor.fetchall()
 
 def crear_examen_medico(id_usuario: int, resumen: str, nombre_archivo: str, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO examenes_medicos (id_usuario, resumen, nombre_archivo) VALUES (?, ?, ?)
-    ''', (id_usuario, resumen, nombre_archivo))
-    conn.commit()
-    conn.close()
+    with connection_manager.transaction(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO examenes_medicos (id_usuario, resumen, nombre_archivo) VALUES (?, ?, ?)
+        ''', (id_usuario, resumen, nombre_archivo))
     return cursor.lastrowid
-    
+
 def actualizar_examen_medico(id: int, resumen: str, nombre_archivo: str, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE examenes_medicos SET resumen = ?, nombre_archivo = ? WHERE id = ?
-    ''', (resumen, nombre_archivo, id))
-    conn.commit()
-    conn.close()
+    with connection_manager.transaction(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE examenes_medicos SET resumen = ?, nombre_archivo = ? WHERE id = ?
+        ''', (resumen, nombre_archivo, id))
     return cursor.rowcount
-    
+
 def eliminar_examen_medico(id: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        DELETE FROM examenes_medicos WHERE id = ?
-    ''', (id,))
-    conn.commit()
-    conn.close()
+    with connection_manager.transaction(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM examenes_medicos WHERE id = ?
+        ''', (id,))
     return cursor.rowcount
-    
+
 def obtener_cita_examen_medico(id_usuario: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM cita_examen_medico WHERE id_usuario = ?
-    ''', (id_usuario,))
+    cursor.execute(SQL_OBTENER_CITA_EXAMEN_MEDICO, (id_usuario,))
     return cursor.fetchall()
-    
+
 def crear_cita_examen_medico(id_usuario: int, fecha_cita: str, id_examen_medico: int, ciudad: str, direccion_usuario: str, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO cita_examen_medico (id_usuario, fecha_cita, id_examen_medico, ciudad, direccion_usuario) VALUES (?, ?, ?, ?, ?)
-    ''', (id_usuario, fecha_cita, id_examen_medico, ciudad, direccion_usuario))
-    conn.commit()
-    conn.close()
+    with connection_manager.transaction(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO cita_examen_medico (id_usuario, fecha_cita, fecha_cita_utc, id_examen_medico, ciudad, direccion_usuario) VALUES (?, ?, ?, ?, ?, ?)
+        ''', (id_usuario, fecha_cita, normalize_fecha_cita(fecha_cita), id_examen_medico, ciudad, direccion_usuario))
+    availability_index.record(db_path, ciudad, normalize_fecha_cita(fecha_cita), +1)
     return cursor.lastrowid
 
 def verificar_disponibilidad_citas(fecha_cita: str, ciudad: str, db_path: str = DB_NAME) -> Dict[str, Any]:
@@ -143,64 +578,32 @@ def verificar_disponibilidad_citas(fecha_cita: str, ciudad: str, db_path: str =
     Verifica si hay disponibilidad en una fecha y ciudad específica.
     Muestra las citas ya programadas en ese horario y ciudad.
     """
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
 
     try:
-        # Buscar citas en la misma ciudad y fecha/hora
-        cursor.execute('''
-            SELECT
-                c.id,
-                c.fecha_cita,
-                c.ciudad,
-                u.nombre,
-                u.apellido
-            FROM cita_examen_medico c
-            JOIN usuarios u ON c.id_usuario = u.id
-            WHERE c.ciudad = ? AND c.fecha_cita = ?
-        ''', (ciudad, fecha_cita))
-
-        citas_existentes = []
-        for row in cursor.fetchall():
-            citas_existentes.append({
-                "cita_id": row["id"],
-                "fecha_cita": row["fecha_cita"],
-                "ciudad": row["ciudad"],
-                "paciente": f"{row['nombre']} {row['apellido']}"
-            })
-
-        # Si hay muchas citas (más de 5 en el mismo horario), considerar no disponible
-        disponible = len(citas_existentes) < 5
-
-        return {
-            "disponible": disponible,
-            "ciudad": ciudad,
-            "fecha_cita": fecha_cita,
-            "citas_programadas": len(citas_existentes),
-            "mensaje": f"{'✅ Hay disponibilidad' if disponible else '❌ No hay disponibilidad'} para {fecha_cita} en {ciudad}. Citas programadas: {len(citas_existentes)}"
-        }
+        # Citas ya agendadas en la misma ciudad y fecha/hora (búsqueda por clave)
+        cursor.execute(SQL_CAPACIDAD_HORARIO, (ciudad, slot_key(fecha_cita)))
+        return resultado_disponibilidad(fecha_cita, ciudad, citas_agendadas_desde_fila(cursor.fetchone()))
 
     except Exception as e:
         return {
             "disponible": False,
             "error": str(e)
         }
-    finally:
-        conn.close()
 
 
 def obtener_citas_activas_usuario(id_usuario: int, db_path: str = DB_NAME) -> Dict[str, Any]:
     """
-    Obtiene todas las citas activas/futuras de un usuario específico por su user_id.
+    Obtiene las citas activas (desde ahora en adelante) de un usuario por su user_id.
     """
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
 
     try:
         # Buscar usuario por ID
-        cursor.execute('SELECT id, nombre, apellido, cedula FROM usuarios WHERE id = ?', (id_usuario,))
+        cursor.execute(SQL_USUARIO_POR_ID, (id_usuario,))
         usuario = cursor.fetchone()
 
         if not usuario:
@@ -211,45 +614,15 @@ def obtener_citas_activas_usuario(id_usuario: int, db_path: str = DB_NAME) -> Di
             }
 
         # Obtener todas las citas del usuario
-        cursor.execute('''
-            SELECT
-                c.id,
-                c.fecha_cita,
-                c.ciudad,
-                c.direccion_usuario,
-                c.time_creacion
-            FROM cita_examen_medico c
-            WHERE c.id_usuario = ?
-            ORDER BY c.fecha_cita DESC
-        ''', (id_usuario,))
-
-        citas = []
-        for row in cursor.fetchall():
-            citas.append({
-                "cita_id": row["id"],
-                "fecha_cita": row["fecha_cita"],
-                "ciudad": row["ciudad"],
-                "direccion": row["direccion_usuario"],
-                "fecha_creacion": row["time_creacion"]
-            })
-
-        return {
-            "success": True,
-            "nombre_paciente": f"{usuario['nombre']} {usuario['apellido']}",
-            "cedula": usuario['cedula'],
-            "id_usuario": id_usuario,
-            "total_citas": len(citas),
-            "citas": citas,
-            "mensaje": f"Se encontraron {len(citas)} citas para {usuario['nombre']} {usuario['apellido']}"
-        }
+        cursor.execute(SQL_CITAS_USUARIO, (id_usuario, utc_now_iso()))
+        citas = [cita_usuario_desde_fila(row) for row in cursor.fetchall()]
+        return resultado_citas_usuario(usuario, id_usuario, citas)
 
     except Exception as e:
         return {
             "success": False,
             "error": str(e)
         }
-    finally:
-        conn.close()
 
 
 def crear_cita(id_usuario: int, fecha_cita: str, tipo_examen: str, ciudad: str, db_path: str = DB_NAME) -> Dict[str, Any]:
@@ -259,12 +632,12 @@ def crear_cita(id_usuario: int, fecha_cita: str, tipo_examen: str, ciudad: str,
     """
     from email_helper import send_email_with_file
 
-    conn = sqlite3.connect(db_path)
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
 
     try:
         # Verificar si el usuario existe
-        cursor.execute('SELECT id, nombre, apellido, correo, cedula FROM usuarios WHERE id = ?', (id_usuario,))
+        cursor.execute(SQL_USUARIO_PARA_CITA, (id_usuario,))
         usuario = cursor.fetchone()
 
         if not usuario:
@@ -274,88 +647,37 @@ def crear_cita(id_usuario: int, fecha_cita: str, tipo_examen: str, ciudad: str,
                 "id_usuario": id_usuario
             }
 
-        nombre = usuario[1]
-        apellido = usuario[2]
-        correo = usuario[3]
-        cedula = usuario[4]
-        nombre_completo = f"{nombre} {apellido}"
-
-        # Verificar disponibilidad primero
-        disponibilidad = verificar_disponibilidad_citas(fecha_cita, ciudad, db_path)
-
-        if not disponibilidad.get("disponible"):
-            return {
-                "success": False,
-                "error": f"No hay disponibilidad para {fecha_cita} en {ciudad}",
-                "citas_programadas": disponibilidad.get("citas_programadas", 0)
-            }
+        # Crear la cita solo si queda cupo en el horario
+        cursor.execute(SQL_INSERTAR_CITA_CON_CUPO, parametros_insertar_cita(id_usuario, fecha_cita, ciudad))
 
-        # Crear la cita
-        cursor.execute('''
-            INSERT INTO cita_examen_medico (id_usuario, fecha_cita, ciudad, direccion_usuario)
-            VALUES (?, ?, ?, ?)
-        ''', (id_usuario, fecha_cita, ciudad, "Por confirmar - Se contactará para confirmar dirección"))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            cursor.execute(SQL_CAPACIDAD_HORARIO, (ciudad, slot_key(fecha_cita)))
+            return resultado_sin_cupo(fecha_cita, ciudad, citas_agendadas_desde_fila(cursor.fetchone()))
 
         cita_id = cursor.lastrowid
         conn.commit()
+        availability_index.record(db_path, ciudad, normalize_fecha_cita(fecha_cita), +1)
 
         # Enviar correo de confirmación
-        subject = f"Confirmación de Cita - Pasteur Laboratorios Clínicos"
-        body = f"""Estimado/a {nombre_completo}:
-
-Reciba un cordial saludo de parte de Pasteur Laboratorios Clínicos.
-
-Le confirmamos que su cita ha sido agendada exitosamente con los siguientes detalles:
-
-📋 DETALLES DE LA CITA:
-• ID de Cita: #{cita_id}
-• Paciente: {nombre_completo}
-• Cédula: {cedula}
-• Fecha y Hora: {fecha_cita}
-• Tipo de Examen: {tipo_examen}
-• Ciudad: {ciudad}
-• Dirección: Se confirmará por teléfono
-
-⏰ IMPORTANTE:
-• Por favor llegue 15 minutos antes de su cita
-• Traiga su documento de identidad
-• Si requiere ayuno u otra preparación, se le informará previamente
-
-📞 Si necesita cancelar o reprogramar su cita, por favor contacte a nuestro centro.
-
-Quedamos atentos a cualquier inquietud.
-
-Cordialmente,
-Pasteur Laboratorios Clínicos
-Más de 75 años cuidando su salud
-"""
+        subject, body = correo_confirmacion_cita(
+            cita_id, f"{usuario[1]} {usuario[2]}", usuario[4], fecha_cita, tipo_examen, ciudad
+        )
 
         try:
             # Enviar correo sin archivos adjuntos
             send_email_with_file(
-                to_email=correo,
+                to_email=usuario[3],
                 subject=subject,
                 body=body,
                 files_to_attach=[]
             )
             correo_enviado = True
-        except Exception as email_error:
-            print(f"Error enviando correo: {email_error}")
+        except Exception:
+            logger.exception("❌ Error enviando correo de la cita #%s", cita_id, extra={"function": "crear_cita"})
             correo_enviado = False
 
-        return {
-            "success": True,
-            "cita_id": cita_id,
-            "id_usuario": id_usuario,
-            "cedula": cedula,
-            "nombre": nombre_completo,
-            "correo": correo,
-            "fecha_cita": fecha_cita,
-            "tipo_examen": tipo_examen,
-            "ciudad": ciudad,
-            "correo_enviado": correo_enviado,
-            "mensaje": f"✅ Cita #{cita_id} creada exitosamente para {nombre_completo} el {fecha_cita} en {ciudad}. Confirmación enviada al correo {correo}."
-        }
+        return resultado_cita_creada(cita_id, usuario, fecha_cita, tipo_examen, ciudad, correo_enviado)
 
     except Exception as e:
         conn.rollback()
@@ -363,102 +685,98 @@ Más de 75 años cuidando su salud
             "success": False,
             "error": str(e)
         }
-    finally:
-        conn.close()
 
 def obtener_cita_por_id(cita_id: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
     """Obtiene los detalles completos de una cita por su ID"""
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
 
-    cursor.execute('''
-        SELECT
-            c.id,
-            c.fecha_cita,
-            c.ciudad,
-            c.direccion_usuario,
-            c.time_creacion,
-            u.cedula as identificacion,
-            u.nombre,
-            u.apellido,
-            u.correo
-        FROM cita_examen_medico c
-        JOIN usuarios u ON c.id_usuario = u.id
-        WHERE c.id = ?
-    ''', (cita_id,))
+    cursor.execute(SQL_CITA_POR_ID, (cita_id,))
 
     row = cursor.fetchone()
-    conn.close()
 
     if row:
-        return {
-            "id": row["id"],
-            "fecha_cita": row["fecha_cita"],
-            "ciudad": row["ciudad"],
-            "direccion": row["direccion_usuario"],
-            "fecha_creacion": row["time_creacion"],
-            "paciente": {
-                "identificacion": row["identificacion"],
-                "nombre": row["nombre"],
-                "apellido": row["apellido"],
-                "correo": row["correo"]
-            }
-        }
+        return cita_detalle_desde_fila(row)
     return None
 
-def listar_todas_citas(db_path: str = DB_NAME) -> List[Dict[str, Any]]:
-    """Lista todas las citas con información del usuario"""
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+def listar_citas_pagina(ciudad: Optional[str] = None, desde: Optional[str] = None, hasta: Optional[str] = None,
+                        despues: Optional[str] = None, limite: int = CITAS_POR_PAGINA,
+                        db_path: str = DB_NAME) -> Dict[str, Any]:
+    """
+    Lista una página de citas con información del usuario, de la más reciente a la más antigua.
+
+    Args:
+        ciudad: Filtrar por ciudad
+        desde: Filtrar citas en o después de esta fecha
+        hasta: Filtrar citas antes de esta fecha
+        despues: Cursor "siguiente" de la página anterior
+        limite: Citas por página (máximo MAX_CITAS_POR_PAGINA)
+        db_path: Ruta de la base de datos
+
+    Returns:
+        {"citas": [...], "total": n, "siguiente": cursor o None si es la última página}
+    """
+    limite = limite_pagina_citas(limite)
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+
+    rows = []
+    for sql, params in consultas_pagina_citas(ciudad, desde, hasta, despues):
+        rows += cursor.execute(sql, params + (limite + 1 - len(rows),)).fetchall()
+        if len(rows) > limite:
+            break
 
-    cursor.execute('''
-        SELECT
-            c.id,
-            c.fecha_cita,
-            c.ciudad,
-            c.direccion_usuario,
-            c.time_creacion,
-            u.cedula as identificacion,
-            u.nombre,
-            u.apellido
-        FROM cita_examen_medico c
-        JOIN usuarios u ON c.id_usuario = u.id
-        ORDER BY c.fecha_cita DESC
-    ''')
-
-    citas = []
-    for row in cursor.fetchall():
-        citas.append({
-            "id": row["id"],
-            "fecha_cita": row["fecha_cita"],
-            "ciudad": row["ciudad"],
-            "direccion": row["direccion_usuario"],
-            "fecha_creacion": row["time_creacion"],
-            "paciente_nombre": f"{row['nombre']} {row['apellido']}",
-            "identificacion": row["identificacion"]
-        })
-
-    conn.close()
-    return citas
+    return resultado_pagina_citas(rows, limite)
 
 
 def listar_usuarios(db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
+    conn = connection_manager.get_connection(db_path)
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM usuarios
-    ''')
+    cursor.execute(SQL_LISTAR_USUARIOS)
     return cursor.fetchall()
 
 def eliminar_cita(id: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        DELETE FROM cita_examen_medico WHERE id = ?
-    ''', (id,))
-    conn.commit()
-    conn.close()
+    with connection_manager.transaction(db_path) as conn:
+        cursor = conn.cursor()
+        horario = cursor.execute(SQL_HORARIO_CITA, (id,)).fetchone()
+        cursor.execute(SQL_ELIMINAR_CITA, (id,))
+    if horario and cursor.rowcount:
+        availability_index.record(db_path, horario[0], horario[1], -1)
     return cursor.rowcount
 
+
+def cargar_indice_disponibilidad(db_path: str = DB_NAME) -> None:
+    """Reconstruye el índice de disponibilidad en memoria desde capacidad_horario"""
+    conn = connection_manager.get_connection(db_path)
+    inicio_del_dia = datetime.now(timezone.utc).strftime("%Y-%m-%dT00:00:00Z")
+    availability_index.rebuild(db_path, conn.execute(SQL_CAPACIDAD_FUTURA, (inicio_del_dia,)).fetchall())
+
+
+def buscar_horarios_disponibles(ciudad: str, desde: Optional[str] = None, hasta: Optional[str] = None,
+                                cantidad: int = 5, db_path: str = DB_NAME) -> Dict[str, Any]:
+    """
+    Busca los próximos horarios con cupo en una ciudad usando el índice en memoria.
+
+    Args:
+        ciudad: Ciudad de la cita
+        desde: Inicio de la búsqueda (por defecto ahora)
+        hasta: Fin de la búsqueda (por defecto 14 días después de desde)
+        cantidad: Horarios a retornar (1 a 10)
+        db_path: Ruta de la base de datos
+    """
+    try:
+        inicio, fin = rango_busqueda_horarios(desde, hasta)
+        if not availability_index.is_loaded(db_path):
+            cargar_indice_disponibilidad(db_path)
+        libres = availability_index.find_open_slots(
+            ciudad, inicio, fin, max(1, min(int(cantidad), 10)), MAX_CITAS_POR_HORARIO
+        )
+        return resultado_horarios_disponibles(ciudad, libres)
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
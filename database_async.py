@@ -0,0 +1,411 @@
+"""
+Variante asíncrona de database.py sobre aiosqlite.
+
+Las funciones tienen los mismos nombres, argumentos y resultados que las de
+database.py (comparten el SQL y la conversión de filas), pero no bloquean el
+event loop: cada conexión de aiosqlite ejecuta sus consultas en su propio hilo.
+Las usan las rutas de FastAPI, FunctionManager y el webhook de WhatsApp, que
+corren en el mismo loop que el audio de las llamadas.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import aiosqlite
+
+from datetime import datetime, timezone
+
+from appointment_dates import normalize_fecha_cita, slot_key, utc_now_iso
+from availability_index import availability_index
+from database import (
+    DB_NAME,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHED_STATEMENTS,
+    SQL_OBTENER_USUARIO,
+    SQL_OBTENER_EXAMENES_MEDICOS,
+    SQL_OBTENER_CITA_EXAMEN_MEDICO,
+    SQL_LISTAR_USUARIOS,
+    SQL_CAPACIDAD_HORARIO,
+    SQL_USUARIO_POR_ID,
+    SQL_CITAS_USUARIO,
+    SQL_USUARIO_PARA_CITA,
+    SQL_INSERTAR_CITA_CON_CUPO,
+    SQL_CITA_POR_ID,
+    SQL_ELIMINAR_CITA,
+    SQL_HORARIO_CITA,
+    SQL_CAPACIDAD_FUTURA,
+    MAX_CITAS_POR_HORARIO,
+    CITAS_POR_PAGINA,
+    MAX_CITAS_POR_PAGINA,
+    rango_busqueda_horarios,
+    resultado_horarios_disponibles,
+    parametros_insertar_cita,
+    citas_agendadas_desde_fila,
+    resultado_disponibilidad,
+    resultado_sin_cupo,
+    cita_usuario_desde_fila,
+    resultado_citas_usuario,
+    correo_confirmacion_cita,
+    resultado_cita_creada,
+    cita_detalle_desde_fila,
+    consultas_pagina_citas,
+    limite_pagina_citas,
+    resultado_pagina_citas,
+)
+
+# Conexiones abiertas por archivo de base de datos (WAL: varias lecturas en paralelo)
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", 4))
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncConnectionPool:
+    """Pool de conexiones aiosqlite por archivo, con la misma configuración que database.ConnectionManager"""
+
+    def __init__(self, size: int = ASYNC_DB_POOL_SIZE, busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS,
+                 cached_statements: int = SQLITE_CACHED_STATEMENTS):
+        self.size = max(1, size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._idle: Dict[str, asyncio.Queue] = {}
+        self._opened: Dict[str, int] = {}
+        self._connections: List[aiosqlite.Connection] = []
+        self._replacing: Set[asyncio.Task] = set()
+
+    async def _connect(self, db_path: str) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(
+            db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements
+        )
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        await conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    @asynccontextmanager
+    async def connection(self, db_path: str = DB_NAME) -> AsyncIterator[aiosqlite.Connection]:
+        """Toma una conexión del pool (la abre si hay cupo) y la devuelve al salir"""
+        key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+        idle = self._idle.setdefault(key, asyncio.Queue())
+
+        if idle.empty() and self._opened.get(key, 0) < self.size:
+            self._opened[key] = self._opened.get(key, 0) + 1
+            try:
+                conn = await self._connect(key)
+            except BaseException:
+                self._opened[key] -= 1
+                raise
+            self._connections.append(conn)
+        else:
+            conn = await idle.get()
+
+        reusable = True
+        try:
+            yield conn
+        except BaseException:
+            # Cancelada (timeout de FunctionManager) o con error a mitad de una escritura:
+            # no dejar la transacción abierta para el siguiente que use la conexión
+            reusable = await self._rollback(conn)
+            raise
+        finally:
+            if reusable:
+                idle.put_nowait(conn)
+            else:
+                self._replace(key, conn)
+
+    @staticmethod
+    async def _rollback(conn: aiosqlite.Connection) -> bool:
+        """
+        Deshace lo que haya dejado abierto un usuario cancelado o con error.
+
+        Las operaciones de aiosqlite se encolan en el hilo de la conexión y se
+        ejecutan aunque quien las pidió se cancele, así que in_transaction aún
+        no refleja un execute en vuelo. El rollback se encola detrás de ellas
+        (la cola es FIFO) y se espera protegido de una segunda cancelación.
+
+        Returns:
+            True si el rollback terminó y la conexión puede volver al pool
+        """
+        try:
+            await asyncio.shield(conn.rollback())
+            return True
+        except BaseException:
+            return False
+
+    def _replace(self, key: str, conn: aiosqlite.Connection) -> None:
+        """Cierra una conexión en estado dudoso y abre otra en su lugar (quienes esperan en el pool la reciben)"""
+        async def replace():
+            try:
+                await conn.close()
+            except Exception:
+                logger.exception("❌ Error cerrando conexión aiosqlite")
+            if conn in self._connections:
+                self._connections.remove(conn)
+            try:
+                fresh = await self._connect(key)
+            except Exception:
+                logger.exception("❌ Error reabriendo conexión aiosqlite")
+                self._opened[key] -= 1
+                return
+            idle = self._idle.get(key)
+            if idle is None:
+                # El pool se cerró mientras tanto
+                self._opened.pop(key, None)
+                await fresh.close()
+                return
+            self._connections.append(fresh)
+            idle.put_nowait(fresh)
+
+        task = asyncio.get_running_loop().create_task(replace())
+        self._replacing.add(task)
+        task.add_done_callback(self._replacing.discard)
+
+    @asynccontextmanager
+    async def transaction(self, db_path: str = DB_NAME) -> AsyncIterator[aiosqlite.Connection]:
+        """Conexión del pool con commit al salir (rollback si hubo una excepción)"""
+        async with self.connection(db_path) as conn:
+            yield conn
+            await conn.commit()
+
+    async def close_all(self) -> None:
+        """Cierra todas las conexiones (al apagar el servidor)"""
+        await asyncio.gather(*self._replacing, return_exceptions=True)
+        connections, self._connections = self._connections, []
+        self._idle.clear()
+        self._opened.clear()
+        for conn in connections:
+            try:
+                await conn.close()
+            except Exception:
+                logger.exception("❌ Error cerrando conexión aiosqlite")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "open_connections": len(self._connections),
+            "idle": {path: queue.qsize() for path, queue in self._idle.items()}
+        }
+
+
+async def _fetchall(conn: aiosqlite.Connection, sql: str, params=(), rows: bool = False) -> list:
+    async with conn.execute(sql, params) as cursor:
+        if rows:
+            cursor.row_factory = sqlite3.Row
+        return await cursor.fetchall()
+
+
+async def _fetchone(conn: aiosqlite.Connection, sql: str, params=(), rows: bool = False):
+    async with conn.execute(sql, params) as cursor:
+        if rows:
+            cursor.row_factory = sqlite3.Row
+        return await cursor.fetchone()
+
+
+async def obtener_usuario(identificacion: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
+    async with connection_pool.connection(db_path) as conn:
+        return await _fetchone(conn, SQL_OBTENER_USUARIO, (identificacion,))
+
+
+async def obtener_examenes_medicos(id_usuario: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
+    async with connection_pool.connection(db_path) as conn:
+        return await _fetchall(conn, SQL_OBTENER_EXAMENES_MEDICOS, (id_usuario,))
+
+
+async def obtener_cita_examen_medico(id_usuario: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
+    async with connection_pool.connection(db_path) as conn:
+        return await _fetchall(conn, SQL_OBTENER_CITA_EXAMEN_MEDICO, (id_usuario,))
+
+
+async def listar_usuarios(db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
+    async with connection_pool.connection(db_path) as conn:
+        return await _fetchall(conn, SQL_LISTAR_USUARIOS)
+
+
+async def _citas_agendadas(conn: aiosqlite.Connection, fecha_cita: str, ciudad: str) -> int:
+    return citas_agendadas_desde_fila(await _fetchone(conn, SQL_CAPACIDAD_HORARIO, (ciudad, slot_key(fecha_cita))))
+
+
+async def verificar_disponibilidad_citas(fecha_cita: str, ciudad: str, db_path: str = DB_NAME) -> Dict[str, Any]:
+    """Versión asíncrona de database.verificar_disponibilidad_citas"""
+    try:
+        async with connection_pool.connection(db_path) as conn:
+            citas_programadas = await _citas_agendadas(conn, fecha_cita, ciudad)
+        return resultado_disponibilidad(fecha_cita, ciudad, citas_programadas)
+
+    except Exception as e:
+        return {
+            "disponible": False,
+            "error": str(e)
+        }
+
+
+async def obtener_citas_activas_usuario(id_usuario: int, db_path: str = DB_NAME) -> Dict[str, Any]:
+    """Versión asíncrona de database.obtener_citas_activas_usuario"""
+    try:
+        async with connection_pool.connection(db_path) as conn:
+            usuario = await _fetchone(conn, SQL_USUARIO_POR_ID, (id_usuario,), rows=True)
+
+            if not usuario:
+                return {
+                    "success": False,
+                    "error": "Usuario no encontrado",
+                    "id_usuario": id_usuario
+                }
+
+            rows = await _fetchall(conn, SQL_CITAS_USUARIO, (id_usuario, utc_now_iso()), rows=True)
+
+        citas = [cita_usuario_desde_fila(row) for row in rows]
+        return resultado_citas_usuario(usuario, id_usuario, citas)
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+async def crear_cita(id_usuario: int, fecha_cita: str, tipo_examen: str, ciudad: str, db_path: str = DB_NAME) -> Dict[str, Any]:
+    """
+    Versión asíncrona de database.crear_cita.
+
+    El correo de confirmación (SMTP, bloqueante) se envía en el pool "network"
+    de function_manager, el mismo que usan las tools síncronas de red.
+    """
+    from email_helper import send_email_with_file
+    from function_manager import run_blocking
+
+    try:
+        async with connection_pool.transaction(db_path) as conn:
+            # Verificar si el usuario existe
+            usuario = await _fetchone(conn, SQL_USUARIO_PARA_CITA, (id_usuario,))
+
+            if not usuario:
+                return {
+                    "success": False,
+                    "error": "Usuario no encontrado. Debe registrarse primero.",
+                    "id_usuario": id_usuario
+                }
+
+            # Crear la cita solo si queda cupo en el horario
+            cursor = await conn.execute(SQL_INSERTAR_CITA_CON_CUPO, parametros_insertar_cita(id_usuario, fecha_cita, ciudad))
+            cita_id, insertada = cursor.lastrowid, cursor.rowcount > 0
+            await cursor.close()
+
+            if not insertada:
+                return resultado_sin_cupo(fecha_cita, ciudad, await _citas_agendadas(conn, fecha_cita, ciudad))
+
+        availability_index.record(db_path, ciudad, normalize_fecha_cita(fecha_cita), +1)
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+    subject, body = correo_confirmacion_cita(
+        cita_id, f"{usuario[1]} {usuario[2]}", usuario[4], fecha_cita, tipo_examen, ciudad
+    )
+    try:
+        await run_blocking(
+            "network",
+            send_email_with_file,
+            to_email=usuario[3],
+            subject=subject,
+            body=body,
+            files_to_attach=[]
+        )
+        correo_enviado = True
+    except Exception:
+        logger.exception("❌ Error enviando correo de la cita #%s", cita_id, extra={"function": "crear_cita"})
+        correo_enviado = False
+
+    return resultado_cita_creada(cita_id, usuario, fecha_cita, tipo_examen, ciudad, correo_enviado)
+
+
+async def obtener_cita_por_id(cita_id: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
+    """Obtiene los detalles completos de una cita por su ID"""
+    async with connection_pool.connection(db_path) as conn:
+        row = await _fetchone(conn, SQL_CITA_POR_ID, (cita_id,), rows=True)
+    return cita_detalle_desde_fila(row) if row else None
+
+
+async def listar_citas_pagina(ciudad: Optional[str] = None, desde: Optional[str] = None,
+                              hasta: Optional[str] = None, despues: Optional[str] = None,
+                              limite: int = CITAS_POR_PAGINA, db_path: str = DB_NAME) -> Dict[str, Any]:
+    """Versión asíncrona de database.listar_citas_pagina"""
+    limite = limite_pagina_citas(limite)
+    rows = []
+    async with connection_pool.connection(db_path) as conn:
+        for sql, params in consultas_pagina_citas(ciudad, desde, hasta, despues):
+            rows += await _fetchall(conn, sql, params + (limite + 1 - len(rows),), rows=True)
+            if len(rows) > limite:
+                break
+    return resultado_pagina_citas(rows, limite)
+
+
+async def iterar_paginas_citas(ciudad: Optional[str] = None, desde: Optional[str] = None,
+                               hasta: Optional[str] = None, despues: Optional[str] = None,
+                               limite: int = MAX_CITAS_POR_PAGINA,
+                               db_path: str = DB_NAME) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Recorre todas las páginas del listado de citas.
+
+    Cada página toma y devuelve su propia conexión del pool, así un cliente
+    lento consumiendo el stream no retiene conexiones entre páginas.
+    """
+    while True:
+        pagina = await listar_citas_pagina(ciudad, desde, hasta, despues, limite, db_path)
+        yield pagina
+        despues = pagina["siguiente"]
+        if not despues:
+            return
+
+
+async def eliminar_cita(id: int, db_path: str = DB_NAME) -> Optional[Dict[str, Any]]:
+    async with connection_pool.transaction(db_path) as conn:
+        horario = await _fetchone(conn, SQL_HORARIO_CITA, (id,))
+        cursor = await conn.execute(SQL_ELIMINAR_CITA, (id,))
+        rowcount = cursor.rowcount
+        await cursor.close()
+    if horario and rowcount:
+        availability_index.record(db_path, horario[0], horario[1], -1)
+    return rowcount
+
+
+async def cargar_indice_disponibilidad(db_path: str = DB_NAME) -> None:
+    """Reconstruye el índice de disponibilidad en memoria desde capacidad_horario"""
+    inicio_del_dia = datetime.now(timezone.utc).strftime("%Y-%m-%dT00:00:00Z")
+    async with connection_pool.connection(db_path) as conn:
+        rows = await _fetchall(conn, SQL_CAPACIDAD_FUTURA, (inicio_del_dia,))
+    availability_index.rebuild(db_path, rows)
+
+
+async def buscar_horarios_disponibles(ciudad: str, desde: Optional[str] = None, hasta: Optional[str] = None,
+                                      cantidad: int = 5, db_path: str = DB_NAME) -> Dict[str, Any]:
+    """Versión asíncrona de database.buscar_horarios_disponibles"""
+    try:
+        inicio, fin = rango_busqueda_horarios(desde, hasta)
+        if not availability_index.is_loaded(db_path):
+            await cargar_indice_disponibilidad(db_path)
+        libres = availability_index.find_open_slots(
+            ciudad, inicio, fin, max(1, min(int(cantidad), 10)), MAX_CITAS_POR_HORARIO
+        )
+        return resultado_horarios_disponibles(ciudad, libres)
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+async def close_async_connections() -> None:
+    """Cierra las conexiones aiosqlite del pool"""
+    await connection_pool.close_all()
+
+
+# Pool compartido por todas las funciones de este módulo
+connection_pool = AsyncConnectionPool()
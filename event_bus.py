@@ -0,0 +1,102 @@
+"""
+Pub/sub en memoria para notificar eventos a clientes conectados (SSE).
+
+Cada suscriptor tiene una cola acotada: si un cliente lento la llena, se
+descartan sus eventos más antiguos en lugar de frenar a quien publica.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """Suscripción de un cliente a un tópico"""
+
+    def __init__(self, bus: "EventBus", topic: str, max_queue_size: int):
+        self.bus = bus
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+
+    def put(self, event: Dict[str, Any]) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Espera el siguiente evento (None si se cumple el timeout)"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """Distribuye eventos por tópico a los suscriptores del loop principal"""
+
+    def __init__(self, max_queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+
+    def subscribe(self, topic: str, max_queue_size: Optional[int] = None) -> Subscription:
+        subscription = Subscription(self, topic, max_queue_size or self.max_queue_size)
+        self.subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self.subscribers.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self.subscribers
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        """Publica un evento sin bloquear (debe llamarse desde el loop)"""
+        subscribers = self.subscribers.get(topic)
+        if not subscribers:
+            return
+        self.published += 1
+        for subscription in list(subscribers):
+            subscription.put(event)
+
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def sse_stream(subscription: Subscription, heartbeat_seconds: float = 15.0,
+                     initial_events: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+    """
+    Convierte una suscripción en un stream Server-Sent Events.
+
+    Un evento con "final": True se envía y cierra el stream.
+    """
+    try:
+        yield "retry: 3000\n\n"
+        for event in initial_events or []:
+            yield _format_sse(event)
+        while True:
+            event = await subscription.get(timeout=heartbeat_seconds)
+            if event is None:
+                # Comentario SSE para mantener viva la conexión
+                yield ": keep-alive\n\n"
+                continue
+            yield _format_sse(event)
+            if event.get("final"):
+                break
+    finally:
+        subscription.close()
+
+
+# Instancia global del bus de eventos
+event_bus = EventBus()
@@ -1,11 +1,233 @@
-from functions import available_functions
+from functions import available_functions, available_async_functions
 import json
 import asyncio
-from typing import Any, Dict
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Pools de hilos por clase de tool: una tool colgada (SMTP, Redis) solo ocupa su pool
+EXECUTOR_WORKERS = {
+    "db": int(os.getenv("FUNCTION_DB_WORKERS", 8)),
+    "network": int(os.getenv("FUNCTION_NETWORK_WORKERS", 16)),
+    "cpu": int(os.getenv("FUNCTION_CPU_WORKERS", os.cpu_count() or 2)),
+}
+
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", 1000))
+
+# Ejecuta las tools idempotentes apenas llegan sus argumentos (antes de response.done)
+SPECULATIVE_TOOLS = os.getenv("SPECULATIVE_TOOLS", "true").lower() in ("1", "true", "yes")
+
+# Usa las variantes aiosqlite de las tools de base de datos en lugar del pool "db"
+ASYNC_DB_TOOLS = os.getenv("ASYNC_DB_TOOLS", "true").lower() in ("1", "true", "yes")
+
+
+class FunctionPolicy:
+    """Política de ejecución de una tool"""
+
+    def __init__(self, executor: str = "db", timeout: float = 10.0, max_concurrency: int = 8,
+                 fallback: Any = None, cache_ttl: Optional[float] = None, invalidates: Sequence[str] = (),
+                 speculative: bool = False):
+        """
+        Args:
+            executor: Clase de pool donde corre si es síncrona ("db", "network" o "cpu")
+            timeout: Segundos máximos de espera por el resultado
+            max_concurrency: Ejecuciones simultáneas permitidas en todo el servidor
+            fallback: Resultado que se retorna si se cumple el timeout
+                (None: {"error": "... no respondió a tiempo"})
+            cache_ttl: Segundos que se reutiliza el resultado para los mismos argumentos
+                (None: no se cachea; solo para tools de lectura)
+            invalidates: Tools cuyo caché se descarta cuando esta tool se ejecuta
+                (tools de escritura como crear_cita)
+            speculative: La tool es idempotente y se puede ejecutar por adelantado
+                con los argumentos de response.function_call_arguments.done
+        """
+        self.executor = executor
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.fallback = fallback
+        self.cache_ttl = cache_ttl
+        self.invalidates = tuple(invalidates)
+        self.speculative = speculative
+
+
+DEFAULT_POLICY = FunctionPolicy()
+
+_RAG_FALLBACK = "No se pudo consultar la información a tiempo. Ofrece al usuario intentarlo de nuevo en un momento."
+
+# Tools cuyo resultado depende de las citas agendadas
+_APPOINTMENT_READS = ("verificar_disponibilidad_citas", "obtener_citas_activas_usuario", "obtener_cita_examen_medico",
+                      "buscar_horarios_disponibles")
+
+FUNCTION_POLICIES: Dict[str, FunctionPolicy] = {
+    "listar_usuarios": FunctionPolicy("db", timeout=5.0, cache_ttl=60.0, speculative=True),
+    "obtener_usuario": FunctionPolicy("db", timeout=5.0, cache_ttl=60.0, speculative=True),
+    "obtener_examenes_medicos": FunctionPolicy("db", timeout=5.0, cache_ttl=60.0, speculative=True),
+    "obtener_cita_examen_medico": FunctionPolicy("db", timeout=5.0, cache_ttl=30.0, speculative=True),
+    "verificar_disponibilidad_citas": FunctionPolicy("db", timeout=5.0, cache_ttl=30.0, speculative=True),
+    "obtener_citas_activas_usuario": FunctionPolicy("db", timeout=5.0, cache_ttl=30.0, speculative=True),
+    "buscar_horarios_disponibles": FunctionPolicy("db", timeout=5.0, cache_ttl=30.0, speculative=True),
+    "eliminar_cita": FunctionPolicy("db", timeout=5.0, invalidates=_APPOINTMENT_READS),
+    # crear_cita también envía el correo de confirmación por SMTP
+    "crear_cita": FunctionPolicy("network", timeout=15.0, invalidates=_APPOINTMENT_READS, fallback={
+        "success": False,
+        "error": "La creación de la cita tardó demasiado. Verifica las citas activas del usuario antes de reintentar."
+    }),
+    "send_email_with_file": FunctionPolicy("network", timeout=15.0, max_concurrency=4, fallback={
+        "success": False,
+        "error": "El correo no pudo enviarse a tiempo"
+    }),
+    "search_general_exam_info": FunctionPolicy("network", timeout=6.0, fallback=_RAG_FALLBACK, cache_ttl=600.0,
+                                               speculative=True),
+    "search_info_about_the_lab": FunctionPolicy("network", timeout=6.0, fallback=_RAG_FALLBACK, cache_ttl=600.0,
+                                                speculative=True),
+}
+
+
+def _is_error_result(result: Any) -> bool:
+    """Los errores no se cachean (las tools los retornan en vez de lanzar excepciones)"""
+    if isinstance(result, dict):
+        return "error" in result or result.get("success") is False
+    if isinstance(result, str):
+        return result.startswith("Error")
+    return result is None
+
+
+class ToolResultCache:
+    """Caché LRU con TTL de resultados de tools de lectura, compartido por todas las llamadas"""
+
+    def __init__(self, max_entries: int = TOOL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.per_function: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(function_name: str, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        # Argumentos exactos: las tools comparan texto tal cual ('Bogotá' != 'BOGOTÁ' en SQLite)
+        return function_name, json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+
+    def _count(self, function_name: str, outcome: str) -> None:
+        counters = self.per_function.setdefault(function_name, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+    def get(self, key: Tuple[str, str]) -> Tuple[bool, Any]:
+        """Retorna (encontrado, resultado)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._count(key[0], "hits")
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            self._count(key[0], "misses")
+            return False, None
+
+    def set(self, key: Tuple[str, str], result: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, function_names: Iterable[str]) -> int:
+        """Descarta los resultados cacheados de esas tools"""
+        names = set(function_names)
+        with self._lock:
+            stale = [key for key in self._entries if key[0] in names]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "per_function": {name: dict(counters) for name, counters in self.per_function.items()},
+        }
+
+
+# Caché global de resultados de tools
+tool_cache = ToolResultCache()
+
+# Ejecuciones especulativas: iniciadas, aprovechadas en response.done y descartadas
+speculation_metrics = {"started": 0, "used": 0, "discarded": 0}
+
+
+# Estado compartido por todas las llamadas (cada llamada crea su propio FunctionManager)
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _get_executor(executor_class: str) -> ThreadPoolExecutor:
+    executor = _executors.get(executor_class)
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=EXECUTOR_WORKERS.get(executor_class, 4),
+            thread_name_prefix=f"tool-{executor_class}"
+        )
+        _executors[executor_class] = executor
+    return executor
+
+
+async def run_blocking(executor_class: str, func, *args, **kwargs) -> Any:
+    """
+    Ejecuta una función bloqueante en el pool acotado de su clase ("db", "network" o "cpu").
+
+    Para trabajo bloqueante dentro de las tools asíncronas (ej. el SMTP de
+    database_async.crear_cita): así respeta el mismo límite de hilos que las
+    tools síncronas en lugar de ocupar el executor por defecto del loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(executor_class), partial(func, *args, **kwargs)
+    )
+
+
+def _get_semaphore(function_name: str, policy: FunctionPolicy) -> asyncio.Semaphore:
+    semaphore = _semaphores.get(function_name)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(policy.max_concurrency)
+        _semaphores[function_name] = semaphore
+    return semaphore
+
+
+def shutdown_executors() -> None:
+    """Cierra los pools de las tools sin esperar a las que quedaron colgadas"""
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
+
 
 class FunctionManager:
-    def __init__(self):
-        self.functions = available_functions
+    def __init__(self, policies: Optional[Dict[str, FunctionPolicy]] = None):
+        self.functions = {**available_functions, **available_async_functions} if ASYNC_DB_TOOLS else available_functions
+        self.policies = FUNCTION_POLICIES if policies is None else policies
+        # call_id del function_call -> (nombre, argumentos, tarea) iniciada por adelantado
+        self._speculative: Dict[str, Tuple[str, str, asyncio.Task]] = {}
+
+    def get_policy(self, function_name: str) -> FunctionPolicy:
+        return self.policies.get(function_name, DEFAULT_POLICY)
 
     async def execute_function(self, function_name: str, arguments: str) -> Dict[str, Any]:
         """
@@ -16,7 +238,8 @@ class FunctionManager:
             arguments: Argumentos en formato JSON string
 
         Returns:
-            Resultado de la función ejecutada
+            Resultado de la función ejecutada, o el fallback de su política si
+            no responde dentro del timeout
         """
         if function_name not in self.functions:
             raise ValueError(f"Function '{function_name}' not found.")
@@ -27,13 +250,111 @@ class FunctionManager:
         except json.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON arguments: {e}")
 
-        # Ejecutar función (sync o async)
+        policy = self.get_policy(function_name)
+
+        cache_key = None
+        if policy.cache_ttl:
+            cache_key = tool_cache.make_key(function_name, kwargs)
+            found, cached = tool_cache.get(cache_key)
+            if found:
+                logger.debug("♻️ %s desde caché", function_name, extra={"function": function_name})
+                return cached
+
+        try:
+            result = await asyncio.wait_for(self._run(function_name, policy, kwargs), policy.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⏱️ %s excedió su timeout de %ss", function_name, policy.timeout,
+                           extra={"function": function_name})
+            if policy.fallback is None:
+                return {"error": f"La función {function_name} no respondió a tiempo"}
+            return policy.fallback
+        finally:
+            # Una escritura (aunque falle o venza su timeout) puede haber cambiado los datos
+            if policy.invalidates:
+                tool_cache.invalidate(policy.invalidates)
+
+        if cache_key is not None and not _is_error_result(result):
+            tool_cache.set(cache_key, result, policy.cache_ttl)
+        return result
+
+    def start_speculative(self, call_id: str, function_name: str, arguments: str) -> bool:
+        """
+        Empieza a ejecutar una tool idempotente antes de que el modelo termine la respuesta.
+
+        Args:
+            call_id: ID del function_call (el mismo que llega en response.done)
+            function_name: Nombre de la tool
+            arguments: Argumentos completos en formato JSON string
+
+        Returns:
+            True si se inició la ejecución especulativa
+        """
+        if not SPECULATIVE_TOOLS or not call_id or call_id in self._speculative:
+            return False
+        if function_name not in self.functions or not self.get_policy(function_name).speculative:
+            return False
+
+        task = asyncio.get_running_loop().create_task(
+            self.execute_function(function_name, arguments), name=f"speculative_{function_name}"
+        )
+        self._speculative[call_id] = (function_name, arguments, task)
+        speculation_metrics["started"] += 1
+        return True
+
+    async def run_function_call(self, call_id: str, function_name: str, arguments: str) -> Any:
+        """Ejecuta un function_call, aprovechando su ejecución especulativa si coincide"""
+        speculative = self._speculative.pop(call_id, None)
+        if speculative is not None:
+            speculative_name, speculative_arguments, task = speculative
+            if speculative_name == function_name and speculative_arguments == arguments:
+                speculation_metrics["used"] += 1
+                return await task
+            _discard(task)
+        return await self.execute_function(function_name, arguments)
+
+    def cancel_speculative(self) -> None:
+        """Descarta las ejecuciones especulativas que nadie reclamó (al terminar la llamada)"""
+        for _, _, task in self._speculative.values():
+            _discard(task)
+        self._speculative.clear()
+
+    async def _run(self, function_name: str, policy: FunctionPolicy, kwargs: Dict[str, Any]) -> Any:
+        """Ejecuta la función respetando el límite de concurrencia de su política"""
         func = self.functions[function_name]
+        semaphore = _get_semaphore(function_name, policy)
 
-        # Ejecutar en thread pool si es función síncrona
+        # Ejecutar la corrutina directamente: el timeout la cancela
         if asyncio.iscoroutinefunction(func):
-            result = await func(**kwargs)
-        else:
-            result = await asyncio.to_thread(func, **kwargs)
+            async with semaphore:
+                return await func(**kwargs)
+
+        # Ejecutar en el pool de su clase si es función síncrona. Un hilo no se
+        # puede cancelar: si vence el timeout sigue en segundo plano y el cupo del
+        # semáforo se libera recién cuando termina.
+        await semaphore.acquire()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                _get_executor(policy.executor), partial(func, **kwargs)
+            )
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(partial(_release_when_done, semaphore))
+        return await asyncio.shield(future)
+
+
+def _discard(task: asyncio.Task) -> None:
+    speculation_metrics["discarded"] += 1
+    if task.done():
+        # Consume el resultado para no dejar excepciones huérfanas
+        if not task.cancelled():
+            task.exception()
+    else:
+        task.cancel()
+
 
-        return result
\ No newline at end of file
+def _release_when_done(semaphore: asyncio.Semaphore, future: asyncio.Future) -> None:
+    semaphore.release()
+    # Si nadie esperó el resultado (timeout) se consume la excepción para no dejarla huérfana
+    if not future.cancelled() and future.exception() is not None:
+        logger.debug("Tool terminó con error: %s", future.exception())
@@ -6,9 +6,11 @@ from database import (
     crear_cita,
     verificar_disponibilidad_citas,
     obtener_citas_activas_usuario,
-    eliminar_cita
+    eliminar_cita,
+    buscar_horarios_disponibles
 )
 
+import database_async
 from email_helper import send_email_with_file
 from rag_functions import search_general_exam_info, search_info_about_the_lab
 
@@ -157,6 +159,33 @@ tools = [
             "required": ["fecha_cita", "ciudad"]
         }
     },
+    {
+        "type": "function",
+        "name": "buscar_horarios_disponibles",
+        "description": "Busca en una sola consulta los próximos horarios con cupo para agendar en una ciudad. Úsala cuando el usuario no tiene una hora exacta o la hora que pidió no está disponible, en lugar de probar horario por horario con verificar_disponibilidad_citas. Retorna los horarios en formato '2025-10-15 10:30 AM', listos para usar en crear_cita.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "ciudad": {
+                    "type": "string",
+                    "description": "Ciudad donde se busca disponibilidad. Ejemplos: 'Barranquilla', 'Bogotá', 'Medellín', 'Cali'"
+                },
+                "desde": {
+                    "type": "string",
+                    "description": "Fecha y hora desde la que se busca, en formato '2025-10-15 10:30 AM' o '2025-10-15'. Si se omite, desde ahora"
+                },
+                "hasta": {
+                    "type": "string",
+                    "description": "Fecha y hora límite de la búsqueda. Si es solo una fecha ('2025-10-15') incluye todo ese día. Si se omite, 14 días después de 'desde'"
+                },
+                "cantidad": {
+                    "type": "integer",
+                    "description": "Número de horarios a retornar (1 a 10). Por defecto 5"
+                }
+            },
+            "required": ["ciudad"]
+        }
+    },
     {
         "type": "function",
         "name": "obtener_citas_activas_usuario",
@@ -228,5 +257,19 @@ available_functions = {
     "verificar_disponibilidad_citas": verificar_disponibilidad_citas,
     "obtener_citas_activas_usuario": obtener_citas_activas_usuario,
     "crear_cita": crear_cita,
-    "eliminar_cita": eliminar_cita
+    "eliminar_cita": eliminar_cita,
+    "buscar_horarios_disponibles": buscar_horarios_disponibles
+}
+
+# Variantes asíncronas (aiosqlite) de las tools de base de datos: no bloquean el event loop
+available_async_functions = {
+    "listar_usuarios": database_async.listar_usuarios,
+    "obtener_usuario": database_async.obtener_usuario,
+    "obtener_examenes_medicos": database_async.obtener_examenes_medicos,
+    "obtener_cita_examen_medico": database_async.obtener_cita_examen_medico,
+    "verificar_disponibilidad_citas": database_async.verificar_disponibilidad_citas,
+    "obtener_citas_activas_usuario": database_async.obtener_citas_activas_usuario,
+    "crear_cita": database_async.crear_cita,
+    "eliminar_cita": database_async.eliminar_cita,
+    "buscar_horarios_disponibles": database_async.buscar_horarios_disponibles
 }
\ No newline at end of file
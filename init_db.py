@@ -1,17 +1,19 @@
 import sqlite3
 import sqlite3
+import logging
 import os 
-from typing import Optional, Tuple, List, Dict, Any, Union
+import time
+from typing import Optional, Tuple, List, Dict, Any, Union, Callable
 import re
 
 
 
 DB_NAME = "database.db"
-def init_db(db_path: str = DB_NAME):
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+logger = logging.getLogger(__name__)
 
+
+def _crear_tablas(cursor: sqlite3.Cursor) -> None:
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS usuarios (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -51,14 +53,255 @@ def init_db(db_path: str = DB_NAME):
         )
     ''')
 
-    conn.commit()
-    conn.close()
-    print(f"Database initialized successfully in {db_path}")
+
+def _crear_indices_citas(cursor: sqlite3.Cursor) -> None:
+    # verificar_disponibilidad_citas: filtra por ciudad y fecha; id_usuario cubre el JOIN
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cita_ciudad_fecha
+        ON cita_examen_medico (ciudad, fecha_cita, id_usuario)
+    ''')
+    # obtener_citas_activas_usuario: filtra por usuario y ordena por fecha
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cita_usuario_fecha
+        ON cita_examen_medico (id_usuario, fecha_cita)
+    ''')
+    # obtener_examenes_medicos
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_examenes_usuario
+        ON examenes_medicos (id_usuario)
+    ''')
+
+
+def _crear_capacidad_horarios(cursor: sqlite3.Cursor) -> None:
+    # Citas agendadas por ciudad y horario: la disponibilidad es una búsqueda por clave primaria
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS capacidad_horario (
+            ciudad TEXT NOT NULL,
+            fecha_cita TEXT NOT NULL,
+            citas_agendadas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (ciudad, fecha_cita)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO capacidad_horario (ciudad, fecha_cita, citas_agendadas)
+        SELECT ciudad, fecha_cita, COUNT(*)
+        FROM cita_examen_medico
+        WHERE ciudad IS NOT NULL AND fecha_cita IS NOT NULL
+        GROUP BY ciudad, fecha_cita
+    ''')
+
+    # Los triggers mantienen los contadores en la misma transacción que la cita,
+    # sin importar quién inserte o borre (crear_cita, eliminar_cita, seed, scripts)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_capacidad_cita_insert
+        AFTER INSERT ON cita_examen_medico
+        WHEN NEW.ciudad IS NOT NULL AND NEW.fecha_cita IS NOT NULL
+        BEGIN
+            INSERT INTO capacidad_horario (ciudad, fecha_cita, citas_agendadas)
+            VALUES (NEW.ciudad, NEW.fecha_cita, 1)
+            ON CONFLICT (ciudad, fecha_cita) DO UPDATE SET citas_agendadas = citas_agendadas + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_capacidad_cita_delete
+        AFTER DELETE ON cita_examen_medico
+        WHEN OLD.ciudad IS NOT NULL AND OLD.fecha_cita IS NOT NULL
+        BEGIN
+            UPDATE capacidad_horario SET citas_agendadas = citas_agendadas - 1
+            WHERE ciudad = OLD.ciudad AND fecha_cita = OLD.fecha_cita;
+            DELETE FROM capacidad_horario
+            WHERE ciudad = OLD.ciudad AND fecha_cita = OLD.fecha_cita AND citas_agendadas <= 0;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_capacidad_cita_update
+        AFTER UPDATE OF ciudad, fecha_cita ON cita_examen_medico
+        BEGIN
+            UPDATE capacidad_horario SET citas_agendadas = citas_agendadas - 1
+            WHERE ciudad = OLD.ciudad AND fecha_cita = OLD.fecha_cita;
+            DELETE FROM capacidad_horario
+            WHERE ciudad = OLD.ciudad AND fecha_cita = OLD.fecha_cita AND citas_agendadas <= 0;
+            INSERT INTO capacidad_horario (ciudad, fecha_cita, citas_agendadas)
+            SELECT NEW.ciudad, NEW.fecha_cita, 1
+            WHERE NEW.ciudad IS NOT NULL AND NEW.fecha_cita IS NOT NULL
+            ON CONFLICT (ciudad, fecha_cita) DO UPDATE SET citas_agendadas = citas_agendadas + 1;
+        END
+    ''')
+
+
+def _normalizar_fechas_citas(cursor: sqlite3.Cursor) -> None:
+    from appointment_dates import normalize_fecha_cita
+
+    columnas = {row[1] for row in cursor.execute("PRAGMA table_info(cita_examen_medico)")}
+    if "fecha_cita_utc" not in columnas:
+        cursor.execute("ALTER TABLE cita_examen_medico ADD COLUMN fecha_cita_utc TEXT")
+
+    # Backfill por lotes de id para no cargar toda la tabla en memoria
+    ultimo_id = 0
+    sin_reconocer = 0
+    while True:
+        filas = cursor.execute('''
+            SELECT id, fecha_cita FROM cita_examen_medico
+            WHERE id > ? AND fecha_cita IS NOT NULL AND fecha_cita_utc IS NULL
+            ORDER BY id LIMIT 10000
+        ''', (ultimo_id,)).fetchall()
+        if not filas:
+            break
+        ultimo_id = filas[-1][0]
+        valores = [(normalize_fecha_cita(fecha_cita), id_cita) for id_cita, fecha_cita in filas]
+        sin_reconocer += sum(1 for fecha_utc, _ in valores if fecha_utc is None)
+        cursor.executemany("UPDATE cita_examen_medico SET fecha_cita_utc = ? WHERE id = ?",
+                           [(fecha_utc, id_cita) for fecha_utc, id_cita in valores if fecha_utc is not None])
+    if sin_reconocer:
+        logger.warning("⚠️ %s citas con fecha_cita no reconocida quedaron sin fecha_cita_utc", sin_reconocer)
+
+    # Consultas por rango: citas activas de un usuario, citas por fecha y por ciudad
+    cursor.execute("DROP INDEX IF EXISTS idx_cita_ciudad_fecha")
+    cursor.execute("DROP INDEX IF EXISTS idx_cita_usuario_fecha")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cita_usuario_fecha_utc
+        ON cita_examen_medico (id_usuario, fecha_cita_utc)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cita_fecha_utc
+        ON cita_examen_medico (fecha_cita_utc)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cita_ciudad_fecha_utc
+        ON cita_examen_medico (ciudad, fecha_cita_utc)
+    ''')
+
+    # capacidad_horario pasa a usar el horario normalizado: '10:30 AM' y '10:30' son el mismo cupo
+    for trigger in ("trg_capacidad_cita_insert", "trg_capacidad_cita_delete", "trg_capacidad_cita_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS capacidad_horario")
+    cursor.execute('''
+        CREATE TABLE capacidad_horario (
+            ciudad TEXT NOT NULL,
+            horario TEXT NOT NULL,
+            citas_agendadas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (ciudad, horario)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT INTO capacidad_horario (ciudad, horario, citas_agendadas)
+        SELECT ciudad, COALESCE(fecha_cita_utc, fecha_cita), COUNT(*)
+        FROM cita_examen_medico
+        WHERE ciudad IS NOT NULL AND COALESCE(fecha_cita_utc, fecha_cita) IS NOT NULL
+        GROUP BY ciudad, COALESCE(fecha_cita_utc, fecha_cita)
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_capacidad_cita_insert
+        AFTER INSERT ON cita_examen_medico
+        WHEN NEW.ciudad IS NOT NULL AND COALESCE(NEW.fecha_cita_utc, NEW.fecha_cita) IS NOT NULL
+        BEGIN
+            INSERT INTO capacidad_horario (ciudad, horario, citas_agendadas)
+            VALUES (NEW.ciudad, COALESCE(NEW.fecha_cita_utc, NEW.fecha_cita), 1)
+            ON CONFLICT (ciudad, horario) DO UPDATE SET citas_agendadas = citas_agendadas + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_capacidad_cita_delete
+        AFTER DELETE ON cita_examen_medico
+        WHEN OLD.ciudad IS NOT NULL AND COALESCE(OLD.fecha_cita_utc, OLD.fecha_cita) IS NOT NULL
+        BEGIN
+            UPDATE capacidad_horario SET citas_agendadas = citas_agendadas - 1
+            WHERE ciudad = OLD.ciudad AND horario = COALESCE(OLD.fecha_cita_utc, OLD.fecha_cita);
+            DELETE FROM capacidad_horario
+            WHERE ciudad = OLD.ciudad AND horario = COALESCE(OLD.fecha_cita_utc, OLD.fecha_cita)
+              AND citas_agendadas <= 0;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER trg_capacidad_cita_update
+        AFTER UPDATE OF ciudad, fecha_cita, fecha_cita_utc ON cita_examen_medico
+        BEGIN
+            UPDATE capacidad_horario SET citas_agendadas = citas_agendadas - 1
+            WHERE ciudad = OLD.ciudad AND horario = COALESCE(OLD.fecha_cita_utc, OLD.fecha_cita);
+            DELETE FROM capacidad_horario
+            WHERE ciudad = OLD.ciudad AND horario = COALESCE(OLD.fecha_cita_utc, OLD.fecha_cita)
+              AND citas_agendadas <= 0;
+            INSERT INTO capacidad_horario (ciudad, horario, citas_agendadas)
+            SELECT NEW.ciudad, COALESCE(NEW.fecha_cita_utc, NEW.fecha_cita), 1
+            WHERE NEW.ciudad IS NOT NULL AND COALESCE(NEW.fecha_cita_utc, NEW.fecha_cita) IS NOT NULL
+            ON CONFLICT (ciudad, horario) DO UPDATE SET citas_agendadas = citas_agendadas + 1;
+        END
+    ''')
+
+
+# Migraciones del esquema en orden. Cada una se aplica una sola vez y su número
+# queda en PRAGMA user_version. Una migración publicada no se edita: se agrega otra.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "Tablas usuarios, examenes_medicos y cita_examen_medico", _crear_tablas),
+    (2, "Índices de citas por ciudad/fecha y por usuario, y de exámenes por usuario", _crear_indices_citas),
+    (3, "Tabla capacidad_horario con contadores de citas por ciudad y horario", _crear_capacidad_horarios),
+    (4, "Columna fecha_cita_utc normalizada e indexada; capacidad_horario por horario normalizado", _normalizar_fechas_citas),
+]
+
+
+def get_schema_version(db_path: str = DB_NAME) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def apply_migrations(db_path: str = DB_NAME, target: Optional[int] = None) -> int:
+    """
+    Aplica las migraciones pendientes (idempotente; se llama al arrancar el servidor).
+
+    Cada migración corre en su propia transacción junto con el cambio de
+    user_version, así que una migración fallida no deja el esquema a medias.
+    BEGIN IMMEDIATE evita que dos procesos apliquen la misma migración a la vez.
+
+    Args:
+        db_path: Ruta de la base de datos
+        target: Versión hasta la que se migra (None: la última)
+
+    Returns:
+        Versión del esquema después de migrar
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+
+    try:
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, description, migrate in MIGRATIONS:
+            if number <= version or (target is not None and number > target):
+                continue
+
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # Otro proceso pudo aplicarla mientras esperábamos el bloqueo
+                if cursor.execute("PRAGMA user_version").fetchone()[0] >= number:
+                    cursor.execute("COMMIT")
+                    continue
+                start = time.perf_counter()
+                migrate(cursor)
+                cursor.execute(f"PRAGMA user_version = {int(number)}")
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+            version = number
+            logger.info("🗄️ Migración %s aplicada en %.2fs: %s", number, time.perf_counter() - start, description)
+
+        return cursor.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def init_db(db_path: str = DB_NAME):
+    version = apply_migrations(db_path)
+    print(f"Database initialized successfully in {db_path} (schema version {version})")
 
 def seed_example_data(db_path: str = DB_NAME):
     import random
     from datetime import datetime
     import glob
+    from appointment_dates import normalize_fecha_cita
 
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -117,10 +360,10 @@ def seed_example_data(db_path: str = DB_NAME):
             cursor.execute(
                 """
                 INSERT INTO cita_examen_medico (
-                    id_usuario, fecha_cita, id_examen_medico, ciudad, direccion_usuario
-                ) VALUES (?, ?, ?, ?, ?)
+                    id_usuario, fecha_cita, fecha_cita_utc, id_examen_medico, ciudad, direccion_usuario
+                ) VALUES (?, ?, ?, ?, ?, ?)
                 """,
-                (user_id, fecha_cita, examen_id, ciudad, direccion_usuario),
+                (user_id, fecha_cita, normalize_fecha_cita(fecha_cita), examen_id, ciudad, direccion_usuario),
             )
 
     conn.commit()
@@ -128,5 +371,6 @@ def seed_example_data(db_path: str = DB_NAME):
     print("Example data seeded successfully.")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     init_db()
     seed_example_data()
\ No newline at end of file
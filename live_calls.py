@@ -0,0 +1,76 @@
+"""
+Monitoreo en vivo de llamadas en curso.
+
+handle_websocket_message publica aquí los eventos de transcripción de cada
+llamada; los supervisores los reciben por SSE desde /calls/{call_id}/transcript/stream
+sin esperar a que la grabación se guarde al colgar.
+"""
+from typing import Any, Dict, List, Optional
+
+from event_bus import event_bus
+
+
+def call_topic(call_id: str) -> str:
+    """Tópico del bus con los eventos en vivo de una llamada"""
+    return f"call:{call_id}"
+
+
+def _assistant_delta(message_data: dict) -> Optional[Dict[str, Any]]:
+    text = message_data.get("delta", "")
+    return {"type": "transcript.delta", "speaker": "assistant", "text": text} if text else None
+
+
+def _user_completed(message_data: dict) -> Optional[Dict[str, Any]]:
+    text = message_data.get("transcript", "")
+    return {"type": "transcript.completed", "speaker": "user", "text": text} if text else None
+
+
+def _function_calls(message_data: dict) -> Optional[Dict[str, Any]]:
+    output_items = message_data.get("response", {}).get("output", [])
+    calls = [item.get("name") for item in output_items if item.get("type") == "function_call"]
+    usage = message_data.get("response", {}).get("usage", {})
+    return {"type": "response.done", "function_calls": calls, "total_tokens": usage.get("total_tokens", 0)}
+
+
+# Tipo de evento del Realtime API -> constructor del evento en vivo
+LIVE_EVENT_BUILDERS = {
+    "response.audio_transcript.delta": _assistant_delta,
+    "response.output_audio_transcript.delta": _assistant_delta,
+    "conversation.item.input_audio_transcription.completed": _user_completed,
+    "input_audio_buffer.speech_started": lambda _: {"type": "speech.started", "speaker": "user"},
+    "input_audio_buffer.speech_stopped": lambda _: {"type": "speech.stopped", "speaker": "user"},
+    "response.done": _function_calls,
+}
+
+
+def publish_realtime_event(call_id: str, message_data: dict) -> None:
+    """Publica el evento en vivo de la llamada si alguien la está monitoreando"""
+    topic = call_topic(call_id)
+    if not event_bus.has_subscribers(topic):
+        return
+
+    builder = LIVE_EVENT_BUILDERS.get(message_data.get("type", ""))
+    if builder is None:
+        return
+
+    event = builder(message_data)
+    if event:
+        event["call_id"] = call_id
+        event_bus.publish(topic, event)
+
+
+def publish_call_ended(call_id: str) -> None:
+    """Avisa a los monitores de la llamada que terminó (cierra sus streams)"""
+    event_bus.publish(call_topic(call_id), {"type": "call.ended", "call_id": call_id, "final": True})
+
+
+def transcript_snapshot(conversation_log: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Transcripción acumulada hasta ahora, para quien empieza a monitorear a mitad de llamada"""
+    return {
+        "type": "transcript.snapshot",
+        "entries": [
+            {"timestamp": entry["timestamp"], "speaker": entry["speaker"], "text": entry["text"]}
+            for entry in conversation_log
+            if "speaker" in entry
+        ],
+    }
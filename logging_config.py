@@ -0,0 +1,176 @@
+"""
+Configuración de logging estructurado para el servidor.
+
+- Niveles por módulo (LOG_LEVEL y LOG_LEVELS="main=DEBUG,call_recorder=WARNING").
+- Salida JSON (LOG_FORMAT=json) o texto (LOG_FORMAT=text) con call_id y remote_jid
+  tomados de variables de contexto, así cada línea queda asociada a su llamada
+  o chat aunque haya cientos en paralelo.
+- Escritura no bloqueante: los registros se encolan (QueueHandler) y un hilo
+  aparte (QueueListener) los escribe en stdout.
+- Limitación de frecuencia para eventos de alta frecuencia (deltas de audio o
+  transcripción): los registros con extra={"rate_limit_key": ...} se emiten como
+  máximo LOG_RATE_LIMIT veces por segundo por clave y llamada.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+# Contexto de la llamada o chat que se está atendiendo (cada tarea asyncio tiene el suyo)
+call_id_var: ContextVar[Optional[str]] = ContextVar("call_id", default=None)
+remote_jid_var: ContextVar[Optional[str]] = ContextVar("remote_jid", default=None)
+
+# Atributos propios de LogRecord; el resto viene de extra={...} y se incluye en el JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class ContextFilter(logging.Filter):
+    """Agrega call_id y remote_jid del contexto actual a cada registro"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "call_id"):
+            record.call_id = call_id_var.get()
+        if not hasattr(record, "remote_jid"):
+            record.remote_jid = remote_jid_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limita los registros marcados con rate_limit_key.
+
+    Se permiten max_per_second registros por (clave, call_id); los descartados
+    se cuentan y se reportan como "suppressed" en el siguiente que pase.
+    """
+
+    def __init__(self, max_per_second: float = 1.0):
+        super().__init__()
+        self.interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self._windows: Dict[Tuple[str, Optional[str]], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "rate_limit_key", None)
+        if key is None or self.interval == 0.0:
+            return True
+
+        window_key = (key, getattr(record, "call_id", None))
+        now = time.monotonic()
+        with self._lock:
+            last_emit, suppressed = self._windows.get(window_key, (0.0, 0))
+            if now - last_emit < self.interval:
+                self._windows[window_key] = (last_emit, suppressed + 1)
+                return False
+            self._windows[window_key] = (now, 0)
+            # Evita que el diccionario crezca sin límite con llamadas ya terminadas
+            if len(self._windows) > 10000:
+                self._windows = {k: v for k, v in self._windows.items() if now - v[0] < 60}
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "rate_limit_key" and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legible para desarrollo local, con el contexto entre corchetes"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s%(context)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        context = [f"{key}={getattr(record, key)}" for key in ("call_id", "remote_jid", "suppressed")
+                   if getattr(record, key, None) is not None]
+        record.context = f" [{' '.join(context)}]" if context else ""
+        return super().format(record)
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    """Interpreta "modulo=NIVEL,otro=NIVEL" """
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: Optional[str] = None, levels: Optional[str] = None,
+                  log_format: Optional[str] = None, rate_limit: Optional[float] = None) -> None:
+    """
+    Configura el logger raíz con una cola no bloqueante (idempotente).
+
+    Los argumentos omitidos se leen de LOG_LEVEL, LOG_LEVELS, LOG_FORMAT y
+    LOG_RATE_LIMIT al momento de llamar (después de load_dotenv).
+
+    Args:
+        level: Nivel por defecto
+        levels: Niveles por módulo ("main=DEBUG,call_recorder=WARNING")
+        log_format: "json" o "text"
+        rate_limit: Registros por segundo permitidos por clave limitada y llamada
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        level = level or os.getenv("LOG_LEVEL", "INFO")
+        levels = levels if levels is not None else os.getenv("LOG_LEVELS", "")
+        log_format = log_format or os.getenv("LOG_FORMAT", "json")
+        rate_limit = rate_limit if rate_limit is not None else float(os.getenv("LOG_RATE_LIMIT", 1))
+
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+        # Los filtros corren en el hilo que registra: ahí están las variables de contexto
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+        root = logging.getLogger()
+        root.handlers = [queue_handler]
+        root.setLevel(level.upper())
+        for name, module_level in _parse_levels(levels).items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Vacía la cola y detiene el hilo de escritura"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -1,22 +1,35 @@
-from fastapi import FastAPI, Request, Response, HTTPException
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi import FastAPI, Request, Response, HTTPException, Query
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from realtime_config import choose_random_assistant
 from whatsapp_config import get_whatsapp_prompt
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import asyncio
 import websockets
 import json
+import html
 import httpx
-import threading
-from function_manager import FunctionManager
-from database import obtener_cita_por_id, listar_todas_citas
-from call_recorder import call_recorder
+from urllib.parse import urlencode
+from function_manager import FunctionManager, shutdown_executors, tool_cache, speculation_metrics
+from database import close_connections, DB_NAME, CITAS_POR_PAGINA, consultas_pagina_citas
+from init_db import apply_migrations
+from database_async import obtener_cita_por_id, listar_citas_pagina, iterar_paginas_citas, close_async_connections, cargar_indice_disponibilidad
+from availability_index import availability_index
+from recordings_catalog import MAX_RECORDINGS_PAGE
+from call_recorder import CallRecorder, recorder_pool, RECORDINGS_TOPIC, AUDIO_EVENTS
+from session_supervisor import session_supervisor
+from recording_sink import recording_sink
+from audio_encoders import find_audio_file, audio_media_type, transcode_to_wav
+from range_response import ranged_file_response
+from event_bus import event_bus, sse_stream
+from live_calls import call_topic, publish_realtime_event, publish_call_ended, transcript_snapshot
+from logging_config import setup_logging, shutdown_logging, call_id_var, remote_jid_var
+from realtime_codec import realtime_codec, peek_event
 from fastapi import FastAPI, Request, HTTPException
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Awaitable
 import httpx
 from datetime import datetime
 import json
@@ -26,13 +39,16 @@ from openai import OpenAI
 import sys
 import pathlib
 from function_manager import FunctionManager
-from functions import tools, available_functions
+from functions import tools
 from conversation_cache import conversation_cache
 import locale
+import logging
 
 
 
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Agregar el directorio padre al path para importar módulos
 parent_dir = pathlib.Path(__file__).parent.parent
@@ -44,8 +60,8 @@ EVOLUTION_API_URL = os.getenv("EVOLUTION_API_URL")
 EVOLUTION_API_KEY = os.getenv("EVOLUTION_API_KEY")
 INSTANCE_NAME = os.getenv("INSTANCE_NAME")
 
-# Configuración de OpenAI
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Configuración de OpenAI (cliente asíncrono: el webhook de WhatsApp comparte el loop con el audio de las llamadas)
+openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 function_manager = FunctionManager()
 
 app = FastAPI()
@@ -69,135 +85,192 @@ client = OpenAI(
 REALTIME_INCOMING_CALL = "realtime.call.incoming"
 
 
-# Manejadores de eventos WebSocket
-async def handle_websocket_message(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int) -> None:
-    """Maneja diferentes tipos de mensajes del WebSocket"""
-    message_type = message_data.get("type", "")
+async def post_call_action(call_id: str, action: str, payload: Optional[dict] = None) -> httpx.Response:
+    """POST a /v1/realtime/calls/{call_id}/{action} (accept, reject o hangup)"""
+    async with httpx.AsyncClient() as http_client:
+        return await http_client.post(
+            f"https://api.openai.com/v1/realtime/calls/{call_id}/{action}",
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            json=payload or {}
+        )
 
-    # 🔴 GRABACIÓN: Procesar audio y conversación
-    await call_recorder.process_audio_chunk(message_data)
-    await call_recorder.log_conversation(message_data)
 
-    # DEBUG: Log todos los tipos de mensajes relacionados con audio
-    if "audio" in message_type:
-        print(f"🎵 DEBUG Audio Event: {message_type}")
-    
-    # Manejo específico por tipo de mensaje
-    if message_type == "session.created":
-        print("✅ Session created successfully")
-        
-    elif message_type == "response.created":
-        print("🎯 Response created")
-        
-    elif message_type == "response.done":
-        print("✅ Response completed")
-
-        output_items = message_data.get("response", {}).get("output", [])
-        has_function_calls = False
-        total_token_used = message_data.get("response", {}).get("usage", {}).get("total_tokens", 0)
-        print("Usage details:", message_data.get("response", {}).get("usage", {}))
-        print(f"🧮 Total tokens used in response: {total_token_used}")
-        total_token_used_in_call += total_token_used
-        print(f"🧾 Total tokens used in call so far: {total_token_used_in_call}")
-        if output_items:
-            for item in output_items:
-                if item.get("type") == "function_call":
-                    has_function_calls = True
-                    function_name = item.get("name")
-                    call_id = item.get("call_id")
-                    arguments = item.get("arguments", "{}")
-
-                    print(f"🔧 Function call detected: {function_name}")
-                    print(f"📋 Arguments: {arguments}")
-
-                    try:
-                        # Ejecutar la función
-                        result = await function_manager.execute_function(function_name, arguments)
-                        print(f"✅ Function result: {result}")
-
-                        # Enviar el resultado de vuelta al modelo
-                        function_output_event = {
-                            "type": "conversation.item.create",
-                            "item": {
-                                "type": "function_call_output",
-                                "call_id": call_id,
-                                "output": json.dumps(result)
-                            }
-                        }
+# Manejadores de eventos WebSocket: tipo de evento -> corrutina registrada
+RealtimeEventHandler = Callable[[dict, Any, FunctionManager, int, CallRecorder], Awaitable[None]]
+REALTIME_EVENT_HANDLERS: Dict[str, RealtimeEventHandler] = {}
 
-                        await ws.send(json.dumps(function_output_event))
-                        print(f"📤 Sent function output for call_id: {call_id}")
 
-                    except Exception as e:
-                        print(f"❌ Error executing function {function_name}: {e}")
+def realtime_handler(*event_types: str):
+    """Registra un manejador para uno o más tipos de evento del Realtime API"""
+    def register(handler: RealtimeEventHandler) -> RealtimeEventHandler:
+        for event_type in event_types:
+            REALTIME_EVENT_HANDLERS[event_type] = handler
+        return handler
+    return register
 
-                        # Enviar error al modelo
-                        error_output = {
-                            "type": "conversation.item.create",
-                            "item": {
-                                "type": "function_call_output",
-                                "call_id": call_id,
-                                "output": json.dumps({"error": str(e)})
-                            }
-                        }
-                        await ws.send(json.dumps(error_output))
 
-            # Solicitar respuesta una sola vez después de procesar todas las funciones
-            if has_function_calls:
-                await ws.send(json.dumps({"type": "response.create"}))
-                print("📤 Sent response.create after all function outputs")
+# Eventos que solo se reportan en consola
+REALTIME_EVENT_MESSAGES = {
+    "session.created": "✅ Session created successfully",
+    "response.created": "🎯 Response created",
+    "conversation.item.created": "💬 Conversation item created",
+    "input_audio_buffer.speech_started": "🎤 User started speaking",
+    "input_audio_buffer.speech_stopped": "🔇 User stopped speaking",
+}
 
-    elif message_type == "conversation.item.created":
-        print("💬 Conversation item created")
-        
-    elif message_type == "input_audio_buffer.speech_started":
-        print("🎤 User started speaking")
-        
-    elif message_type == "input_audio_buffer.speech_stopped":
-        print("🔇 User stopped speaking")
-        
-    elif message_type == "response.audio.delta":
-        # Audio chunks del asistente
-        audio_data = message_data.get("delta", "")
-        print(f"🔊 Receiving audio chunk - Size: {len(audio_data) if audio_data else 0} bytes")
-        
-    elif message_type == "response.audio_transcript.delta":
-        # Transcripción del audio del asistente
-        transcript = message_data.get("delta", "")
-        if transcript:
-            print(f"🗣️ Assistant: {transcript}")
-            
-    elif message_type == "conversation.item.input_audio_transcription.completed":
-        # Transcripción completada del usuario
-        transcript = message_data.get("transcript", "")
-        print(f"👤 User said: {transcript}")
 
-    elif message_type == "response.function_call_arguments.delta":
-        pass
+@realtime_handler(*REALTIME_EVENT_MESSAGES)
+async def handle_status_event(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int, recorder: CallRecorder) -> None:
+    logger.debug(REALTIME_EVENT_MESSAGES[message_data["type"]])
 
-    elif message_type == "response.function_call_arguments.done":
-        print("✅ Function call arguments completed")
 
+@realtime_handler("response.function_call_arguments.delta")
+async def handle_ignored_event(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int, recorder: CallRecorder) -> None:
+    pass
 
-        
-    elif message_type == "error":
-        error = message_data.get("error", {})
-        print(f"❌ WebSocket error: {error}")
-        
-    else:
-        print(f"📨 Unhandled message type: {message_type}")
+
+@realtime_handler("response.function_call_arguments.done")
+async def handle_function_call_arguments_done(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int, recorder: CallRecorder) -> None:
+    logger.debug("✅ Function call arguments completed")
+
+    # ⚡ Las tools idempotentes empiezan a correr ya; response.done recoge el resultado
+    function_name = message_data.get("name")
+    if function_manager.start_speculative(message_data.get("call_id"), function_name, message_data.get("arguments", "{}")):
+        logger.debug("⚡ Ejecución especulativa de %s", function_name, extra={"function": function_name})
+
+
+async def execute_function_call(item: dict, function_manager: FunctionManager) -> dict:
+    """
+    Ejecuta un function_call del modelo y arma el evento con su resultado.
+
+    Nunca lanza excepciones: los errores se devuelven al modelo como
+    {"error": ...} y los timeouts como el fallback de la política de la tool
+    (ver function_manager.FUNCTION_POLICIES), para que pueda responderle al usuario.
+    """
+    function_name = item.get("name")
+    call_id = item.get("call_id")
+    arguments = item.get("arguments", "{}")
+
+    logger.info("🔧 Function call detected: %s", function_name, extra={"function": function_name})
+    logger.debug("📋 Arguments: %s", arguments)
+
+    try:
+        # Ejecutar la función
+        result = await function_manager.run_function_call(call_id, function_name, arguments)
+        logger.debug("✅ Function result: %s", result)
+    except Exception as e:
+        logger.exception("❌ Error executing function %s", function_name, extra={"function": function_name})
+        result = {"error": str(e)}
+
+    return {
+        "type": "conversation.item.create",
+        "item": {
+            "type": "function_call_output",
+            "call_id": call_id,
+            "output": realtime_codec.dumps(result)
+        }
+    }
+
+
+@realtime_handler("response.done")
+async def handle_response_done(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int, recorder: CallRecorder) -> None:
+    logger.debug("✅ Response completed")
+
+    output_items = message_data.get("response", {}).get("output", [])
+    total_token_used = message_data.get("response", {}).get("usage", {}).get("total_tokens", 0)
+    logger.debug("Usage details: %s", message_data.get("response", {}).get("usage", {}))
+    total_token_used_in_call += total_token_used
+    logger.info("🧮 Tokens: %s en la respuesta, %s en la llamada", total_token_used, total_token_used_in_call,
+                extra={"tokens": total_token_used, "call_tokens": total_token_used_in_call})
+
+    function_calls = [item for item in output_items if item.get("type") == "function_call"]
+    if not function_calls:
+        return
+
+    # Las funciones se ejecutan en paralelo; los resultados se envían en el orden de las llamadas
+    function_outputs = await asyncio.gather(
+        *(execute_function_call(item, function_manager) for item in function_calls)
+    )
+    for function_output_event in function_outputs:
+        await ws.send(realtime_codec.dumps(function_output_event))
+        logger.debug("📤 Sent function output for call_id: %s", function_output_event["item"]["call_id"])
+
+    # Solicitar respuesta una sola vez después de procesar todas las funciones
+    await ws.send(realtime_codec.dumps({"type": "response.create"}))
+    logger.debug("📤 Sent response.create after all function outputs")
+
+
+@realtime_handler("response.audio_transcript.delta", "response.output_audio_transcript.delta")
+async def handle_assistant_transcript(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int, recorder: CallRecorder) -> None:
+    # Transcripción del audio del asistente
+    transcript = message_data.get("delta", "")
+    if transcript:
+        logger.debug("🗣️ Assistant: %s", transcript, extra={"rate_limit_key": "transcript.delta"})
+
+
+@realtime_handler("conversation.item.input_audio_transcription.completed")
+async def handle_user_transcript(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int, recorder: CallRecorder) -> None:
+    # Transcripción completada del usuario
+    transcript = message_data.get("transcript", "")
+    logger.info("👤 User said: %s", transcript)
+
+
+@realtime_handler("error")
+async def handle_error_event(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int, recorder: CallRecorder) -> None:
+    error = message_data.get("error", {})
+    logger.error("❌ WebSocket error: %s", error)
+
+
+# Tipo de evento de audio -> campo con el base64 (para leerlo sin decodificar el frame)
+AUDIO_EVENT_FIELDS = {event_type: field for event_type, (_, field) in AUDIO_EVENTS.items()}
+
+
+def handle_audio_event(message_type: str, audio_data: str, recorder: CallRecorder) -> None:
+    """
+    ⚡ CAMINO RÁPIDO: los deltas de audio llegan decenas de veces por segundo
+    por llamada; solo se graban (sin transcripción, monitoreo ni consola)
+    """
+    source, _ = AUDIO_EVENTS[message_type]
+    recorder.record_audio(audio_data, source)
+
+
+async def handle_websocket_message(message_data: dict, ws, function_manager: FunctionManager, total_token_used_in_call: int, recorder: CallRecorder) -> None:
+    """Enruta cada mensaje del WebSocket a su manejador registrado"""
+    message_type = message_data.get("type", "")
+
+    if message_type in AUDIO_EVENT_FIELDS:
+        handle_audio_event(message_type, message_data.get(AUDIO_EVENT_FIELDS[message_type], ""), recorder)
+        return
+
+    # 🔴 GRABACIÓN: registrar la conversación
+    await recorder.log_conversation(message_data)
+
+    # 📡 MONITOREO EN VIVO: solo publica si alguien sigue esta llamada
+    publish_realtime_event(recorder.current_call_id, message_data)
+
+    handler = REALTIME_EVENT_HANDLERS.get(message_type)
+    if handler is None:
+        logger.debug("📨 Unhandled message type: %s", message_type, extra={"rate_limit_key": "unhandled"})
+        return
+    await handler(message_data, ws, function_manager, total_token_used_in_call, recorder)
 
 # Tarea WebSocket mejorada
 async def websocket_task_async(call_id: str, response_create: dict) -> None:
     """Conecta al WebSocket de OpenAI Realtime API"""
     uri = f"wss://api.openai.com/v1/realtime?call_id={call_id}"
+    # Cada llamada corre en su propia tarea: sus logs llevan el call_id
+    call_id_var.set(call_id)
     
+    function_manager = FunctionManager()
+
     try:
-        function_manager = FunctionManager()
         total_token_used_in_call = 0
         
-        # 🔴 INICIAR GRABACIÓN
-        call_recorder.start_recording(call_id)
+        # 🔴 INICIAR GRABACIÓN (un grabador propio por llamada)
+        recorder = recorder_pool.acquire(call_id)
         
         async with websockets.connect(
             uri,
@@ -206,34 +279,41 @@ async def websocket_task_async(call_id: str, response_create: dict) -> None:
                 "origin": "https://api.openai.com"
             }
         ) as ws:
-            print(f"🔌 WS OPEN: {uri}")
+            logger.info("🔌 WS OPEN: %s", uri)
             
-            await ws.send(json.dumps(response_create))
-            print("📤 Sent initial greeting command")
+            await ws.send(realtime_codec.dumps(response_create))
+            logger.debug("📤 Sent initial greeting command")
             
             async for message in ws:
                 try:
-                    text = message if isinstance(message, str) else message.decode()
-                    message_data = json.loads(text)
-                    
-                    await handle_websocket_message(message_data, ws, function_manager, total_token_used_in_call)
+                    # Los frames de audio se leen sin decodificar el JSON completo
+                    audio_frame = peek_event(message, AUDIO_EVENT_FIELDS)
+                    if audio_frame is not None:
+                        handle_audio_event(*audio_frame, recorder)
+                        continue
+
+                    message_data = realtime_codec.loads(message)
+                    await handle_websocket_message(message_data, ws, function_manager, total_token_used_in_call, recorder)
                     
                 except json.JSONDecodeError as e:
-                    print(f"⚠️ Failed to parse JSON message: {text}")
+                    logger.warning("⚠️ Failed to parse JSON message: %.200s", message)
                 except Exception as e:
-                    print(f"⚠️ Error handling message: {e}")
+                    logger.exception("⚠️ Error handling message")
                 
     except websockets.exceptions.ConnectionClosed as e:
-        print(f"🔌 WebSocket connection closed: {e.code} - {e.reason}")
+        logger.info("🔌 WebSocket connection closed: %s - %s", e.code, e.reason)
     except Exception as e:
-        print(f"❌ WebSocket error: {e}")
+        logger.exception("❌ WebSocket error: %s", e)
     finally:
+        function_manager.cancel_speculative()
+        publish_call_ended(call_id)
+
         # 🔴 GUARDAR GRABACIÓN AL FINALIZAR
         try:
-            recording_result = await call_recorder.save_recording()
-            print(f"💾 Grabación guardada: {recording_result}")
+            recording_result = await recorder_pool.release(call_id)
+            logger.info("💾 Grabación guardada: %s", recording_result)
         except Exception as e:
-            print(f"⚠️ Error guardando grabación: {e}")
+            logger.exception("⚠️ Error guardando grabación")
 
 
 
@@ -260,42 +340,45 @@ async def webhook(request: Request):
 
             sip_headers = getattr(getattr(event, "data", None), "sip_headers", None)
 
-            print(f"sip_headers: {sip_headers}")
+            logger.debug("sip_headers: %s", sip_headers)
 
-            print(f"webhook received: {event_type}")
+            logger.info("webhook received: %s", event_type)
             
             if not call_id:
                 raise HTTPException(status_code=400, detail="Missing call_id")
             
-            print(f"Incoming call: {call_id}")
-            
-            
-            async with httpx.AsyncClient() as http_client:
+            logger.info("Incoming call: %s", call_id, extra={"call_id": call_id})
+
+            if session_supervisor.is_known(call_id):
+                logger.warning("⚠️ Webhook duplicado para una llamada ya atendida: %s", call_id, extra={"call_id": call_id})
+                return Response(status_code=200)
+
+            # El cupo se reserva antes del accept: entre el chequeo y el inicio de la sesión hay awaits
+            if not session_supervisor.reserve(call_id):
+                logger.warning("🚫 Capacidad máxima alcanzada (%s llamadas), rechazando: %s",
+                               session_supervisor.active_count, call_id, extra={"call_id": call_id})
+                await post_call_action(call_id, "reject", {"status_code": 486})
+                return Response(status_code=200)
+
+            try:
                 call_accept, response_create = choose_random_assistant()
-                accept_url = f"https://api.openai.com/v1/realtime/calls/{call_id}/accept"
-                
-                resp = await http_client.post(
-                    accept_url,
-                    headers={
-                        "Authorization": f"Bearer {OPENAI_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json=call_accept
-                )
-                
+                resp = await post_call_action(call_id, "accept", call_accept)
+
                 if not resp.is_success:
                     error_text = resp.text
-                    print(f"ACCEPT failed: {resp.status_code} {error_text}")
+                    logger.error("ACCEPT failed: %s %s", resp.status_code, error_text, extra={"call_id": call_id})
                     raise HTTPException(status_code=500, detail="Accept failed")
-            
-           
-            threading.Thread(
-                target=lambda: asyncio.run(websocket_task_async(call_id, response_create)),
-                daemon=True,
-                name=f"ws_thread_{call_id}"
-            ).start()
-            
-            
+            except BaseException:
+                session_supervisor.release_reservation(call_id)
+                raise
+
+            # La llamada corre como tarea en el loop del servidor
+            if session_supervisor.start_session(call_id, websocket_task_async(call_id, response_create)) is None:
+                # Aceptada pero sin sesión (ej. apagando el servidor): colgar en lugar de dejar al llamante en silencio
+                logger.error("❌ No se pudo iniciar la sesión de %s, colgando la llamada", call_id, extra={"call_id": call_id})
+                await post_call_action(call_id, "hangup")
+                return Response(status_code=200)
+
             return Response(
                 status_code=200,
                 headers={"Authorization": f"Bearer {OPENAI_API_KEY}"}
@@ -306,7 +389,7 @@ async def webhook(request: Request):
         
     except Exception as e:
         error_msg = str(getattr(e, "message", str(e)))
-        print(f"Error processing webhook: {error_msg}")
+        logger.warning("Error processing webhook: %s", error_msg)
         
         if "InvalidWebhookSignatureError" in str(type(e).__name__) or \
            "invalid" in error_msg.lower():
@@ -315,17 +398,93 @@ async def webhook(request: Request):
                 content={"error": "Invalid signature"}
             )
         
-        print(f"Server error: {error_msg}")
+        logger.exception("Server error: %s", error_msg)
         return JSONResponse(
             status_code=500,
             content={"error": "Server error"}
         )
 
 
+@app.on_event("startup")
+async def migrate_database():
+    """
+    Aplica las migraciones pendientes del esquema, carga el índice de
+    disponibilidad y abre el catálogo de grabaciones antes de atender llamadas
+    """
+    version = await asyncio.to_thread(apply_migrations, DB_NAME)
+    logger.info("🗄️ Esquema de base de datos en versión %s", version)
+    await cargar_indice_disponibilidad(DB_NAME)
+    # El catálogo de grabaciones se abre aquí y no al importar call_recorder
+    await asyncio.to_thread(recorder_pool.open_catalog)
+
+
+@app.on_event("shutdown")
+async def shutdown_sessions():
+    """Cancela las llamadas activas al apagar el servidor y termina de escribir sus grabaciones"""
+    await session_supervisor.shutdown()
+    await recording_sink.shutdown()
+    shutdown_executors()
+    close_connections()
+    await close_async_connections()
+    shutdown_logging()
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint"""
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "active_calls": session_supervisor.active_count,
+        "max_concurrent_calls": session_supervisor.max_concurrent_calls,
+        "recording_sink": recording_sink.get_metrics(),
+        "tool_cache": tool_cache.get_metrics(),
+        "speculative_tools": speculation_metrics,
+        "availability_index": availability_index.get_metrics()
+    }
+
+
+@app.get("/calls/live")
+async def list_live_calls():
+    """Lista las llamadas en curso con su progreso (desde memoria, sin leer archivos)"""
+    calls = session_supervisor.get_live_sessions()
+    for call in calls:
+        recorder = recorder_pool.get(call["call_id"])
+        if recorder:
+            call["transcript_entries"] = sum(1 for entry in recorder.conversation_log if "speaker" in entry)
+            call["audio_chunks"] = recorder.audio_chunk_count
+        call["monitors"] = len(event_bus.subscribers.get(call_topic(call["call_id"]), ()))
+
+    return {
+        "status": "success",
+        "total_calls": len(calls),
+        "calls": calls
+    }
+
+
+@app.get("/calls/{call_id}/transcript/stream")
+async def stream_call_transcript(call_id: str):
+    """
+    Stream SSE con la transcripción en vivo de una llamada en curso.
+    Empieza con la transcripción acumulada y termina con el evento call.ended.
+    """
+    recorder = recorder_pool.get(call_id)
+    if recorder is None:
+        return JSONResponse(
+            status_code=404,
+            content={
+                "status": "error",
+                "message": "Llamada no encontrada o ya finalizada"
+            }
+        )
+
+    subscription = event_bus.subscribe(call_topic(call_id))
+    snapshot = transcript_snapshot(recorder.conversation_log)
+    snapshot["call_id"] = call_id
+    return StreamingResponse(
+        sse_stream(subscription, initial_events=[snapshot]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/debug/files")
@@ -370,14 +529,32 @@ async def viewer_alternative():
 
 
 @app.get("/recordings")
-async def list_recordings():
-    """Lista todas las grabaciones disponibles"""
+async def list_recordings(
+    limit: int = Query(100, ge=1, le=MAX_RECORDINGS_PAGE),
+    offset: int = Query(0, ge=0),
+    call_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    sort: str = "started_at",
+    order: str = "desc"
+):
+    """Lista las grabaciones disponibles (paginado, desde el catálogo)"""
     try:
-        recordings = call_recorder.get_recordings_list()
+        page = await recorder_pool.get_recordings_list(
+            limit=limit,
+            offset=offset,
+            call_id=call_id,
+            date_from=date_from,
+            date_to=date_to,
+            sort=sort,
+            order=order
+        )
         return {
             "status": "success",
-            "total_recordings": len(recordings),
-            "recordings": recordings
+            "total_recordings": page["total"],
+            "limit": limit,
+            "offset": offset,
+            "recordings": page["recordings"]
         }
     except Exception as e:
         return {
@@ -386,6 +563,20 @@ async def list_recordings():
         }
 
 
+@app.get("/recordings/events")
+async def recordings_events():
+    """
+    Stream Server-Sent Events con los cambios de grabaciones y llamadas en vivo:
+    recording.saved, recording.deleted, call.started y call.ended
+    """
+    subscription = event_bus.subscribe(RECORDINGS_TOPIC)
+    return StreamingResponse(
+        sse_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/recordings/{recording_id}/conversation")
 async def get_recording_conversation(recording_id: str):
     """Obtiene la conversación de una grabación específica"""
@@ -441,12 +632,16 @@ async def get_recording_summary(recording_id: str):
 
 
 @app.get("/recordings/{recording_id}/audio")
-async def get_recording_audio(recording_id: str):
-    """Sirve el archivo de audio WAV de una grabación específica"""
+async def get_recording_audio(recording_id: str, request: Request, format: Optional[str] = None):
+    """
+    Sirve el audio de una grabación específica en su formato almacenado.
+    Soporta Range (206) y peticiones condicionales para que el reproductor pueda hacer seek.
+    Con ?format=wav, las grabaciones comprimidas se decodifican al vuelo.
+    """
     try:
-        audio_file = f"recordings/{recording_id}_audio.wav"
+        audio = find_audio_file("recordings", recording_id)
 
-        if not os.path.exists(audio_file):
+        if not audio:
             return JSONResponse(
                 status_code=404,
                 content={
@@ -455,10 +650,20 @@ async def get_recording_audio(recording_id: str):
                 }
             )
 
-        return FileResponse(
+        audio_file, audio_format = audio
+
+        if format == "wav" and audio_format != "wav":
+            return StreamingResponse(
+                transcode_to_wav(audio_file),
+                media_type="audio/wav",
+                headers={"Content-Disposition": f'inline; filename="{recording_id}_audio.wav"'}
+            )
+
+        return ranged_file_response(
+            request,
             audio_file,
-            media_type="audio/wav",
-            filename=f"{recording_id}_audio.wav"
+            media_type=audio_media_type(audio_format),
+            filename=os.path.basename(audio_file)
         )
 
     except Exception as e:
@@ -477,9 +682,11 @@ async def delete_recording(recording_id: str):
     try:
         files_to_delete = [
             f"recordings/{recording_id}_conversation.json",
-            f"recordings/{recording_id}_summary.txt",
-            f"recordings/{recording_id}_audio.wav"
+            f"recordings/{recording_id}_summary.txt"
         ]
+        audio = find_audio_file("recordings", recording_id)
+        if audio:
+            files_to_delete.append(audio[0])
 
         deleted_files = []
 
@@ -488,6 +695,9 @@ async def delete_recording(recording_id: str):
                 os.remove(file_path)
                 deleted_files.append(os.path.basename(file_path))
 
+        if await recorder_pool.delete_recording(recording_id) or deleted_files:
+            event_bus.publish(RECORDINGS_TOPIC, {"type": "recording.deleted", "base_name": recording_id})
+
         if deleted_files:
             return {
                 "status": "success",
@@ -510,7 +720,7 @@ async def delete_recording(recording_id: str):
 @app.get("/citas/{cita_id}", response_class=HTMLResponse)
 async def ver_cita(cita_id: int):
     """Endpoint público para ver una cita específica"""
-    cita = obtener_cita_por_id(cita_id)
+    cita = await obtener_cita_por_id(cita_id)
 
     if not cita:
         return HTMLResponse(
@@ -746,31 +956,36 @@ async def ver_cita(cita_id: int):
 
 
 @app.get("/citas", response_class=HTMLResponse)
-async def listar_citas_html():
-    """Endpoint público para ver todas las citas"""
-    citas = listar_todas_citas()
-
-    filas_html = ""
-    if citas:
-        for cita in citas:
-            filas_html += f"""
-            <tr onclick="window.location.href='/citas/{cita['id']}'" style="cursor: pointer;">
-                <td>{cita['id']}</td>
-                <td>{cita['paciente_nombre']}</td>
-                <td>{cita['identificacion']}</td>
-                <td>{cita['fecha_cita']}</td>
-                <td>{cita['ciudad']}</td>
-                <td><span class="badge">Confirmada</span></td>
-            </tr>
-            """
-    else:
-        filas_html = """
-        <tr>
-            <td colspan="6" style="text-align: center; color: #777;">No hay citas registradas</td>
-        </tr>
-        """
+async def listar_citas_html(ciudad: Optional[str] = None, desde: Optional[str] = None, hasta: Optional[str] = None,
+                            despues: Optional[str] = None, limite: int = CITAS_POR_PAGINA, formato: str = "html"):
+    """
+    Endpoint público para ver las citas, de la más reciente a la más antigua.
 
-    html_content = f"""
+    Pagina por keyset (parámetro despues = cursor "siguiente" de la página
+    anterior) y filtra por ciudad y rango de fechas [desde, hasta). La respuesta
+    se envía en streaming: con formato=html una página de la tabla con enlace a
+    la siguiente; con formato=json todas las citas del filtro, leídas de la base
+    página por página.
+    """
+    try:
+        consultas_pagina_citas(ciudad, desde, hasta, despues)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+
+    if formato == "json":
+        async def citas_json():
+            yield '{"citas": ['
+            total = 0
+            async for pagina in iterar_paginas_citas(ciudad, desde, hasta, despues, limite):
+                if pagina["citas"]:
+                    yield ("," if total else "") + ",".join(json.dumps(cita, ensure_ascii=False) for cita in pagina["citas"])
+                    total += pagina["total"]
+            yield f'], "total": {total}}}'
+
+        return StreamingResponse(citas_json(), media_type="application/json")
+
+    filtros = {"ciudad": ciudad or "", "desde": desde or "", "hasta": hasta or ""}
+    inicio_html = f"""
     <!DOCTYPE html>
     <html>
     <head>
@@ -816,35 +1031,47 @@ async def listar_citas_html():
                 font-size: 16px;
             }}
 
-            .stats {{
+            .filters {{
                 display: flex;
-                gap: 20px;
+                gap: 15px;
                 margin-bottom: 30px;
                 flex-wrap: wrap;
-            }}
-
-            .stat-card {{
-                flex: 1;
-                min-width: 200px;
                 background: white;
-                padding: 25px;
+                padding: 20px 25px;
                 border-radius: 15px;
                 box-shadow: 0 5px 20px rgba(0,0,0,0.1);
-                text-align: center;
+                align-items: flex-end;
             }}
 
-            .stat-number {{
-                font-size: 36px;
-                font-weight: bold;
-                color: #667eea;
-                margin-bottom: 10px;
+            .filters label {{
+                display: flex;
+                flex-direction: column;
+                flex: 1;
+                min-width: 160px;
+                color: #777;
+                font-size: 14px;
+                gap: 6px;
             }}
 
-            .stat-label {{
-                color: #777;
+            .filters input {{
+                padding: 10px;
+                border: 1px solid #ddd;
+                border-radius: 8px;
                 font-size: 14px;
             }}
 
+            .filters button, .pagination a {{
+                background: #667eea;
+                color: white;
+                border: none;
+                padding: 11px 22px;
+                border-radius: 8px;
+                font-size: 14px;
+                font-weight: bold;
+                text-decoration: none;
+                cursor: pointer;
+            }}
+
             .table-container {{
                 background: white;
                 border-radius: 15px;
@@ -891,9 +1118,18 @@ async def listar_citas_html():
                 font-weight: bold;
             }}
 
+            .pagination {{
+                display: flex;
+                justify-content: space-between;
+                align-items: center;
+                margin-top: 20px;
+                color: white;
+            }}
+
             @media (max-width: 768px) {{
-                .stats {{
+                .filters {{
                     flex-direction: column;
+                    align-items: stretch;
                 }}
 
                 table {{
@@ -913,16 +1149,12 @@ async def listar_citas_html():
                 <p>Gestión y visualización de citas programadas</p>
             </div>
 
-            <div class="stats">
-                <div class="stat-card">
-                    <div class="stat-number">{len(citas)}</div>
-                    <div class="stat-label">Total de Citas</div>
-                </div>
-                <div class="stat-card">
-                    <div class="stat-number">{len([c for c in citas if c['ciudad']])}</div>
-                    <div class="stat-label">Citas Confirmadas</div>
-                </div>
-            </div>
+            <form class="filters" method="get" action="/citas">
+                <label>Ciudad<input type="text" name="ciudad" value="{html.escape(filtros['ciudad'])}"></label>
+                <label>Desde<input type="text" name="desde" placeholder="2025-10-01" value="{html.escape(filtros['desde'])}"></label>
+                <label>Hasta<input type="text" name="hasta" placeholder="2025-11-01" value="{html.escape(filtros['hasta'])}"></label>
+                <button type="submit">Filtrar</button>
+            </form>
 
             <div class="table-container">
                 <table>
@@ -937,16 +1169,52 @@ async def listar_citas_html():
                         </tr>
                     </thead>
                     <tbody>
-                        {filas_html}
+    """
+
+    async def citas_html():
+        # El encabezado sale antes de consultar la base
+        yield inicio_html
+
+        pagina = await listar_citas_pagina(ciudad, desde, hasta, despues, limite)
+        if pagina["citas"]:
+            yield "".join(f"""
+            <tr onclick="window.location.href='/citas/{cita['id']}'" style="cursor: pointer;">
+                <td>{cita['id']}</td>
+                <td>{html.escape(cita['paciente_nombre'])}</td>
+                <td>{html.escape(str(cita['identificacion']))}</td>
+                <td>{html.escape(str(cita['fecha_cita']))}</td>
+                <td>{html.escape(str(cita['ciudad']))}</td>
+                <td><span class="badge">Confirmada</span></td>
+            </tr>
+            """ for cita in pagina["citas"])
+        else:
+            yield """
+            <tr>
+                <td colspan="6" style="text-align: center; color: #777;">No hay citas registradas</td>
+            </tr>
+            """
+
+        siguiente = ""
+        if pagina["siguiente"]:
+            parametros = {k: v for k, v in filtros.items() if v}
+            parametros.update(despues=pagina["siguiente"], limite=pagina["total"])
+            siguiente = f'<a href="/citas?{html.escape(urlencode(parametros))}">Siguiente página →</a>'
+
+        yield f"""
                     </tbody>
                 </table>
             </div>
+
+            <div class="pagination">
+                <span>{pagina['total']} citas en esta página</span>
+                {siguiente}
+            </div>
         </div>
     </body>
     </html>
     """
 
-    return HTMLResponse(content=html_content)
+    return StreamingResponse(citas_html(), media_type="text/html; charset=utf-8")
 
 
 
@@ -964,7 +1232,7 @@ except locale.Error:
         try:
             locale.setlocale(locale.LC_TIME, 'Spanish_Colombia.1252')
         except locale.Error:
-            print("⚠️ Warning: Spanish locale not available, using default locale")
+            logger.warning("⚠️ Warning: Spanish locale not available, using default locale")
             pass
 
 # Funciones de database que necesitan db_path
@@ -973,7 +1241,8 @@ DATABASE_FUNCTIONS = {
     'eliminar_usuario', 'obtener_examenes_medicos', 'crear_examen_medico',
     'actualizar_examen_medico', 'eliminar_examen_medico', 'obtener_cita_examen_medico',
     'crear_cita_examen_medico', 'verificar_disponibilidad_citas', 'obtener_citas_activas_usuario',
-    'crear_cita', 'obtener_cita_por_id', 'listar_todas_citas', 'eliminar_cita'
+    'crear_cita', 'obtener_cita_por_id', 'listar_citas_pagina', 'eliminar_cita',
+    'buscar_horarios_disponibles'
 }
 
 
@@ -1019,19 +1288,17 @@ async def get_last_messages(remote_jid: str, limit: int = 5) -> List[Dict]:
                 if isinstance(messages_data, dict):
                     records = messages_data.get("records", [])
                     
-                    print(f"✓ Se obtuvieron {len(records)} mensajes")
-                    print(f"   Total en DB: {messages_data.get('total', 0)}")
-                    print(f"   Página actual: {messages_data.get('currentPage', 1)}/{messages_data.get('pages', 1)}")
+                    logger.debug("✓ Se obtuvieron %s mensajes (total en DB: %s, página %s/%s)",
+                                 len(records), messages_data.get('total', 0),
+                                 messages_data.get('currentPage', 1), messages_data.get('pages', 1))
                     
                     return records
             
-            print("⚠️ Estructura de respuesta inesperada")
+            logger.warning("⚠️ Estructura de respuesta inesperada")
             return []
             
     except Exception as e:
-        print(f"Error obteniendo mensajes: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error obteniendo mensajes")
         return []
 
 
@@ -1058,12 +1325,10 @@ async def send_whatsapp_message(remote_jid: str, message: str) -> bool:
         async with httpx.AsyncClient(timeout=30.0) as client:
             response = await client.post(url, json=payload, headers=headers)
             response.raise_for_status()
-            print(f"✓ Mensaje enviado exitosamente a {remote_jid}")
+            logger.info("✓ Mensaje enviado exitosamente a %s", remote_jid)
             return True
     except Exception as e:
-        print(f"✗ Error enviando mensaje: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("✗ Error enviando mensaje")
         return False
 
 async def process_message_with_openai(user_message: str, remote_jid: str) -> str:
@@ -1073,7 +1338,8 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
     """
     try:
         # 1. Obtener conversación del caché Redis (incluye tool_calls y tool responses)
-        cached_conversation = conversation_cache.get_conversation(remote_jid)
+        # El cliente Redis es síncrono: se consulta en un hilo para no frenar el loop
+        cached_conversation = await asyncio.to_thread(conversation_cache.get_conversation, remote_jid)
 
         # 2. Preparar mensajes para OpenAI
         # Empezamos con el system prompt
@@ -1083,7 +1349,7 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
 
         # 3. Agregar conversación desde Redis (si existe)
         if cached_conversation:
-            print(f"📥 Usando conversación en caché ({len(cached_conversation)} mensajes)")
+            logger.debug("📥 Usando conversación en caché (%s mensajes)", len(cached_conversation))
 
             # Validar y limpiar mensajes del caché (asegurar que no haya content: null)
             for msg in cached_conversation:
@@ -1093,15 +1359,12 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
                     cleaned_msg["content"] = ""
                 messages.append(cleaned_msg)
         else:
-            print(f"📭 No hay caché, iniciando nueva conversación")
+            logger.debug("📭 No hay caché, iniciando nueva conversación")
 
         # 4. Agregar mensaje actual del usuario
         messages.append({"role": "user", "content": user_message})
 
-        print(f"\n🤖 Procesando con OpenAI...")
-        print(f"📝 Total de mensajes enviados: {len(messages)}")
-        print(f"   - System prompt: 1")
-        print(f"   - Conversación + nuevo mensaje: {len(messages) - 1}")
+        logger.info("🤖 Procesando con OpenAI (%s mensajes, incluido el system prompt)", len(messages))
 
         # Convertir tools al formato de OpenAI Chat Completions
         openai_tools = []
@@ -1116,7 +1379,7 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
             })
 
         # Primera llamada a OpenAI
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4.1",
             messages=messages,
             tools=openai_tools,
@@ -1128,7 +1391,7 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
 
         # Si hay function calls, procesarlas
         if tool_calls:
-            print(f"\n🔧 Se detectaron {len(tool_calls)} function calls")
+            logger.info("🔧 Se detectaron %s function calls", len(tool_calls))
 
             # Convertir response_message a dict para agregarlo a messages
             # El objeto ChatCompletionMessage necesita ser serializado
@@ -1153,43 +1416,40 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
                 function_name = tool_call.function.name
                 function_args_str = tool_call.function.arguments
 
-                print(f"   📞 Ejecutando: {function_name}")
-                print(f"   📋 Argumentos: {function_args_str}")
+                logger.info("📞 Ejecutando: %s", function_name, extra={"function": function_name})
+                logger.debug("📋 Argumentos: %s", function_args_str)
 
-                # Ejecutar la función usando available_functions
+                # Ejecutar la función con el mismo FunctionManager de las llamadas de voz:
+                # caché, timeout, límite de concurrencia y fallback de su política
                 try:
                     # Parsear argumentos JSON
                     function_args = json.loads(function_args_str)
 
-                    # Obtener la función del diccionario
-                    if function_name not in available_functions:
-                        raise ValueError(f"Función {function_name} no encontrada en available_functions")
-
-                    function_to_call = available_functions[function_name]
-
                     # Lista de funciones que requieren db_path
                     db_functions = {
                         'listar_usuarios', 'obtener_usuario', 'crear_usuario', 'actualizar_usuario',
                         'eliminar_usuario', 'obtener_examenes_medicos', 'crear_examen_medico',
                         'actualizar_examen_medico', 'eliminar_examen_medico', 'obtener_cita_examen_medico',
                         'crear_cita_examen_medico', 'verificar_disponibilidad_citas', 'obtener_citas_activas_usuario',
-                        'crear_cita', 'obtener_cita_por_id', 'listar_todas_citas', 'eliminar_cita'
+                        'crear_cita', 'obtener_cita_por_id', 'listar_citas_pagina', 'eliminar_cita',
+                        'buscar_horarios_disponibles'
                     }
 
                     # Inyectar db_path si la función lo requiere
                     if function_name in db_functions:
                         db_path = os.path.join(os.path.dirname(__file__), "database.db")
                         function_args['db_path'] = db_path
-                        print(f"   📁 Inyectando db_path: {db_path}")
+                        logger.debug("📁 Inyectando db_path: %s", db_path)
 
-                    # Ejecutar la función con los argumentos
-                    function_response = function_to_call(**function_args)
+                    function_response = await function_manager.execute_function(
+                        function_name, json.dumps(function_args, ensure_ascii=False)
+                    )
 
                     # Convertir respuesta a string si es necesario
                     if not isinstance(function_response, str):
                         function_response = json.dumps(function_response, ensure_ascii=False)
 
-                    print(f"   ✓ Resultado: {function_response[:200]}...")
+                    logger.debug("✓ Resultado: %.200s", function_response)
 
                     # Agregar el resultado de la función a los mensajes
                     messages.append({
@@ -1199,9 +1459,7 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
                     })
 
                 except Exception as e:
-                    print(f"   ✗ Error ejecutando {function_name}: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("✗ Error ejecutando %s", function_name, extra={"function": function_name})
 
                     # Agregar error como respuesta de la función
                     messages.append({
@@ -1211,8 +1469,8 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
                     })
 
             # Segunda llamada a OpenAI con los resultados de las funciones
-            print(f"\n🤖 Segunda llamada a OpenAI con resultados de funciones...")
-            second_response = openai_client.chat.completions.create(
+            logger.debug("🤖 Segunda llamada a OpenAI con resultados de funciones")
+            second_response = await openai_client.chat.completions.create(
                 model="gpt-4.1",
                 messages=messages
             )
@@ -1233,23 +1491,21 @@ async def process_message_with_openai(user_message: str, remote_jid: str) -> str
         # Esto incluye: user, assistant (con respuestas completas), tool_calls, tool responses
         conversation_to_save = messages[1:]  # Excluir system prompt (índice 0)
 
-        conversation_cache.save_conversation(remote_jid, conversation_to_save)
+        await asyncio.to_thread(conversation_cache.save_conversation, remote_jid, conversation_to_save)
 
-        print(f"\n✓ Respuesta generada: {final_message[:200]}...")
-        print(f"💾 Conversación guardada en Redis con {len(conversation_to_save)} mensajes")
+        logger.debug("✓ Respuesta generada: %.200s", final_message)
+        logger.info("💾 Conversación guardada en Redis con %s mensajes", len(conversation_to_save))
 
         return final_message
 
     except Exception as e:
-        print(f"✗ Error procesando con OpenAI: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("✗ Error procesando con OpenAI")
         return "Disculpa, tuve un problema al procesar tu mensaje. ¿Podrías intentarlo de nuevo?"
 
 @app.post("/webhook/evolution")
 async def evolution_webhook(request: Request, payload: WebhookPayload):
     try:
-        print(f"Evento recibido: {payload.event}")
+        logger.debug("Evento recibido: %s", payload.event)
         
         if payload.event == "messages.upsert":
             await handle_message(payload.data)
@@ -1260,15 +1516,12 @@ async def evolution_webhook(request: Request, payload: WebhookPayload):
         return {"status": "success", "message": "Webhook procesado"}
     
     except Exception as e:
-        print(f"Error procesando webhook: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error procesando webhook")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def handle_message(data: Dict[str, Any]):
     """Procesa mensajes recibidos y mantiene historial"""
     try:
-        print("📥 Iniciando handle_message...")
 
         message = data.get("message", {})
         key = data.get("key", {})
@@ -1277,25 +1530,20 @@ async def handle_message(data: Dict[str, Any]):
         from_me = key.get("fromMe", False)
         message_timestamp = data.get("messageTimestamp", int(datetime.now().timestamp()))
         push_name = data.get("pushName", "Desconocido")
-
-        print(f"   remote_jid: {remote_jid}")
-        print(f"   from_me: {from_me}")
-        print(f"   push_name: {push_name}")
+        # Los logs del resto del procesamiento llevan el chat
+        remote_jid_var.set(remote_jid)
 
         # Extraer el texto del mensaje actual
         text = extract_message_text(message)
 
-        print(f"\n{'='*50}")
-        print(f"Nuevo mensaje de {push_name} ({remote_jid})")
-        print(f"Mensaje: {text}")
-        print(f"{'='*50}\n")
+        logger.info("📥 Nuevo mensaje de %s (from_me=%s)", push_name, from_me)
+        logger.debug("Mensaje: %s", text)
         
         # Obtener los últimos mensajes de la API
         api_messages = await get_last_messages(remote_jid, limit=5)
         
         if api_messages:
-            print(f"Últimos {len(api_messages)} mensajes del chat (desde API):")
-            print(f"{'-'*50}")
+            logger.debug("Últimos %s mensajes del chat (desde API)", len(api_messages))
             
             # Ordenar mensajes por timestamp
             sorted_messages = sorted(
@@ -1314,17 +1562,10 @@ async def handle_message(data: Dict[str, Any]):
                     sender = f"Tú" if is_from_me else sender_name
                     timestamp = msg.get("messageTimestamp", "")
                     
-                    print(f"{idx}. [{sender}] {msg_text}")
-                    if timestamp:
-                        try:
-                            dt = datetime.fromtimestamp(int(timestamp))
-                            print(f"   Hora: {dt.strftime('%Y-%m-%d %H:%M:%S')}")
-                        except:
-                            pass
-                    print()
+                    logger.debug("%s. [%s] %s (%s)", idx, sender, msg_text, timestamp)
                     
                 except Exception as e:
-                    print(f"{idx}. [Error procesando mensaje]: {e}")
+                    logger.warning("%s. [Error procesando mensaje]: %s", idx, e)
                     continue
             
             # Crear contexto de la conversación
@@ -1339,9 +1580,7 @@ async def handle_message(data: Dict[str, Any]):
                     context_lines.append(f"{sender_name}: {text}")
 
             context = "\n".join(context_lines)
-            print(f"\n📝 Contexto de la conversación:\n{'-'*50}")
-            print(context)
-            print(f"{'-'*50}\n")
+            logger.debug("📝 Contexto de la conversación:\n%s", context)
             
             # Solo responder si el mensaje NO es de nosotros
             if not from_me:
@@ -1350,7 +1589,7 @@ async def handle_message(data: Dict[str, Any]):
 
                 # Solo procesar si el mensaje tiene texto válido
                 if current_message_text and not current_message_text.startswith("["):
-                    print(f"\n🚀 Enviando mensaje a OpenAI para procesamiento...")
+                    logger.debug("🚀 Enviando mensaje a OpenAI para procesamiento")
 
                     # Procesar con OpenAI (el historial viene de Redis)
                     response_text = await process_message_with_openai(
@@ -1359,21 +1598,20 @@ async def handle_message(data: Dict[str, Any]):
                     )
 
                     # Enviar respuesta por WhatsApp
-                    print(f"\n📤 Enviando respuesta por WhatsApp...")
+                    logger.debug("📤 Enviando respuesta por WhatsApp")
                     success = await send_whatsapp_message(remote_jid, response_text)
 
                     if success:
-                        print(f"✓ Conversación completada exitosamente")
+                        logger.info("✓ Conversación completada exitosamente")
                     else:
-                        print(f"✗ Error enviando respuesta al usuario")
+                        logger.error("✗ Error enviando respuesta al usuario")
                 else:
-                    print(f"⚠️ Mensaje sin texto válido, no se procesará")
+                    logger.info("⚠️ Mensaje sin texto válido, no se procesará")
             else:
-                print(f"⚠️ Mensaje enviado por nosotros, no se responderá")
+                logger.debug("⚠️ Mensaje enviado por nosotros, no se responderá")
             
         else:
-            print("⚠ No se pudieron obtener mensajes de la API")
-            print("Procesando con historial desde Redis (si existe)...")
+            logger.warning("⚠ No se pudieron obtener mensajes de la API, se usa el historial de Redis (si existe)")
 
             # Procesar con OpenAI si el mensaje no es de nosotros
             if not from_me:
@@ -1382,7 +1620,7 @@ async def handle_message(data: Dict[str, Any]):
 
                 # Solo procesar si el mensaje tiene texto válido
                 if current_message_text and not current_message_text.startswith("["):
-                    print(f"\n🚀 Enviando mensaje a OpenAI para procesamiento...")
+                    logger.debug("🚀 Enviando mensaje a OpenAI para procesamiento")
 
                     # Procesar con OpenAI (el historial viene de Redis)
                     response_text = await process_message_with_openai(
@@ -1391,24 +1629,20 @@ async def handle_message(data: Dict[str, Any]):
                     )
 
                     # Enviar respuesta por WhatsApp
-                    print(f"\n📤 Enviando respuesta por WhatsApp...")
+                    logger.debug("📤 Enviando respuesta por WhatsApp")
                     success = await send_whatsapp_message(remote_jid, response_text)
 
                     if success:
-                        print(f"✓ Conversación completada exitosamente")
+                        logger.info("✓ Conversación completada exitosamente")
                     else:
-                        print(f"✗ Error enviando respuesta al usuario")
+                        logger.error("✗ Error enviando respuesta al usuario")
                 else:
-                    print(f"⚠️ Mensaje sin texto válido, no se procesará")
+                    logger.info("⚠️ Mensaje sin texto válido, no se procesará")
             else:
-                print(f"⚠️ Mensaje enviado por nosotros, no se responderá")
+                logger.debug("⚠️ Mensaje enviado por nosotros, no se responderá")
             
     except Exception as e:
-        print(f"\n{'⚠️'*25}")
-        print(f"⚠️ Error en handle_message: {e}")
-        print(f"{'⚠️'*25}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("⚠️ Error en handle_message")
         # NO propagar el error, solo loguearlo
         # Esto evita que el webhook retorne 500
 
@@ -1474,16 +1708,16 @@ def extract_message_text(message_content) -> str:
         return "[Mensaje sin texto]"
         
     except Exception as e:
-        print(f"Error extrayendo texto: {e}")
+        logger.warning("Error extrayendo texto: %s", e)
         return "[Error al procesar mensaje]"
 
 async def handle_connection_update(data: Dict[str, Any]):
     """Maneja actualizaciones de conexión"""
     try:
         state = data.get("state")
-        print(f"📱 Estado de conexión: {state}")
+        logger.info("📱 Estado de conexión: %s", state)
     except Exception as e:
-        print(f"Error en connection update: {e}")
+        logger.exception("Error en connection update")
 
 @app.get("/messages/{remote_jid}")
 async def get_messages_endpoint(
@@ -1533,6 +1767,6 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    print(f"Listening on http://localhost:{PORT}")
+    logger.info("Listening on http://localhost:%s", PORT)
     uvicorn.run(app, host="0.0.0.0", port=PORT)
     #run: uvicorn main:app --reload --host 0.0.0.0 --port 5001
\ No newline at end of file
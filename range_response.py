@@ -0,0 +1,136 @@
+"""
+Respuestas de archivos con soporte de HTTP Range y peticiones condicionales.
+
+Permite que el reproductor del visor haga seek en grabaciones largas sin
+descargar el archivo completo (206 Partial Content, ETag, Last-Modified).
+
+No se usa FileResponse de Starlette (0.48): no responde 304 a If-None-Match,
+su 416 envía "Content-Range: */N" sin la unidad y en multi-rango pone el
+content type multipart en el header Content-Range. Aquí los multi-rango se
+ignoran y se sirve el archivo completo, como permite el RFC 9110.
+"""
+import mmap
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def iter_file_range(path: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Lee los bytes [start, end] de un archivo mapeado en memoria, por bloques"""
+    if end < start:
+        return
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            position = start
+            while position <= end:
+                next_position = min(position + chunk_size, end + 1)
+                yield mapped[position:next_position]
+                position = next_position
+
+
+def parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un header Range de un solo rango.
+
+    Returns:
+        (inicio, fin) inclusivos, o None si el rango no es satisfacible
+
+    Raises:
+        ValueError: Si el header no es un rango simple de bytes (se ignora y se sirve completo)
+    """
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        raise ValueError(f"Range no soportado: {range_header}")
+
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError(f"Range no soportado: {range_header}")
+
+    if not first:
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0 or file_size == 0:
+            return None
+        return max(file_size - length, 0), file_size - 1
+
+    start = int(first)
+    end = int(last) if last else file_size - 1
+    if start >= file_size or end < start:
+        return None
+    return start, min(end, file_size - 1)
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def ranged_file_response(request: Request, path: str, media_type: str, filename: Optional[str] = None) -> Response:
+    """Sirve un archivo respetando Range, If-Range, If-None-Match e If-Modified-Since"""
+    stat = os.stat(path)
+    file_size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{file_size:x}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": last_modified,
+    }
+    if filename:
+        headers["Content-Disposition"] = f'inline; filename="{filename}"'
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() not in (etag, last_modified):
+        # El archivo cambió desde que el cliente guardó su copia parcial: se envía completo
+        range_header = None
+
+    if range_header:
+        try:
+            byte_range = parse_range(range_header, file_size)
+        except ValueError:
+            byte_range = (0, file_size - 1)
+            range_header = None
+
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{file_size}"
+            return Response(status_code=416, headers=headers)
+
+        if range_header:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers
+            )
+
+    headers["Content-Length"] = str(file_size)
+    return StreamingResponse(
+        iter_file_range(path, 0, file_size - 1),
+        media_type=media_type,
+        headers=headers
+    )
@@ -0,0 +1,129 @@
+"""
+Codecs JSON para el WebSocket del Realtime API.
+
+Los frames de audio (deltas en base64) son la gran mayoría del tráfico de
+una llamada. peek_event permite leer su tipo y payload directamente del
+texto del frame, sin construir el diccionario completo; el resto de los
+eventos se decodifica con orjson si está instalado o con json de la stdlib.
+"""
+import json
+import logging
+import os
+import re
+from typing import Any, Mapping, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+REALTIME_JSON_CODEC = os.getenv("REALTIME_JSON_CODEC", "auto")
+
+# El tipo va al inicio del frame en los eventos del Realtime API
+_TYPE_RE = re.compile(r'"type"\s*:\s*"([^"\\]+)"')
+_PEEK_TYPE_CHARS = 256
+
+logger = logging.getLogger(__name__)
+
+Frame = Union[str, bytes]
+
+
+class StdlibCodec:
+    """Codec con el módulo json de la stdlib"""
+
+    name = "json"
+
+    def loads(self, frame: Frame) -> Any:
+        return json.loads(frame)
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj)
+
+
+class OrjsonCodec:
+    """Codec con orjson (decodifica y codifica varias veces más rápido)"""
+
+    name = "orjson"
+
+    def loads(self, frame: Frame) -> Any:
+        return orjson.loads(frame)
+
+    def dumps(self, obj: Any) -> str:
+        try:
+            # El WebSocket debe enviar frames de texto: se retorna str, no bytes
+            return orjson.dumps(obj).decode()
+        except TypeError:
+            # Tipos que orjson no soporta (claves no str, enteros > 64 bits)
+            return json.dumps(obj)
+
+
+CODECS = {
+    "json": StdlibCodec,
+    "orjson": OrjsonCodec,
+}
+
+
+def get_codec(name: str = REALTIME_JSON_CODEC):
+    """
+    Retorna el codec pedido ("auto", "orjson" o "json").
+
+    "auto" usa orjson si está instalado; si se pide orjson y no está, se usa json.
+    """
+    name = (name or "auto").lower()
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    if name not in CODECS:
+        logger.warning("⚠️ Codec JSON desconocido '%s', usando json", name)
+        name = "json"
+    if name == "orjson" and orjson is None:
+        logger.warning("⚠️ orjson no está instalado, usando json")
+        name = "json"
+    return CODECS[name]()
+
+
+def peek_event(frame: Frame, fields: Mapping[str, str]) -> Optional[Tuple[str, str]]:
+    """
+    Lee el tipo de un frame y, si está en fields, el string de su campo.
+
+    No decodifica el JSON completo: busca "type" al inicio del frame y luego
+    el campo indicado (p. ej. "delta" en response.output_audio.delta).
+
+    Args:
+        frame: Texto del frame tal como llega del WebSocket
+        fields: Tipo de evento -> campo string a extraer
+
+    Returns:
+        (tipo, valor), o None si el frame no es de esos tipos o no se puede leer
+        sin decodificarlo (en ese caso se decodifica normalmente)
+    """
+    if isinstance(frame, bytes):
+        frame = frame.decode()
+
+    match = _TYPE_RE.search(frame, 0, _PEEK_TYPE_CHARS)
+    if match is None:
+        return None
+    event_type = match.group(1)
+    field = fields.get(event_type)
+    if field is None:
+        return None
+
+    key = frame.find(f'"{field}"')
+    if key == -1:
+        return None
+    colon = frame.find(":", key + len(field) + 2)
+    start = frame.find('"', colon) + 1
+    if colon == -1 or start == 0 or frame[key + len(field) + 2:start - 1].strip(": \t\r\n"):
+        return None
+    end = frame.find('"', start)
+    if end == -1:
+        return None
+
+    value = frame[start:end]
+    # Con escapes (p. ej. "\/") el valor no es el string literal: decodificación normal
+    if "\\" in value:
+        return None
+    return event_type, value
+
+
+# Codec usado por el WebSocket de las llamadas
+realtime_codec = get_codec()
@@ -99,6 +99,7 @@ def choose_random_assistant():
     3. Verificar horarios de la sede específica con `search_info_about_the_lab`
     4. `listar_usuarios` → obtener user_id
     5. `verificar_disponibilidad_citas` → confirmar horario disponible
+       - Si el usuario no tiene hora exacta o la hora no está disponible: `buscar_horarios_disponibles` → ofrecer 2 o 3 de los horarios retornados (NO probar horario por horario)
     6. CONFIRMAR todos los detalles con usuario
     7. `crear_cita` → envía correo automático
 
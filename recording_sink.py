@@ -0,0 +1,145 @@
+"""
+Persistencia de grabaciones fuera del event loop.
+
+Las escrituras a disco (JSON, WAV, resumen) se encolan en una cola acotada y
+un worker las ejecuta por lotes en un pool de hilos. Si la cola se llena, el
+productor espera (backpressure) en lugar de acumular memoria sin límite.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+RECORDING_QUEUE_SIZE = int(os.getenv("RECORDING_QUEUE_SIZE", 100))
+RECORDING_WRITER_THREADS = int(os.getenv("RECORDING_WRITER_THREADS", 2))
+RECORDING_BATCH_SIZE = int(os.getenv("RECORDING_BATCH_SIZE", 8))
+
+
+class RecordingSink:
+    """Cola acotada de escrituras de grabaciones drenada por un pool de hilos"""
+
+    def __init__(self, max_queue_size: int = RECORDING_QUEUE_SIZE,
+                 writer_threads: int = RECORDING_WRITER_THREADS,
+                 batch_size: int = RECORDING_BATCH_SIZE):
+        """
+        Args:
+            max_queue_size: Máximo de trabajos pendientes antes de aplicar backpressure
+            writer_threads: Hilos del pool que ejecutan las escrituras
+            batch_size: Máximo de trabajos que un worker toma de la cola por lote
+        """
+        self.max_queue_size = max_queue_size
+        self.writer_threads = writer_threads
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "batches": 0,
+            "backpressure_waits": 0,
+            "max_queue_depth": 0,
+            "total_write_seconds": 0.0,
+            "max_write_seconds": 0.0,
+        }
+
+    def _ensure_started(self) -> None:
+        """Inicia los workers en el loop actual (la primera vez que se usa el sink)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.writer_threads,
+                thread_name_prefix="recording_writer"
+            )
+        self._workers = [
+            loop.create_task(self._worker(), name=f"recording_sink_{i}")
+            for i in range(self.writer_threads)
+        ]
+
+    async def submit(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Encola una escritura y espera su resultado sin bloquear el loop.
+
+        Si la cola está llena, espera a que haya espacio (backpressure).
+        """
+        self._ensure_started()
+        future = self._loop.create_future()
+
+        if self._queue.full():
+            self.metrics["backpressure_waits"] += 1
+        await self._queue.put((func, args, future))
+
+        self.metrics["submitted"] += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self._queue.qsize())
+        return await future
+
+    async def _worker(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                outcomes = await self._loop.run_in_executor(self._executor, self._run_batch, batch)
+                self.metrics["batches"] += 1
+                for (_, _, future), (ok, value, elapsed) in zip(batch, outcomes):
+                    self.metrics["total_write_seconds"] += elapsed
+                    self.metrics["max_write_seconds"] = max(self.metrics["max_write_seconds"], elapsed)
+                    if ok:
+                        self.metrics["completed"] += 1
+                        if not future.done():
+                            future.set_result(value)
+                    else:
+                        self.metrics["failed"] += 1
+                        if not future.done():
+                            future.set_exception(value)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _run_batch(batch: List[Tuple[Callable, tuple, asyncio.Future]]) -> List[Tuple[bool, Any, float]]:
+        """Ejecuta un lote de escrituras en un hilo del pool"""
+        outcomes = []
+        for func, args, _ in batch:
+            started = time.perf_counter()
+            try:
+                outcomes.append((True, func(*args), time.perf_counter() - started))
+            except Exception as e:
+                outcomes.append((False, e, time.perf_counter() - started))
+        return outcomes
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna las métricas del sink"""
+        completed = self.metrics["completed"] + self.metrics["failed"]
+        return {
+            **self.metrics,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_queue_size,
+            "avg_write_seconds": self.metrics["total_write_seconds"] / completed if completed else 0.0,
+        }
+
+    async def shutdown(self) -> None:
+        """Espera a que se escriban los trabajos pendientes y detiene los workers"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Instancia global del sink de grabaciones
+recording_sink = RecordingSink()
@@ -0,0 +1,198 @@
+"""
+Catálogo indexado de grabaciones en SQLite.
+
+Reemplaza el escaneo del directorio recordings/ en cada petición a /recordings.
+save_recording y DELETE /recordings/{id} mantienen el catálogo actualizado.
+"""
+import logging
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from audio_encoders import find_audio_file
+
+logger = logging.getLogger(__name__)
+
+# Máximo de grabaciones por página (LIMIT negativo en SQLite = sin límite)
+MAX_RECORDINGS_PAGE = 1000
+
+SORT_COLUMNS = {
+    "started_at": "started_at",
+    "duration": "duration_seconds",
+    "messages": "total_messages",
+}
+
+
+class RecordingsCatalog:
+    """Índice persistente de grabaciones con paginación, filtros y orden"""
+
+    def __init__(self, recordings_dir: str = "recordings", db_name: str = "catalog.db"):
+        self.recordings_dir = recordings_dir
+        self.db_path = os.path.join(recordings_dir, db_name)
+        self._lock = threading.Lock()
+
+        os.makedirs(recordings_dir, exist_ok=True)
+        # Se usa desde el loop (listados) y desde los hilos del recording_sink (altas)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS recordings (
+                    base_name TEXT PRIMARY KEY,
+                    call_id TEXT NOT NULL,
+                    started_at TEXT NOT NULL,
+                    duration_seconds REAL,
+                    total_messages INTEGER,
+                    summary_file TEXT,
+                    conversation_file TEXT,
+                    audio_file TEXT,
+                    audio_format TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_recordings_started_at ON recordings (started_at);
+                CREATE INDEX IF NOT EXISTS idx_recordings_call_id ON recordings (call_id, started_at);
+            ''')
+            self.conn.commit()
+            empty = self.conn.execute('SELECT 1 FROM recordings LIMIT 1').fetchone() is None
+
+        # La primera vez se indexan las grabaciones que ya existen en disco
+        if empty:
+            self.rebuild_from_directory()
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        """Agrega o actualiza una grabación en el catálogo"""
+        with self._lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO recordings (
+                    base_name, call_id, started_at, duration_seconds, total_messages,
+                    summary_file, conversation_file, audio_file, audio_format
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                entry["base_name"], entry["call_id"], entry["started_at"],
+                entry.get("duration_seconds"), entry.get("total_messages"),
+                entry.get("summary_file"), entry.get("conversation_file"),
+                entry.get("audio_file"), entry.get("audio_format")
+            ))
+            self.conn.commit()
+
+    def get(self, base_name: str) -> Optional[Dict[str, Any]]:
+        """Obtiene una grabación del catálogo por su nombre base"""
+        with self._lock:
+            row = self.conn.execute('SELECT * FROM recordings WHERE base_name = ?', (base_name,)).fetchone()
+        return self._row_to_recording(row) if row else None
+
+    def delete(self, base_name: str) -> bool:
+        """Elimina una grabación del catálogo"""
+        with self._lock:
+            cursor = self.conn.execute('DELETE FROM recordings WHERE base_name = ?', (base_name,))
+            self.conn.commit()
+            return cursor.rowcount > 0
+
+    def list(self, limit: int = 100, offset: int = 0, call_id: Optional[str] = None,
+             date_from: Optional[str] = None, date_to: Optional[str] = None,
+             sort: str = "started_at", order: str = "desc") -> Dict[str, Any]:
+        """
+        Lista grabaciones con paginación.
+
+        Args:
+            limit: Máximo de grabaciones por página (1 a MAX_RECORDINGS_PAGE)
+            offset: Grabaciones a saltar (>= 0)
+            call_id: Filtra por call_id exacto
+            date_from: Fecha inicial inclusiva (YYYY-MM-DD)
+            date_to: Fecha final inclusiva (YYYY-MM-DD)
+            sort: Columna de orden ("started_at", "duration" o "messages")
+            order: "asc" o "desc"
+
+        Returns:
+            Diccionario con el total de coincidencias y la página de grabaciones
+        """
+        limit = max(1, min(int(limit), MAX_RECORDINGS_PAGE))
+        offset = max(0, int(offset))
+        conditions = []
+        params: List[Any] = []
+
+        if call_id:
+            conditions.append("call_id = ?")
+            params.append(call_id)
+        if date_from:
+            conditions.append("started_at >= ?")
+            params.append(date.fromisoformat(date_from).isoformat())
+        if date_to:
+            conditions.append("started_at < ?")
+            params.append((date.fromisoformat(date_to) + timedelta(days=1)).isoformat())
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sort_column = SORT_COLUMNS.get(sort, "started_at")
+        direction = "ASC" if order.lower() == "asc" else "DESC"
+
+        with self._lock:
+            total = self.conn.execute(f'SELECT COUNT(*) FROM recordings {where}', params).fetchone()[0]
+            rows = self.conn.execute(f'''
+                SELECT * FROM recordings {where}
+                ORDER BY {sort_column} {direction}, base_name {direction}
+                LIMIT ? OFFSET ?
+            ''', params + [limit, offset]).fetchall()
+
+        return {
+            "total": total,
+            "recordings": [self._row_to_recording(row) for row in rows],
+        }
+
+    @staticmethod
+    def _row_to_recording(row: sqlite3.Row) -> Dict[str, Any]:
+        base_name = row["base_name"]
+        return {
+            "timestamp": base_name[:-len(row["call_id"]) - 1],
+            "call_id": row["call_id"],
+            "base_name": base_name,
+            "started_at": row["started_at"],
+            "duration_seconds": row["duration_seconds"],
+            "total_messages": row["total_messages"],
+            "files": {
+                "summary": row["summary_file"],
+                "conversation": row["conversation_file"],
+                "audio": row["audio_file"]
+            },
+            "audio_format": row["audio_format"]
+        }
+
+    def rebuild_from_directory(self) -> int:
+        """Indexa las grabaciones existentes en disco (migración desde el escaneo por directorio)"""
+        count = 0
+        for file in os.listdir(self.recordings_dir):
+            if not file.endswith('_summary.txt'):
+                continue
+
+            # Nombre: YYYYMMDD_HHMMSS_{call_id}_summary.txt
+            base_name = file[:-len('_summary.txt')]
+            parts = base_name.split('_', 2)
+            if len(parts) < 3:
+                continue
+            day, time_of_day, call_id = parts
+            if len(day) != 8 or len(time_of_day) != 6:
+                continue
+
+            conversation_file = f"{base_name}_conversation.json"
+            audio = find_audio_file(self.recordings_dir, base_name)
+            self.add({
+                "base_name": base_name,
+                "call_id": call_id,
+                "started_at": f"{day[:4]}-{day[4:6]}-{day[6:]}T{time_of_day[:2]}:{time_of_day[2:4]}:{time_of_day[4:]}",
+                "summary_file": file,
+                "conversation_file": conversation_file if os.path.exists(os.path.join(self.recordings_dir, conversation_file)) else None,
+                "audio_file": os.path.basename(audio[0]) if audio else None,
+                "audio_format": audio[1] if audio else None,
+            })
+            count += 1
+
+        if count:
+            logger.info("📇 Catálogo de grabaciones reconstruido: %s grabaciones", count)
+        return count
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,190 @@
+"""
+Benchmark de las consultas de citas antes y después de las migraciones.
+
+Crea una base temporal con el esquema base (migración 1), la llena con
+usuarios y citas sintéticas y mide la latencia de las consultas calientes de
+database.py; luego aplica el resto de migraciones (índices, capacidad_horario,
+fecha_cita_utc) y vuelve a medir. Las consultas "antes" son las que usaba
+database.py con el esquema base (SQL_*_ESQUEMA_BASE).
+
+Uso:
+    python scripts/bench_appointment_queries.py                    # 1M citas
+    python scripts/bench_appointment_queries.py --citas 200000 --queries 50
+"""
+import argparse
+import os
+import pathlib
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+from appointment_dates import slot_key  # noqa: E402
+from init_db import apply_migrations  # noqa: E402
+
+# Consultas de database.py con el esquema base (sin capacidad_horario ni fecha_cita_utc)
+SQL_DISPONIBILIDAD_ESQUEMA_BASE = '''
+    SELECT c.id, c.fecha_cita, c.ciudad, u.nombre, u.apellido
+    FROM cita_examen_medico c
+    JOIN usuarios u ON c.id_usuario = u.id
+    WHERE c.ciudad = ? AND c.fecha_cita = ?
+'''
+SQL_CITAS_USUARIO_ESQUEMA_BASE = '''
+    SELECT c.id, c.fecha_cita, c.ciudad, c.direccion_usuario, c.time_creacion
+    FROM cita_examen_medico c
+    WHERE c.id_usuario = ?
+    ORDER BY c.fecha_cita DESC
+'''
+SQL_LISTAR_CITAS_ESQUEMA_BASE = '''
+    SELECT c.id, c.fecha_cita, c.ciudad, c.direccion_usuario, c.time_creacion, u.cedula, u.nombre, u.apellido
+    FROM cita_examen_medico c
+    JOIN usuarios u ON c.id_usuario = u.id
+    ORDER BY c.fecha_cita DESC
+'''
+
+CIUDADES = ["Barranquilla", "Bogotá", "Medellín", "Cali", "Cartagena", "Santa Marta", "Bucaramanga", "Pereira"]
+
+
+def seed(db_path: str, usuarios: int, citas: int, batch: int = 50000) -> None:
+    """Inserta usuarios, un examen por usuario y citas en horarios de 30 minutos"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    rng = random.Random(42)
+
+    conn.executemany(
+        "INSERT INTO usuarios (cedula, nombre, apellido, correo, direccion) VALUES (?, ?, ?, ?, ?)",
+        ((str(10000000 + i), f"Nombre{i}", f"Apellido{i}", f"user{i}@example.com", "Calle 1") for i in range(usuarios))
+    )
+    conn.executemany(
+        "INSERT INTO examenes_medicos (id_usuario, resumen, nombre_archivo) VALUES (?, ?, ?)",
+        ((i + 1, "Resultado", f"examen_{i}.pdf") for i in range(usuarios))
+    )
+
+    inicio = datetime(2024, 1, 1, 8, 0)
+    slots = 365 * 2 * 20  # dos años, 20 horarios de 30 minutos por día
+    for offset in range(0, citas, batch):
+        rows = []
+        for _ in range(min(batch, citas - offset)):
+            slot = rng.randrange(slots)
+            fecha = inicio + timedelta(days=slot // 20, minutes=30 * (slot % 20))
+            rows.append((rng.randint(1, usuarios), fecha.strftime("%Y-%m-%d %H:%M"), rng.choice(CIUDADES), "Calle 1"))
+        conn.executemany(
+            "INSERT INTO cita_examen_medico (id_usuario, fecha_cita, ciudad, direccion_usuario) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+    conn.close()
+
+
+def sample_args(db_path: str, queries: int):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT fecha_cita, ciudad, id_usuario FROM cita_examen_medico ORDER BY random() LIMIT ?", (queries,)
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def cases_before() -> list:
+    """(nombre, SQL, argumentos) de las consultas calientes con el esquema base"""
+    return [
+        ("verificar_disponibilidad_citas", SQL_DISPONIBILIDAD_ESQUEMA_BASE, lambda fecha, ciudad, usuario: (ciudad, fecha)),
+        ("obtener_citas_activas_usuario", SQL_CITAS_USUARIO_ESQUEMA_BASE, lambda fecha, ciudad, usuario: (usuario,)),
+        ("obtener_examenes_medicos", database.SQL_OBTENER_EXAMENES_MEDICOS, lambda fecha, ciudad, usuario: (usuario,)),
+        # listar_todas_citas: todo el historial en cada carga del panel
+        ("/citas", SQL_LISTAR_CITAS_ESQUEMA_BASE, lambda fecha, ciudad, usuario: ()),
+    ]
+
+
+def cases_after() -> list:
+    """Las mismas consultas como las hace database.py después de las migraciones"""
+    # Una página de /citas que continúa en la fecha de la muestra (keyset, en medio del historial)
+    sql_pagina, _ = database.consultas_pagina_citas(despues=database.codificar_cursor_citas(slot_key("2024-06-01 08:00"), 0))[0]
+    return [
+        ("verificar_disponibilidad_citas", database.SQL_CAPACIDAD_HORARIO,
+         lambda fecha, ciudad, usuario: (ciudad, slot_key(fecha))),
+        ("obtener_citas_activas_usuario", database.SQL_CITAS_USUARIO,
+         lambda fecha, ciudad, usuario: (usuario, "2024-06-01T00:00:00Z")),
+        ("obtener_examenes_medicos", database.SQL_OBTENER_EXAMENES_MEDICOS, lambda fecha, ciudad, usuario: (usuario,)),
+        ("/citas", sql_pagina,
+         lambda fecha, ciudad, usuario: (slot_key(fecha), 0, database.CITAS_POR_PAGINA + 1)),
+    ]
+
+
+def measure(db_path: str, args: list, queries: list) -> dict:
+    """Latencias (ms) de cada consulta con los mismos argumentos"""
+    conn = sqlite3.connect(db_path)
+    results = {}
+    for name, sql, params in queries:
+        conn.execute(sql, params(*args[0])).fetchall()  # calentar caché de páginas
+        latencies = []
+        for fecha, ciudad, usuario in args:
+            start = time.perf_counter()
+            conn.execute(sql, params(fecha, ciudad, usuario)).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        results[name] = {
+            "p50": statistics.median(latencies),
+            "p95": latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+        }
+    conn.close()
+    return results
+
+
+def query_plans(db_path: str, args: tuple, queries: list) -> dict:
+    conn = sqlite3.connect(db_path)
+    plans = {}
+    for name, sql, params in queries:
+        plans[name] = "; ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params(*args)))
+    conn.close()
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de consultas de citas con y sin índices")
+    parser.add_argument("--citas", type=int, default=1_000_000, help="Citas sintéticas")
+    parser.add_argument("--usuarios", type=int, default=50_000, help="Usuarios sintéticos")
+    parser.add_argument("--queries", type=int, default=20, help="Consultas medidas por caso")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        apply_migrations(db_path, target=1)
+
+        start = time.perf_counter()
+        seed(db_path, args.usuarios, args.citas)
+        print(f"Datos: {args.usuarios:,} usuarios, {args.citas:,} citas ({time.perf_counter() - start:.1f}s)")
+
+        sample = sample_args(db_path, args.queries)
+        queries_before = cases_before()
+        before = measure(db_path, sample, queries_before)
+        plans_before = query_plans(db_path, sample[0], queries_before)
+
+        start = time.perf_counter()
+        version = apply_migrations(db_path)
+        print(f"Migraciones hasta la versión {version} en {time.perf_counter() - start:.1f}s")
+
+        queries_after = cases_after()
+        after = measure(db_path, sample, queries_after)
+        plans_after = query_plans(db_path, sample[0], queries_after)
+
+    print(f"\n{'consulta':<34}{'antes p50':>12}{'antes p95':>12}{'después p50':>14}{'después p95':>14}{'mejora':>10}")
+    for name in before:
+        b, a = before[name], after[name]
+        print(f"{name:<34}{b['p50']:>10.2f}ms{b['p95']:>10.2f}ms{a['p50']:>12.3f}ms{a['p95']:>12.3f}ms"
+              f"{b['p50'] / a['p50']:>9.0f}x")
+
+    print("\nPlanes de consulta:")
+    for name in plans_before:
+        print(f"  {name}\n    antes:   {plans_before[name]}\n    después: {plans_after[name]}")
+
+
+if __name__ == "__main__":
+    main()
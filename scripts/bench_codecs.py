@@ -0,0 +1,117 @@
+"""
+Benchmark de los codecs JSON del WebSocket de llamadas.
+
+Compara, sobre tráfico grabado o sintético:
+- decodificar cada frame completo (loads),
+- el camino del WebSocket: peek_event para audio + loads para el resto,
+- codificar los eventos salientes (dumps).
+
+Uso:
+    python scripts/bench_codecs.py                 # tráfico sintético
+    python scripts/bench_codecs.py captura.jsonl   # un frame JSON por línea (tal como llegó)
+"""
+import argparse
+import base64
+import json
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from call_recorder import AUDIO_EVENTS, SAMPLE_RATE, SAMPLE_WIDTH  # noqa: E402
+from realtime_codec import CODECS, orjson, peek_event  # noqa: E402
+
+AUDIO_EVENT_FIELDS = {event_type: field for event_type, (_, field) in AUDIO_EVENTS.items()}
+
+
+def synthetic_frames(seconds: int = 60, chunk_ms: int = 100) -> list:
+    """Frames como los envía el Realtime API: mayoría de deltas de audio"""
+    chunk = base64.b64encode(bytes(range(256)) * (SAMPLE_RATE * SAMPLE_WIDTH * chunk_ms // 1000 // 256)).decode()
+    frames = []
+    for i in range(seconds * 1000 // chunk_ms):
+        frames.append(json.dumps({
+            "type": "response.output_audio.delta", "event_id": f"event_{i}",
+            "response_id": "resp_1", "item_id": "item_1", "output_index": 0,
+            "content_index": 0, "delta": chunk
+        }))
+        if i % 3 == 0:
+            frames.append(json.dumps({
+                "type": "response.output_audio_transcript.delta", "event_id": f"event_t{i}",
+                "response_id": "resp_1", "item_id": "item_1", "output_index": 0,
+                "content_index": 0, "delta": "Claro, con gusto "
+            }))
+        if i % 50 == 49:
+            frames.append(json.dumps({
+                "type": "response.done", "event_id": f"event_d{i}",
+                "response": {"id": "resp_1", "status": "completed", "output": [],
+                             "usage": {"total_tokens": 120, "input_tokens": 80, "output_tokens": 40}}
+            }))
+    return frames
+
+
+def outbound_events() -> list:
+    return [
+        {"type": "conversation.item.create", "item": {
+            "type": "function_call_output", "call_id": "call_1",
+            "output": json.dumps({"disponible": True, "citas_agendadas": 2, "fecha": "2025-10-20 08:00"})
+        }},
+        {"type": "response.create"},
+    ]
+
+
+def timed(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de codecs JSON del WebSocket")
+    parser.add_argument("capture", nargs="?", help="Archivo JSONL con frames capturados")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se toma la mejor)")
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "r", encoding="utf-8") as f:
+            frames = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        frames = synthetic_frames()
+    outbound = outbound_events() * 1000
+    total_mb = sum(len(frame) for frame in frames) / 1e6
+
+    print(f"Frames: {len(frames)} ({total_mb:.1f} MB)  orjson instalado: {orjson is not None}")
+    print(f"{'codec':<10}{'loads µs/frame':>16}{'peek+loads µs/frame':>22}{'MB/s':>10}{'dumps µs/evento':>18}")
+
+    for name, codec_class in CODECS.items():
+        if name == "orjson" and orjson is None:
+            continue
+        codec = codec_class()
+
+        def loads_all():
+            for frame in frames:
+                codec.loads(frame)
+
+        def websocket_path():
+            for frame in frames:
+                if peek_event(frame, AUDIO_EVENT_FIELDS) is None:
+                    codec.loads(frame)
+
+        def dumps_all():
+            for event in outbound:
+                codec.dumps(event)
+
+        loads_seconds = timed(loads_all, args.repeat)
+        path_seconds = timed(websocket_path, args.repeat)
+        dumps_seconds = timed(dumps_all, args.repeat)
+        print(f"{name:<10}{loads_seconds / len(frames) * 1e6:>16.2f}"
+              f"{path_seconds / len(frames) * 1e6:>22.2f}"
+              f"{total_mb / path_seconds:>10.0f}"
+              f"{dumps_seconds / len(outbound) * 1e6:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark de handle_websocket_message.
+
+Reproduce un stream de eventos del Realtime API contra el manejador real
+(grabador incluido) y reporta el costo de CPU por evento y por tipo.
+
+Uso:
+    python scripts/bench_event_dispatch.py                      # stream sintético
+    python scripts/bench_event_dispatch.py captura.jsonl        # un evento JSON por línea
+    python scripts/bench_event_dispatch.py captura.jsonl --repeat 5
+    python scripts/bench_event_dispatch.py --policy transcript
+    python scripts/bench_event_dispatch.py --deferred
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+# main.py valida estas variables al importarse; el benchmark no llama a OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("OPENAI_WEBHOOK_SECRET", "bench")
+
+from call_recorder import CallRecorder, RECORDING_POLICIES, SAMPLE_RATE, SAMPLE_WIDTH  # noqa: E402
+from function_manager import FunctionManager  # noqa: E402
+from main import handle_websocket_message  # noqa: E402
+
+
+class FakeWebSocket:
+    """WebSocket que solo cuenta los mensajes enviados"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, message: str):
+        self.sent += 1
+
+
+def synthetic_stream(seconds: int = 60, chunk_ms: int = 100) -> list:
+    """Llamada sintética: audio del asistente cada chunk_ms más transcripción y turnos"""
+    chunk = base64.b64encode(bytes(SAMPLE_RATE * SAMPLE_WIDTH * chunk_ms // 1000)).decode()
+    events = [{"type": "session.created", "session": {}}]
+    for i in range(seconds * 1000 // chunk_ms):
+        if i % 50 == 0:
+            events.append({"type": "input_audio_buffer.speech_started"})
+            events.append({"type": "input_audio_buffer.speech_stopped"})
+            events.append({"type": "conversation.item.input_audio_transcription.completed", "transcript": "Quiero agendar un examen"})
+            events.append({"type": "response.created", "response": {}})
+        events.append({"type": "response.output_audio.delta", "delta": chunk})
+        if i % 3 == 0:
+            events.append({"type": "response.output_audio_transcript.delta", "delta": "Claro, "})
+        if i % 50 == 49:
+            events.append({"type": "response.done", "response": {"output": [], "usage": {"total_tokens": 120}}})
+    return events
+
+
+def load_capture(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(events: list, repeat: int, policy: str, deferred: bool) -> dict:
+    timings = defaultdict(float)
+    counts = defaultdict(int)
+    ws = FakeWebSocket()
+    function_manager = FunctionManager()
+
+    with tempfile.TemporaryDirectory() as recordings_dir:
+        for run in range(repeat):
+            recorder = CallRecorder(recordings_dir=recordings_dir, audio_format="wav",
+                                    policy=policy, deferred_audio=deferred)
+            recorder.start_recording(f"bench_{run}")
+            # La salida de consola se descarta, pero su costo se sigue pagando
+            with contextlib.redirect_stdout(io.StringIO()):
+                for message_data in events:
+                    start = time.perf_counter()
+                    await handle_websocket_message(message_data, ws, function_manager, 0, recorder)
+                    elapsed = time.perf_counter() - start
+                    event_type = message_data.get("type", "")
+                    timings[event_type] += elapsed
+                    counts[event_type] += 1
+                await recorder.save_recording()
+
+    return {"timings": timings, "counts": counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de handle_websocket_message")
+    parser.add_argument("capture", nargs="?", help="Archivo JSONL con eventos capturados")
+    parser.add_argument("--repeat", type=int, default=3, help="Veces que se reproduce el stream")
+    parser.add_argument("--policy", default="full", choices=RECORDING_POLICIES, help="Política de grabación")
+    parser.add_argument("--deferred", action="store_true", help="Decodifica el audio por lotes (RECORDING_AUDIO_DEFERRED)")
+    args = parser.parse_args()
+
+    events = load_capture(args.capture) if args.capture else synthetic_stream()
+    result = asyncio.run(replay(events, args.repeat, args.policy, args.deferred))
+    timings, counts = result["timings"], result["counts"]
+
+    total_events = sum(counts.values())
+    total_seconds = sum(timings.values())
+    print(f"Eventos: {total_events}  Tiempo: {total_seconds:.3f}s  "
+          f"Promedio: {total_seconds / total_events * 1e6:.1f} µs/evento  "
+          f"({total_events / total_seconds:,.0f} eventos/s)")
+    print(f"{'tipo':<58}{'eventos':>10}{'µs/evento':>12}")
+    for event_type in sorted(timings, key=timings.get, reverse=True):
+        print(f"{event_type:<58}{counts[event_type]:>10}{timings[event_type] / counts[event_type] * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Supervisor de sesiones de llamadas en tiempo real.
+
+Agenda cada llamada como una tarea asyncio en el loop del servidor (uvicorn)
+en lugar de crear un hilo y un event loop propio por llamada.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Coroutine, Dict, List, Optional, Set
+from event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_CALLS = int(os.getenv("MAX_CONCURRENT_CALLS", 200))
+
+# Tópico del bus donde se notifican las llamadas que empiezan y terminan
+CALLS_TOPIC = "recordings"
+
+
+class SessionSupervisor:
+    """Gestiona las sesiones activas de llamadas como tareas en el loop principal"""
+
+    def __init__(self, max_concurrent_calls: int = MAX_CONCURRENT_CALLS, shutdown_timeout: float = 10.0):
+        """
+        Args:
+            max_concurrent_calls: Número máximo de llamadas simultáneas
+            shutdown_timeout: Segundos a esperar a que las tareas terminen al apagar
+        """
+        self.max_concurrent_calls = max_concurrent_calls
+        self.shutdown_timeout = shutdown_timeout
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        # Llamadas con cupo reservado cuyo accept todavía está en curso
+        self._reserved: Set[str] = set()
+        self._closing = False
+
+    @property
+    def active_count(self) -> int:
+        return len(self.sessions)
+
+    def has_capacity(self) -> bool:
+        """Indica si se puede aceptar una nueva llamada (cuenta también los cupos reservados)"""
+        return not self._closing and self.active_count + len(self._reserved) < self.max_concurrent_calls
+
+    def is_known(self, call_id: str) -> bool:
+        """Indica si la llamada ya tiene sesión o cupo reservado (ej. webhook duplicado)"""
+        return call_id in self.sessions or call_id in self._reserved
+
+    def reserve(self, call_id: str) -> bool:
+        """
+        Reserva el cupo de una llamada antes de aceptarla.
+
+        La reserva se hace sin await de por medio con has_capacity, así dos
+        webhooks concurrentes no pueden aceptar más llamadas que el máximo.
+        start_session consume la reserva; si el accept falla hay que liberarla
+        con release_reservation.
+
+        Returns:
+            False si no hay capacidad o la llamada ya existe
+        """
+        if self.is_known(call_id) or not self.has_capacity():
+            return False
+        self._reserved.add(call_id)
+        return True
+
+    def release_reservation(self, call_id: str) -> None:
+        self._reserved.discard(call_id)
+
+    def start_session(self, call_id: str, coro: Coroutine) -> Optional[asyncio.Task]:
+        """
+        Agenda la corrutina de una llamada como tarea en el loop actual.
+
+        Args:
+            call_id: ID de la llamada
+            coro: Corrutina que atiende la llamada (websocket_task_async)
+
+        Returns:
+            La tarea creada, o None si no hay capacidad o la llamada ya existe
+        """
+        reserved = call_id in self._reserved
+        self._reserved.discard(call_id)
+        if call_id in self.sessions or (not reserved and not self.has_capacity()) or self._closing:
+            coro.close()
+            return None
+
+        task = asyncio.get_running_loop().create_task(coro, name=f"call_{call_id}")
+        self.sessions[call_id] = {
+            "call_id": call_id,
+            "task": task,
+            "started_at": datetime.now(),
+        }
+        task.add_done_callback(lambda t: self._on_session_done(call_id, t))
+        event_bus.publish(CALLS_TOPIC, {
+            "type": "call.started",
+            "call_id": call_id,
+            "started_at": self.sessions[call_id]["started_at"].isoformat(),
+            "active_calls": self.active_count
+        })
+        logger.info("📞 Sesión iniciada: %s (%s/%s)", call_id, self.active_count, self.max_concurrent_calls, extra={"call_id": call_id})
+        return task
+
+    def _on_session_done(self, call_id: str, task: asyncio.Task) -> None:
+        session = self.sessions.get(call_id)
+        if session and session["task"] is task:
+            del self.sessions[call_id]
+            event_bus.publish(CALLS_TOPIC, {
+                "type": "call.ended",
+                "call_id": call_id,
+                "active_calls": self.active_count
+            })
+
+        if task.cancelled():
+            logger.info("🛑 Sesión cancelada: %s", call_id, extra={"call_id": call_id})
+        elif task.exception() is not None:
+            logger.error("❌ Sesión %s terminó con error: %s", call_id, task.exception(), extra={"call_id": call_id})
+        else:
+            logger.info("📴 Sesión finalizada: %s (%s activas)", call_id, self.active_count, extra={"call_id": call_id})
+
+    def get_live_sessions(self) -> List[Dict[str, Any]]:
+        """Retorna la información de las sesiones activas"""
+        now = datetime.now()
+        return [
+            {
+                "call_id": session["call_id"],
+                "started_at": session["started_at"].isoformat(),
+                "duration_seconds": (now - session["started_at"]).total_seconds(),
+            }
+            for session in self.sessions.values()
+        ]
+
+    async def cancel_session(self, call_id: str) -> bool:
+        """Cancela una sesión activa y espera a que libere sus recursos"""
+        session = self.sessions.get(call_id)
+        if not session:
+            return False
+
+        task = session["task"]
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    async def shutdown(self) -> None:
+        """Cancela todas las sesiones activas (se llama al apagar el servidor)"""
+        self._closing = True
+        tasks = [session["task"] for session in self.sessions.values()]
+        if not tasks:
+            return
+
+        logger.info("🛑 Cancelando %s sesiones activas...", len(tasks))
+        for task in tasks:
+            task.cancel()
+
+        # Los bloques finally de cada llamada guardan la grabación antes de terminar
+        done, pending = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+        if pending:
+            logger.warning("⚠️ %s sesiones no terminaron en %ss", len(pending), self.shutdown_timeout)
+
+
+# Instancia global del supervisor
+session_supervisor = SessionSupervisor()
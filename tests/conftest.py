@@ -0,0 +1,64 @@
+import asyncio
+import pathlib
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from init_db import apply_migrations  # noqa: E402
+import database  # noqa: E402
+import database_async  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Base de datos migrada a la última versión, con un usuario (id 1)"""
+    path = str(tmp_path / "test.db")
+    apply_migrations(path)
+    with database.connection_manager.transaction(path) as conn:
+        conn.execute(
+            "INSERT INTO usuarios (cedula, nombre, apellido, correo, direccion) VALUES (?, ?, ?, ?, ?)",
+            ("1001", "Ana", "Pérez", "ana@example.com", "Calle 1")
+        )
+    yield path
+    database.close_connections()
+
+
+@pytest.fixture
+def sent_emails(monkeypatch):
+    """Reemplaza el envío SMTP de crear_cita y registra los correos enviados"""
+    sent = []
+    email_helper = types.ModuleType("email_helper")
+    email_helper.send_email_with_file = lambda **kwargs: sent.append(kwargs) or {"success": True}
+    monkeypatch.setitem(sys.modules, "email_helper", email_helper)
+    return sent
+
+
+@pytest.fixture
+def tool_modules(monkeypatch):
+    """
+    Importa function_manager sin las tools reales (functions importa el RAG y
+    sus clientes de OpenAI/Redis); las pruebas registran sus propias funciones.
+    """
+    functions = types.ModuleType("functions")
+    functions.available_functions = {}
+    functions.available_async_functions = {}
+    monkeypatch.setitem(sys.modules, "functions", functions)
+    monkeypatch.delitem(sys.modules, "function_manager", raising=False)
+    import function_manager
+    yield function_manager
+    function_manager.shutdown_executors()
+    sys.modules.pop("function_manager", None)
+
+
+def run_async(coro):
+    """Ejecuta una corrutina en un loop nuevo y cierra el pool aiosqlite ligado a ese loop"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await database_async.close_async_connections()
+
+    return asyncio.run(main())
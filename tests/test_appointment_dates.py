@@ -0,0 +1,77 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from appointment_dates import (LOCAL_TIMEZONE, from_utc_iso, is_date_only, normalize_fecha_cita, parse_fecha_cita,
+                               slot_key, to_utc_iso)
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("2025-10-15 10:30 AM", "2025-10-15T15:30:00Z"),
+    ("2025-10-15 10:30 PM", "2025-10-16T03:30:00Z"),
+    ("2025-10-15 10:30pm", "2025-10-16T03:30:00Z"),
+    ("2025-10-15 10:30 a. m.", "2025-10-15T15:30:00Z"),
+    ("2025-10-15 10:30 p.m.", "2025-10-16T03:30:00Z"),
+    ("2025-10-15  10:30   AM ", "2025-10-15T15:30:00Z"),
+    ("2025-10-15 10 AM", "2025-10-15T15:00:00Z"),
+    ("2025-10-15 10:30", "2025-10-15T15:30:00Z"),
+    ("2025-10-15T10:30:00", "2025-10-15T15:30:00Z"),
+    ("2025-10-15T15:30:00Z", "2025-10-15T15:30:00Z"),
+    ("2025-10-15T10:30:00-05:00", "2025-10-15T15:30:00Z"),
+    ("2025/10/15 14:00", "2025-10-15T19:00:00Z"),
+    ("15/10/2025 14:00", "2025-10-15T19:00:00Z"),
+    ("15/10/2025 02:00 PM", "2025-10-15T19:00:00Z"),
+    ("15-10-2025 14:00", "2025-10-15T19:00:00Z"),
+    ("2025-10-15", "2025-10-15T05:00:00Z"),
+    ("15/10/2025", "2025-10-15T05:00:00Z"),
+])
+def test_normalize_fecha_cita(texto, esperado):
+    assert normalize_fecha_cita(texto) == esperado
+
+
+@pytest.mark.parametrize("texto", [None, "", "mañana temprano", "2025-13-40 10:00", "10:30 AM", "32/10/2025"])
+def test_fecha_no_reconocida(texto):
+    assert parse_fecha_cita(texto) is None
+    assert normalize_fecha_cita(texto) is None
+
+
+def test_slot_key_agrupa_formatos_del_mismo_horario():
+    claves = {slot_key(texto) for texto in ("2025-10-15 10:30 AM", "2025-10-15 10:30", "15/10/2025 10:30 a. m.")}
+
+    assert claves == {"2025-10-15T15:30:00Z"}
+    assert slot_key("2025-10-15 10:30 AM") != slot_key("2025-10-15 10:30 PM")
+    # Sin reconocer: el texto tal cual, para que el cupo se siga contando
+    assert slot_key("mañana temprano") == "mañana temprano"
+
+
+def test_iso_utc_ida_y_vuelta():
+    local = datetime(2025, 10, 15, 10, 30, tzinfo=LOCAL_TIMEZONE)
+
+    assert to_utc_iso(local) == "2025-10-15T15:30:00Z"
+    assert to_utc_iso(datetime(2025, 10, 15, 10, 30)) == "2025-10-15T15:30:00Z"
+    assert to_utc_iso(datetime(2025, 10, 15, 15, 30, tzinfo=timezone.utc)) == "2025-10-15T15:30:00Z"
+    assert from_utc_iso("2025-10-15T15:30:00Z") == local
+    assert from_utc_iso(to_utc_iso(local)).utcoffset() == local.utcoffset()
+
+
+def test_el_texto_utc_ordena_como_el_tiempo():
+    # De la más reciente a la más antigua; como texto local no ordenan así
+    textos = ["2025-10-16 08:00 AM", "15/10/2025 22:30", "2025-10-15 10:30 AM", "2025-09-30 11:00 PM"]
+    normalizadas = [normalize_fecha_cita(texto) for texto in textos]
+
+    assert sorted(normalizadas, reverse=True) == normalizadas
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("2025-10-15", True),
+    (" 2025/10/15 ", True),
+    ("15/10/2025", True),
+    ("15-10-2025", True),
+    ("2025-10-15 00:00", False),
+    ("2025-10-15T10:30:00Z", False),
+    ("mañana", False),
+    ("", False),
+    (None, False),
+])
+def test_is_date_only(texto, esperado):
+    assert is_date_only(texto) is esperado
@@ -0,0 +1,93 @@
+import array
+
+import pytest
+
+from audio_mixer import ASSISTANT_CHANNEL, CALLER_CHANNEL, DualChannelMixer
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+
+    def writeframesraw(self, data):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+    def frames(self):
+        """[(llamante, asistente), ...]"""
+        samples = array.array('h', bytes(self.data))
+        return list(zip(samples[0::2], samples[1::2]))
+
+
+def pcm(*samples):
+    return array.array('h', samples).tobytes()
+
+
+@pytest.fixture
+def reloj():
+    return [0.0]
+
+
+@pytest.fixture
+def mixer(reloj):
+    # 10 muestras por segundo para que los frames se lean fácil
+    writer = FakeWriter()
+    return DualChannelMixer(writer, sample_rate=10, buffer_seconds=2.0, flush_seconds=0.5, jitter_seconds=0.0,
+                            start_time=0.0, clock=lambda: reloj[0])
+
+
+def test_canales_alineados_por_llegada(mixer):
+    mixer.write(CALLER_CHANNEL, pcm(1, 2, 3), arrival=0.0)
+    mixer.write(ASSISTANT_CHANNEL, pcm(7, 8), arrival=0.2)
+    mixer.close()
+
+    assert mixer.writer.frames() == [(1, 0), (2, 0), (3, 7), (0, 8)]
+    assert mixer.writer.closed
+
+
+def test_chunks_mas_rapidos_que_tiempo_real_van_seguidos(mixer):
+    # El asistente envía dos chunks a la vez: el segundo empieza cuando termina el primero
+    mixer.write(ASSISTANT_CHANNEL, pcm(1, 2), arrival=0.0)
+    mixer.write(ASSISTANT_CHANNEL, pcm(3, 4), arrival=0.0)
+    # Un hueco en la llegada queda en silencio
+    mixer.write(ASSISTANT_CHANNEL, pcm(5), arrival=0.6)
+    mixer.close()
+
+    assert [asistente for _, asistente in mixer.writer.frames()] == [1, 2, 3, 4, 0, 0, 5]
+
+
+def test_vuelca_por_bloques_segun_el_reloj(mixer, reloj):
+    mixer.write(CALLER_CHANNEL, pcm(*range(1, 5)), arrival=0.0)
+    assert mixer.frames_written == 0
+
+    reloj[0] = 0.6
+    mixer.write(CALLER_CHANNEL, pcm(5, 6), arrival=0.4)
+    assert mixer.frames_written == 6
+
+    mixer.close()
+    assert [llamante for llamante, _ in mixer.writer.frames()] == [1, 2, 3, 4, 5, 6]
+
+
+def test_buffer_lleno_fuerza_el_volcado(mixer):
+    mixer.write(CALLER_CHANNEL, pcm(*range(1, 16)), arrival=0.0)
+    mixer.write(CALLER_CHANNEL, pcm(*range(16, 31)), arrival=0.0)
+    mixer.close()
+
+    assert mixer.forced_flushes == 1
+    assert [llamante for llamante, _ in mixer.writer.frames()] == list(range(1, 31))
+
+
+def test_audio_tardio_no_reescribe_lo_volcado(mixer, reloj):
+    reloj[0] = 1.0
+    mixer.write(CALLER_CHANNEL, pcm(*range(1, 11)), arrival=0.0)
+    assert mixer.frames_written == 10
+
+    # Llega con un instante ya volcado: se ubica después
+    mixer.write(ASSISTANT_CHANNEL, pcm(9, 9), arrival=0.1)
+    mixer.write(CALLER_CHANNEL, b"\x01\x00\x02", arrival=1.0)  # byte impar descartado
+    mixer.close()
+
+    assert mixer.writer.frames()[10:] == [(1, 9), (0, 9)]
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from availability_index import AvailabilityIndex
+from appointment_dates import LOCAL_TIMEZONE
+from database import buscar_horarios_disponibles, crear_cita, eliminar_cita, rango_busqueda_horarios
+
+# Lunes, día de atención con la configuración por defecto
+DIA = "2030-01-07"
+
+
+def test_hasta_sin_hora_incluye_todo_el_dia():
+    inicio, fin = rango_busqueda_horarios(DIA, DIA)
+
+    assert inicio.astimezone(LOCAL_TIMEZONE) == datetime(2030, 1, 7, tzinfo=LOCAL_TIMEZONE)
+    assert fin.astimezone(LOCAL_TIMEZONE) == datetime(2030, 1, 8, tzinfo=LOCAL_TIMEZONE)
+
+
+def test_hasta_con_hora_es_exclusivo():
+    _, fin = rango_busqueda_horarios(DIA, f"{DIA} 10:00")
+
+    assert fin.astimezone(LOCAL_TIMEZONE) == datetime(2030, 1, 7, 10, 0, tzinfo=LOCAL_TIMEZONE)
+
+
+def test_buscar_horarios_de_un_solo_dia(db_path):
+    resultado = buscar_horarios_disponibles("Cali", desde=DIA, hasta=DIA, cantidad=10, db_path=db_path)
+
+    assert resultado["success"]
+    assert resultado["total_horarios"] == 10
+    assert resultado["horarios"][0]["fecha_cita"] == "2030-01-07 07:00 AM"
+    assert all(horario["fecha_cita"].startswith(DIA) for horario in resultado["horarios"])
+
+
+def test_horario_lleno_se_omite_y_se_libera_al_eliminar(db_path, sent_emails):
+    citas = [crear_cita(1, f"{DIA} 07:00 AM", "sangre", "Cali", db_path=db_path) for _ in range(5)]
+    assert all(cita["success"] for cita in citas)
+
+    resultado = buscar_horarios_disponibles("Cali", desde=DIA, hasta=DIA, cantidad=1, db_path=db_path)
+    assert resultado["horarios"][0]["fecha_cita"] == "2030-01-07 07:30 AM"
+
+    eliminar_cita(citas[0]["cita_id"], db_path=db_path)
+    resultado = buscar_horarios_disponibles("Cali", desde=DIA, hasta=DIA, cantidad=1, db_path=db_path)
+    assert resultado["horarios"][0] == {
+        "fecha_cita": "2030-01-07 07:00 AM",
+        "citas_programadas": 4,
+        "cupos_disponibles": 1
+    }
+
+
+def test_fecha_no_reconocida():
+    resultado = buscar_horarios_disponibles("Cali", desde="mañana temprano")
+
+    assert not resultado["success"]
+
+
+def test_indice_salta_fuera_del_horario_de_atencion():
+    index = AvailabilityIndex(slot_minutes=30, opening_hour=7, closing_hour=17, working_days=range(5))
+    index.rebuild(":memory:", [])
+
+    # Viernes 16:50 -> el siguiente horario es el lunes a las 7:00
+    desde = datetime(2030, 1, 4, 16, 50, tzinfo=LOCAL_TIMEZONE)
+    hasta = datetime(2030, 1, 8, tzinfo=LOCAL_TIMEZONE)
+    libres = index.find_open_slots("Cali", desde, hasta, cantidad=1, capacidad=5)
+
+    assert libres == [(datetime(2030, 1, 7, 7, 0, tzinfo=LOCAL_TIMEZONE), 0)]
+
+
+def test_indice_registra_altas_y_bajas():
+    index = AvailabilityIndex()
+    index.rebuild(":memory:", [("Cali", "2030-01-07T12:00:00Z", 2)])
+
+    index.record(":memory:", "Cali", "2030-01-07T12:00:00Z", +1)
+    index.record(":memory:", "Cali", "2030-01-07T12:30:00Z", +1)
+    index.record(":memory:", "Cali", "2030-01-07T12:30:00Z", -1)
+    # Otra base de datos no modifica el índice
+    index.record("otra.db", "Cali", "2030-01-07T12:00:00Z", +1)
+
+    assert index.booked("Cali", "2030-01-07T00:00:00Z", "2030-01-08T00:00:00Z") == {"2030-01-07T12:00:00Z": 3}
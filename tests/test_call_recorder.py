@@ -0,0 +1,39 @@
+import asyncio
+import logging
+import wave
+
+import pytest
+
+from call_recorder import CallRecorder
+from recording_sink import recording_sink
+
+PCM = bytes(480 * 2)  # 10 ms de silencio PCM16 24kHz
+
+
+def _grabar(tmp_path, dual_channel, caller_audio):
+    recorder = CallRecorder(recordings_dir=str(tmp_path), dual_channel=dual_channel, audio_format="wav",
+                            policy="full", deferred_audio=False)
+    recorder.start_recording("call_1")
+    recorder._store_audio(PCM, "assistant")
+    if caller_audio:
+        recorder.ingest_caller_audio(PCM)
+
+    async def main():
+        try:
+            return await recorder.save_recording()
+        finally:
+            await recording_sink.shutdown()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("dual_channel, caller_audio, avisa", [(True, False, True), (True, True, False),
+                                                               (False, False, False)])
+def test_aviso_de_canal_del_llamante_en_silencio(tmp_path, caplog, dual_channel, caller_audio, avisa):
+    with caplog.at_level(logging.WARNING, logger="call_recorder"):
+        results = _grabar(tmp_path, dual_channel, caller_audio)
+
+    assert "error" not in results
+    with wave.open(results["audio_file"]) as wav:
+        assert wav.getnchannels() == (2 if dual_channel else 1)
+    assert any("sin audio del llamante" in record.getMessage() for record in caplog.records) is avisa
@@ -0,0 +1,346 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import run_async
+
+
+@pytest.fixture
+def make_manager(tool_modules):
+    """FunctionManager con las tools y políticas de la prueba"""
+    def make(functions, policies=None):
+        tool_modules.available_functions.update(
+            {name: func for name, func in functions.items() if not asyncio.iscoroutinefunction(func)}
+        )
+        tool_modules.available_async_functions.update(
+            {name: func for name, func in functions.items() if asyncio.iscoroutinefunction(func)}
+        )
+        return tool_modules.FunctionManager(policies or {})
+    return make
+
+
+def test_funcion_inexistente_o_argumentos_invalidos(make_manager):
+    manager = make_manager({"eco": lambda texto: texto})
+
+    with pytest.raises(ValueError):
+        run_async(manager.execute_function("otra", "{}"))
+    with pytest.raises(ValueError):
+        run_async(manager.execute_function("eco", "{texto"))
+    assert run_async(manager.execute_function("eco", json.dumps({"texto": "hola"}))) == "hola"
+
+
+def test_tool_sincrona_corre_en_el_pool_de_su_clase(make_manager, tool_modules):
+    manager = make_manager(
+        {"hilo": lambda: threading.current_thread().name},
+        {"hilo": tool_modules.FunctionPolicy("network")}
+    )
+
+    assert run_async(manager.execute_function("hilo", "{}")).startswith("tool-network")
+
+
+def test_timeout_retorna_el_fallback(make_manager, tool_modules):
+    terminado = threading.Event()
+
+    def lenta():
+        time.sleep(0.3)
+        terminado.set()
+        return "tarde"
+
+    async def lenta_async():
+        await asyncio.sleep(5)
+
+    manager = make_manager({"lenta": lenta, "lenta_async": lenta_async}, {
+        "lenta": tool_modules.FunctionPolicy(timeout=0.05, fallback={"success": False, "error": "tarde"}),
+        "lenta_async": tool_modules.FunctionPolicy(timeout=0.05),
+    })
+
+    async def main():
+        inicio = time.monotonic()
+        resultados = await asyncio.gather(manager.execute_function("lenta", "{}"),
+                                          manager.execute_function("lenta_async", "{}"))
+        return resultados, time.monotonic() - inicio
+
+    (sincrona, asincrona), duracion = run_async(main())
+
+    assert sincrona == {"success": False, "error": "tarde"}
+    assert asincrona == {"error": "La función lenta_async no respondió a tiempo"}
+    assert duracion < 0.3
+    # El hilo no se puede cancelar: termina en segundo plano
+    assert terminado.wait(1)
+
+
+def test_limite_de_concurrencia(make_manager, tool_modules):
+    lock = threading.Lock()
+    estado = {"activas": 0, "maximo": 0}
+
+    def ocupada():
+        with lock:
+            estado["activas"] += 1
+            estado["maximo"] = max(estado["maximo"], estado["activas"])
+        time.sleep(0.02)
+        with lock:
+            estado["activas"] -= 1
+        return "ok"
+
+    manager = make_manager({"ocupada": ocupada}, {"ocupada": tool_modules.FunctionPolicy(max_concurrency=2)})
+
+    async def main():
+        return await asyncio.gather(*(manager.execute_function("ocupada", "{}") for _ in range(8)))
+
+    assert run_async(main()) == ["ok"] * 8
+    assert estado["maximo"] == 2
+
+
+def test_hilo_vencido_conserva_su_cupo(make_manager, tool_modules):
+    liberar = threading.Event()
+    llamadas = []
+
+    def colgada():
+        llamadas.append(threading.current_thread().name)
+        liberar.wait(1)
+        return "ok"
+
+    manager = make_manager({"colgada": colgada},
+                           {"colgada": tool_modules.FunctionPolicy(timeout=0.2, max_concurrency=1)})
+
+    async def main():
+        primera = await manager.execute_function("colgada", "{}")
+        # La segunda espera el cupo que el hilo vencido aún ocupa
+        segunda = asyncio.ensure_future(manager.execute_function("colgada", "{}"))
+        await asyncio.sleep(0.02)
+        assert len(llamadas) == 1
+        liberar.set()
+        return primera, await segunda
+
+    primera, segunda = run_async(main())
+
+    assert "error" in primera
+    assert segunda == "ok"
+    assert len(llamadas) == 2
+
+
+@pytest.fixture
+def reloj(tool_modules, monkeypatch):
+    """Reloj falso para el TTL del caché (solo en pruebas sin loop: asyncio usa time.monotonic)"""
+    ahora = [1000.0]
+    monkeypatch.setattr(tool_modules.time, "monotonic", lambda: ahora[0])
+    return ahora
+
+
+def test_cache_expira_por_ttl(tool_modules, reloj):
+    cache = tool_modules.ToolResultCache()
+    key = cache.make_key("obtener_usuario", {"identificacion": 1001})
+
+    cache.set(key, {"nombre": "Ana"}, ttl=30)
+    reloj[0] += 29
+    assert cache.get(key) == (True, {"nombre": "Ana"})
+
+    reloj[0] += 1
+    assert cache.get(key) == (False, None)
+    assert cache.get_metrics()["entries"] == 0
+    assert cache.get_metrics()["per_function"] == {"obtener_usuario": {"hits": 1, "misses": 1}}
+
+
+def test_cache_clave_con_argumentos_exactos(tool_modules):
+    make_key = tool_modules.ToolResultCache.make_key
+
+    assert make_key("f", {"ciudad": "Cali", "fecha": "2030-01-07"}) == \
+        make_key("f", {"fecha": "2030-01-07", "ciudad": "Cali"})
+    # Las tools comparan el texto tal cual: otra capitalización u otros espacios no reutilizan el resultado
+    assert make_key("f", {"ciudad": "Bogotá"}) != make_key("f", {"ciudad": "BOGOTÁ"})
+    assert make_key("f", {"ciudad": "Cali"}) != make_key("f", {"ciudad": " Cali "})
+    assert make_key("f", {"ciudad": "Cali"}) != make_key("g", {"ciudad": "Cali"})
+    assert make_key("f", {"ciudad": "Cali"}) != make_key("f", {"ciudad": "Bogotá"})
+
+
+def test_cache_lru(tool_modules):
+    cache = tool_modules.ToolResultCache(max_entries=2)
+    claves = [cache.make_key("f", {"n": n}) for n in range(3)]
+
+    cache.set(claves[0], 0, ttl=60)
+    cache.set(claves[1], 1, ttl=60)
+    cache.get(claves[0])
+    cache.set(claves[2], 2, ttl=60)
+
+    assert cache.get(claves[1]) == (False, None)
+    assert cache.get(claves[0]) == (True, 0)
+    assert cache.get_metrics()["evictions"] == 1
+
+
+def test_cache_invalidar_por_tool(tool_modules):
+    cache = tool_modules.ToolResultCache()
+    cache.set(cache.make_key("verificar_disponibilidad_citas", {"ciudad": "Cali"}), {"disponible": True}, ttl=60)
+    cache.set(cache.make_key("verificar_disponibilidad_citas", {"ciudad": "Bogotá"}), {"disponible": True}, ttl=60)
+    cache.set(cache.make_key("obtener_usuario", {"identificacion": 1001}), {"nombre": "Ana"}, ttl=60)
+
+    assert cache.invalidate(["verificar_disponibilidad_citas", "obtener_citas_activas_usuario"]) == 2
+    assert cache.get(cache.make_key("obtener_usuario", {"identificacion": 1001}))[0]
+    assert cache.get_metrics()["invalidations"] == 2
+
+
+def test_mayusculas_distintas_no_reutilizan_el_cache(make_manager, tool_modules):
+    agendadas = {"Bogotá": 5}
+
+    def disponibilidad(ciudad):
+        citas = agendadas.get(ciudad, 0)
+        return {"disponible": citas < 5, "citas_programadas": citas, "ciudad": ciudad}
+
+    manager = make_manager({"disponibilidad": disponibilidad},
+                           {"disponibilidad": tool_modules.FunctionPolicy(cache_ttl=30)})
+
+    async def main():
+        await manager.execute_function("disponibilidad", json.dumps({"ciudad": "BOGOTÁ"}))
+        return await manager.execute_function("disponibilidad", json.dumps({"ciudad": "Bogotá"}))
+
+    assert run_async(main()) == {"disponible": False, "citas_programadas": 5, "ciudad": "Bogotá"}
+    assert tool_modules.tool_cache.get_metrics()["hits"] == 0
+
+
+def test_escritura_invalida_las_lecturas(make_manager, tool_modules):
+    cupos = {"Cali": 5}
+
+    def disponibilidad(ciudad):
+        return {"disponible": cupos[ciudad] > 0, "cupos": cupos[ciudad]}
+
+    def reservar(ciudad):
+        cupos[ciudad] -= 1
+        return {"success": True}
+
+    def fallida(ciudad):
+        return {"success": False, "error": "sin cupo"}
+
+    manager = make_manager({"disponibilidad": disponibilidad, "reservar": reservar, "fallida": fallida}, {
+        "disponibilidad": tool_modules.FunctionPolicy(cache_ttl=60),
+        "reservar": tool_modules.FunctionPolicy(invalidates=["disponibilidad"]),
+        "fallida": tool_modules.FunctionPolicy(cache_ttl=60),
+    })
+    argumentos = json.dumps({"ciudad": "Cali"})
+
+    async def main():
+        antes = await manager.execute_function("disponibilidad", argumentos)
+        cupos["Cali"] = 1  # Reserva hecha por otra llamada: el caché todavía no la ve
+        cacheado = await manager.execute_function("disponibilidad", argumentos)
+        await manager.execute_function("reservar", argumentos)
+        despues = await manager.execute_function("disponibilidad", argumentos)
+        await manager.execute_function("fallida", argumentos)
+        await manager.execute_function("fallida", argumentos)
+        return antes, cacheado, despues
+
+    antes, cacheado, despues = run_async(main())
+
+    assert antes == cacheado == {"disponible": True, "cupos": 5}
+    assert despues == {"disponible": False, "cupos": 0}
+    # Los errores no se cachean
+    assert tool_modules.tool_cache.get_metrics()["per_function"]["fallida"] == {"hits": 0, "misses": 2}
+
+
+def test_crear_cita_invalida_las_citas_cacheadas(make_manager, tool_modules):
+    citas = []
+
+    def obtener_citas_activas_usuario(id_usuario, db_path):
+        return {"success": True, "citas": list(citas)}
+
+    def crear_cita(id_usuario, fecha_cita, db_path):
+        citas.append(fecha_cita)
+        return {"success": True}
+
+    manager = make_manager({"obtener_citas_activas_usuario": obtener_citas_activas_usuario, "crear_cita": crear_cita},
+                           tool_modules.FUNCTION_POLICIES)
+    # Como las envía el webhook de WhatsApp, con db_path
+    consulta = json.dumps({"id_usuario": 1, "db_path": "/srv/database.db"})
+
+    async def main():
+        antes = await manager.execute_function("obtener_citas_activas_usuario", consulta)
+        await manager.execute_function("crear_cita", json.dumps(
+            {"id_usuario": 1, "fecha_cita": "2030-01-07 10:00 AM", "db_path": "/srv/database.db"}
+        ))
+        return antes, await manager.execute_function("obtener_citas_activas_usuario", consulta)
+
+    antes, despues = run_async(main())
+
+    assert antes["citas"] == []
+    assert despues["citas"] == ["2030-01-07 10:00 AM"]
+
+
+@pytest.fixture
+def especulativa(make_manager, tool_modules):
+    llamadas = []
+
+    async def consultar(ciudad):
+        llamadas.append(ciudad)
+        await asyncio.sleep(0.01)
+        return {"ciudad": ciudad}
+
+    async def escribir(ciudad):
+        llamadas.append(ciudad)
+        return {"success": True}
+
+    manager = make_manager({"consultar": consultar, "escribir": escribir}, {
+        "consultar": tool_modules.FunctionPolicy(speculative=True),
+        "escribir": tool_modules.FunctionPolicy(),
+    })
+    return manager, llamadas
+
+
+def test_especulacion_se_aprovecha(especulativa, tool_modules):
+    manager, llamadas = especulativa
+    argumentos = json.dumps({"ciudad": "Cali"})
+
+    async def main():
+        assert manager.start_speculative("call_1", "consultar", argumentos)
+        # El mismo call_id no se inicia dos veces
+        assert not manager.start_speculative("call_1", "consultar", argumentos)
+        return await manager.run_function_call("call_1", "consultar", argumentos)
+
+    assert run_async(main()) == {"ciudad": "Cali"}
+    assert llamadas == ["Cali"]
+    assert tool_modules.speculation_metrics == {"started": 1, "used": 1, "discarded": 0}
+
+
+def test_especulacion_con_otros_argumentos_se_descarta(especulativa, tool_modules):
+    manager, llamadas = especulativa
+
+    async def main():
+        manager.start_speculative("call_1", "consultar", json.dumps({"ciudad": "Cali"}))
+        return await manager.run_function_call("call_1", "consultar", json.dumps({"ciudad": "Bogotá"}))
+
+    assert run_async(main()) == {"ciudad": "Bogotá"}
+    assert llamadas[-1] == "Bogotá"
+    assert tool_modules.speculation_metrics == {"started": 1, "used": 0, "discarded": 1}
+
+
+def test_solo_tools_especulativas(especulativa, tool_modules, monkeypatch):
+    manager, llamadas = especulativa
+    argumentos = json.dumps({"ciudad": "Cali"})
+
+    async def main():
+        assert not manager.start_speculative("call_1", "escribir", argumentos)
+        assert not manager.start_speculative("call_2", "otra", argumentos)
+        assert not manager.start_speculative("", "consultar", argumentos)
+        monkeypatch.setattr(tool_modules, "SPECULATIVE_TOOLS", False)
+        assert not manager.start_speculative("call_3", "consultar", argumentos)
+
+    run_async(main())
+    assert llamadas == []
+    assert tool_modules.speculation_metrics["started"] == 0
+
+
+def test_especulaciones_sin_reclamar_se_cancelan(especulativa, tool_modules):
+    manager, llamadas = especulativa
+
+    async def main():
+        manager.start_speculative("call_1", "consultar", json.dumps({"ciudad": "Cali"}))
+        manager.start_speculative("call_2", "consultar", json.dumps({"ciudad": "Bogotá"}))
+        tareas = [task for _, _, task in manager._speculative.values()]
+        await asyncio.sleep(0)
+        manager.cancel_speculative()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        return tareas
+
+    tareas = run_async(main())
+
+    assert all(task.cancelled() for task in tareas)
+    assert tool_modules.speculation_metrics["discarded"] == 2
@@ -0,0 +1,118 @@
+import sqlite3
+
+import pytest
+
+from init_db import MIGRATIONS, apply_migrations, get_schema_version
+
+
+def _objetos(path, tipo):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (tipo,))}
+    finally:
+        conn.close()
+
+
+def test_aplicar_migraciones_es_idempotente(tmp_path):
+    path = str(tmp_path / "test.db")
+    ultima = MIGRATIONS[-1][0]
+
+    assert apply_migrations(path) == ultima
+    esquema = _objetos(path, "table") | _objetos(path, "index") | _objetos(path, "trigger")
+
+    assert apply_migrations(path) == ultima
+    assert get_schema_version(path) == ultima
+    assert _objetos(path, "table") | _objetos(path, "index") | _objetos(path, "trigger") == esquema
+
+
+def test_migrar_hasta_una_version(tmp_path):
+    path = str(tmp_path / "test.db")
+
+    assert apply_migrations(path, target=2) == 2
+    assert {"idx_cita_ciudad_fecha", "idx_cita_usuario_fecha", "idx_examenes_usuario"} <= _objetos(path, "index")
+    assert "capacidad_horario" not in _objetos(path, "table")
+
+    assert apply_migrations(path) == MIGRATIONS[-1][0]
+    assert "capacidad_horario" in _objetos(path, "table")
+
+
+def test_base_existente_sin_version(tmp_path):
+    # Bases creadas por el init_db anterior: tablas presentes y user_version = 0
+    path = str(tmp_path / "test.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE usuarios (id INTEGER PRIMARY KEY AUTOINCREMENT, cedula TEXT UNIQUE, nombre TEXT, "
+                 "apellido TEXT, correo TEXT, direccion TEXT, time_creacion TIMESTAMP, time_update TIMESTAMP)")
+    conn.execute("INSERT INTO usuarios (cedula, nombre) VALUES ('1001', 'Ana')")
+    conn.commit()
+    conn.close()
+
+    assert apply_migrations(path) == MIGRATIONS[-1][0]
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT cedula, nombre FROM usuarios").fetchall() == [("1001", "Ana")]
+    conn.close()
+
+
+def test_migracion_fallida_no_cambia_la_version(tmp_path, monkeypatch):
+    path = str(tmp_path / "test.db")
+    apply_migrations(path, target=1)
+
+    def fallar(cursor):
+        cursor.execute("CREATE INDEX idx_parcial ON usuarios (cedula)")
+        raise RuntimeError("fallo a mitad de la migración")
+
+    monkeypatch.setattr("init_db.MIGRATIONS", [MIGRATIONS[0], (2, "Migración rota", fallar)])
+
+    with pytest.raises(RuntimeError):
+        apply_migrations(path)
+
+    assert get_schema_version(path) == 1
+    assert "idx_parcial" not in _objetos(path, "index")
+
+
+def test_backfill_de_fecha_cita_utc(tmp_path):
+    path = str(tmp_path / "test.db")
+    apply_migrations(path, target=3)
+
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO cita_examen_medico (id_usuario, fecha_cita, ciudad) VALUES (1, ?, ?)",
+        [("2025-10-15 10:30 AM", "Cali"),
+         ("2025-10-15 10:30", "Cali"),         # mismo horario, otro formato
+         ("15/10/2025 14:00", "Cali"),
+         ("2025-10-15 10:30 AM", "Bogotá"),
+         ("mañana temprano", "Cali"),
+         (None, "Cali")]
+    )
+    conn.commit()
+    conn.close()
+
+    assert apply_migrations(path) == 4
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT fecha_cita_utc FROM cita_examen_medico ORDER BY id").fetchall() == [
+            ("2025-10-15T15:30:00Z",), ("2025-10-15T15:30:00Z",), ("2025-10-15T19:00:00Z",),
+            ("2025-10-15T15:30:00Z",), (None,), (None,)
+        ]
+        # Los dos formatos del mismo horario comparten el contador; lo no reconocido conserva su texto
+        assert conn.execute("SELECT ciudad, horario, citas_agendadas FROM capacidad_horario ORDER BY 1, 2").fetchall() == [
+            ("Bogotá", "2025-10-15T15:30:00Z", 1),
+            ("Cali", "2025-10-15T15:30:00Z", 2),
+            ("Cali", "2025-10-15T19:00:00Z", 1),
+            ("Cali", "mañana temprano", 1),
+        ]
+        # Los triggers siguen el horario normalizado
+        conn.execute("INSERT INTO cita_examen_medico (id_usuario, fecha_cita, fecha_cita_utc, ciudad) "
+                     "VALUES (1, '2025-10-15 03:30 PM', '2025-10-15T19:00:00Z', 'Cali')")
+        conn.execute("DELETE FROM cita_examen_medico WHERE id = 1")
+        assert conn.execute("SELECT horario, citas_agendadas FROM capacidad_horario WHERE ciudad = 'Cali' "
+                            "ORDER BY 1").fetchall() == [
+            ("2025-10-15T15:30:00Z", 1), ("2025-10-15T19:00:00Z", 2), ("mañana temprano", 1)
+        ]
+    finally:
+        conn.close()
+
+    indices = _objetos(path, "index")
+    assert {"idx_cita_usuario_fecha_utc", "idx_cita_fecha_utc", "idx_cita_ciudad_fecha_utc"} <= indices
+    assert not {"idx_cita_ciudad_fecha", "idx_cita_usuario_fecha"} & indices
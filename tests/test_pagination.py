@@ -0,0 +1,115 @@
+import pytest
+
+import database
+import database_async
+from appointment_dates import normalize_fecha_cita
+from conftest import run_async
+from database import codificar_cursor_citas, consultas_pagina_citas, decodificar_cursor_citas, listar_citas_pagina
+
+
+@pytest.fixture
+def citas(db_path):
+    """150 citas en 30 horarios de dos ciudades (varias por horario) y 10 con fecha no reconocida"""
+    filas = []
+    for i in range(150):
+        fecha_cita = f"2030-01-{1 + i % 15:02d} {7 + i % 2}:00 AM"
+        filas.append((fecha_cita, normalize_fecha_cita(fecha_cita), "Cali" if i % 3 else "Bogotá"))
+    filas += [("por confirmar", None, "Cali" if i % 2 else "Bogotá") for i in range(10)]
+
+    # Directo a la tabla: el cupo por horario no aplica a estos datos de prueba
+    with database.connection_manager.transaction(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO cita_examen_medico (id_usuario, fecha_cita, fecha_cita_utc, ciudad) VALUES (1, ?, ?, ?)",
+            filas
+        )
+        rows = conn.execute("SELECT id, fecha_cita_utc, ciudad FROM cita_examen_medico").fetchall()
+    return db_path, rows
+
+
+def _orden_esperado(rows):
+    con_fecha = sorted((row for row in rows if row[1]), key=lambda row: (row[1], row[0]), reverse=True)
+    sin_fecha = sorted((row for row in rows if not row[1]), key=lambda row: row[0], reverse=True)
+    return [row[0] for row in con_fecha + sin_fecha]
+
+
+def _recorrer(db_path, limite, **filtros):
+    ids, despues, paginas = [], None, 0
+    while True:
+        pagina = listar_citas_pagina(despues=despues, limite=limite, db_path=db_path, **filtros)
+        paginas += 1
+        assert pagina["total"] == len(pagina["citas"]) <= limite
+        ids += [cita["id"] for cita in pagina["citas"]]
+        despues = pagina["siguiente"]
+        if not despues:
+            return ids, paginas
+
+
+@pytest.mark.parametrize("fecha_cita_utc, cita_id", [("2030-01-07T12:00:00Z", 42), (None, 7)])
+def test_cursor_ida_y_vuelta(fecha_cita_utc, cita_id):
+    cursor = codificar_cursor_citas(fecha_cita_utc, cita_id)
+
+    assert decodificar_cursor_citas(cursor) == (fecha_cita_utc, cita_id)
+
+
+@pytest.mark.parametrize("cursor", ["42", "2030-01-07T12:00:00Z~", "2030-01-07T12:00:00Z~abc", "~-1"])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError):
+        decodificar_cursor_citas(cursor)
+    with pytest.raises(ValueError):
+        consultas_pagina_citas(despues=cursor)
+
+
+def test_fecha_de_filtro_no_reconocida():
+    with pytest.raises(ValueError):
+        consultas_pagina_citas(desde="la otra semana")
+
+
+def test_recorrido_completo_sin_repetidos(citas):
+    db_path, rows = citas
+
+    ids, paginas = _recorrer(db_path, limite=37)
+
+    assert ids == _orden_esperado(rows)
+    assert paginas == 5
+
+
+def test_recorrido_exacto_sin_pagina_vacia(citas):
+    db_path, rows = citas
+
+    ids, paginas = _recorrer(db_path, limite=40)
+
+    assert ids == _orden_esperado(rows)
+    assert paginas == 4
+
+
+def test_filtro_por_ciudad(citas):
+    db_path, rows = citas
+
+    ids, _ = _recorrer(db_path, limite=25, ciudad="Bogotá")
+
+    assert ids == _orden_esperado([row for row in rows if row[2] == "Bogotá"])
+
+
+def test_filtro_por_fechas_excluye_sin_fecha(citas):
+    db_path, rows = citas
+    desde, hasta = "2030-01-03", "2030-01-10"
+
+    ids, _ = _recorrer(db_path, limite=11, ciudad="Cali", desde=desde, hasta=hasta)
+
+    inicio, fin = normalize_fecha_cita(desde), normalize_fecha_cita(hasta)
+    assert ids == _orden_esperado([row for row in rows if row[2] == "Cali" and row[1] and inicio <= row[1] < fin])
+
+
+def test_recorrido_async_igual_al_sincrono(citas):
+    db_path, rows = citas
+
+    async def recorrer():
+        return [pagina async for pagina in database_async.iterar_paginas_citas(limite=37, db_path=db_path)]
+
+    paginas = run_async(recorrer())
+
+    assert [cita["id"] for pagina in paginas for cita in pagina["citas"]] == _orden_esperado(rows)
+    assert [pagina["siguiente"] for pagina in paginas] == [
+        listar_citas_pagina(despues=despues, limite=37, db_path=db_path)["siguiente"]
+        for despues in [None] + [pagina["siguiente"] for pagina in paginas[:-1]]
+    ]
@@ -0,0 +1,113 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from range_response import parse_range, ranged_file_response
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "grabacion_audio.opus"
+    path.write_bytes(CONTENT)
+
+    app = FastAPI()
+
+    @app.get("/audio")
+    async def audio(request: Request):
+        return ranged_file_response(request, str(path), media_type="audio/ogg", filename=path.name)
+
+    return TestClient(app)
+
+
+def test_archivo_completo(client):
+    response = client.get("/audio")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-disposition"].startswith("inline")
+    assert "etag" in response.headers and "last-modified" in response.headers
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=0-9", 0, 9),
+    ("bytes=-10", 1014, 1023),        # sufijo: los últimos 10 bytes
+    ("bytes=1000-", 1000, 1023),      # abierto hasta el final
+    ("bytes=1000-5000", 1000, 1023),  # el fin se recorta al tamaño
+])
+def test_rango_simple(client, range_header, start, end):
+    response = client.get("/audio", headers={"Range": range_header})
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert response.content == CONTENT[start:end + 1]
+
+
+def test_rango_no_satisfacible(client):
+    response = client.get("/audio", headers={"Range": "bytes=5000-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_varios_rangos_se_sirve_completo(client):
+    # Un solo rango es lo que pide un reproductor al hacer seek; con varios se ignora Range
+    response = client.get("/audio", headers={"Range": "bytes=0-1,10-11"})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+@pytest.mark.parametrize("range_header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=-10", (1014, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    (" bytes=5-5 ", (5, 5)),
+    ("bytes=1024-", None),
+    ("bytes=10-5", None),
+    ("bytes=-0", None),
+])
+def test_parse_range(range_header, expected):
+    assert parse_range(range_header, len(CONTENT)) == expected
+
+
+def test_parse_range_archivo_vacio():
+    assert parse_range("bytes=-10", 0) is None
+    assert parse_range("bytes=0-", 0) is None
+
+
+@pytest.mark.parametrize("range_header", ["bytes=0-1,10-11", "bytes=-", "items=0-9", "bytes=a-b"])
+def test_parse_range_no_soportado(range_header):
+    with pytest.raises(ValueError):
+        parse_range(range_header, len(CONTENT))
+
+
+def test_if_none_match(client):
+    etag = client.get("/audio").headers["etag"]
+
+    response = client.get("/audio", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert client.get("/audio", headers={"If-None-Match": '"otro"'}).status_code == 200
+
+
+def test_if_modified_since(client):
+    last_modified = client.get("/audio").headers["last-modified"]
+
+    assert client.get("/audio", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/audio", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+
+
+def test_if_range_con_etag_distinto_envia_completo(client):
+    etag = client.get("/audio").headers["etag"]
+
+    assert client.get("/audio", headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    response = client.get("/audio", headers={"Range": "bytes=0-9", "If-Range": '"viejo"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import pytest
+
+from call_recorder import RecorderPool
+from recordings_catalog import RecordingsCatalog
+
+
+def _entrada(n, call_id="call_1"):
+    return {
+        "base_name": f"20300107_1{n:05d}_{call_id}",
+        "call_id": call_id,
+        "started_at": f"2030-01-07T10:{n // 60:02d}:{n % 60:02d}",
+        "duration_seconds": float(n),
+        "total_messages": n,
+        "summary_file": f"20300107_1{n:05d}_{call_id}_summary.txt",
+    }
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = RecordingsCatalog(str(tmp_path))
+    for n in range(5):
+        catalog.add(_entrada(n, call_id="call_1" if n % 2 else "call_2"))
+    yield catalog
+    catalog.close()
+
+
+@pytest.mark.parametrize("limit, offset, esperadas", [(2, 0, 2), (0, 0, 1), (-1, 0, 1), (5000, 0, 5), (10, -3, 5)])
+def test_limit_y_offset_acotados(catalog, limit, offset, esperadas):
+    page = catalog.list(limit=limit, offset=offset)
+
+    assert page["total"] == 5
+    assert len(page["recordings"]) == esperadas
+
+
+def test_filtro_y_orden(catalog):
+    page = catalog.list(call_id="call_1", sort="duration", order="asc")
+
+    assert [recording["duration_seconds"] for recording in page["recordings"]] == [1.0, 3.0]
+    assert page["recordings"][0]["timestamp"] == "20300107_100001"
+
+
+def test_pool_consulta_el_catalogo_fuera_del_loop(tmp_path, monkeypatch):
+    pool = RecorderPool(recordings_dir=str(tmp_path))
+    pool.catalog.add(_entrada(1))
+    hilos = []
+
+    for name in ("list", "delete"):
+        original = getattr(pool.catalog, name)
+
+        def registrar(*args, _original=original, **kwargs):
+            hilos.append(threading.current_thread() is threading.main_thread())
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(pool.catalog, name, registrar)
+
+    async def main():
+        page = await pool.get_recordings_list(limit=10)
+        borrada = await pool.delete_recording(page["recordings"][0]["base_name"])
+        return page["total"], borrada, (await pool.get_recordings_list())["total"]
+
+    assert asyncio.run(main()) == (1, True, 0)
+    assert hilos == [False, False, False]
+    pool.catalog.close()
+
+
+def test_pool_abre_el_catalogo_al_usarlo(tmp_path):
+    recordings_dir = tmp_path / "recordings"
+    pool = RecorderPool(recordings_dir=str(recordings_dir))
+    assert not recordings_dir.exists()
+
+    catalog = pool.open_catalog()
+
+    assert (recordings_dir / "catalog.db").exists()
+    assert pool.catalog is catalog
+    catalog.close()
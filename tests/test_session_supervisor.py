@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from event_bus import event_bus
+from session_supervisor import CALLS_TOPIC, SessionSupervisor
+
+
+async def _llamada(terminar: asyncio.Event):
+    await terminar.wait()
+
+
+@pytest.fixture
+def eventos():
+    subscription = event_bus.subscribe(CALLS_TOPIC)
+    yield subscription
+    subscription.close()
+
+
+def test_reserva_cuenta_en_la_capacidad():
+    supervisor = SessionSupervisor(max_concurrent_calls=2)
+
+    assert supervisor.reserve("call_1")
+    assert not supervisor.reserve("call_1")  # webhook duplicado
+    assert supervisor.is_known("call_1")
+    assert supervisor.reserve("call_2")
+    assert not supervisor.has_capacity()
+    assert not supervisor.reserve("call_3")
+
+    supervisor.release_reservation("call_2")
+    assert not supervisor.is_known("call_2")
+    assert supervisor.reserve("call_3")
+
+
+def test_start_session_consume_la_reserva(eventos):
+    supervisor = SessionSupervisor(max_concurrent_calls=1)
+
+    async def main():
+        terminar = asyncio.Event()
+        assert supervisor.reserve("call_1")
+        # Con el único cupo reservado, la llamada reservada igual arranca
+        task = supervisor.start_session("call_1", _llamada(terminar))
+        assert task is not None
+        assert supervisor.active_count == 1 and not supervisor._reserved
+        assert supervisor.get_live_sessions()[0]["call_id"] == "call_1"
+
+        # Ya existe: no se crea otra sesión y la corrutina se cierra
+        duplicada = _llamada(terminar)
+        assert supervisor.start_session("call_1", duplicada) is None
+        assert duplicada.cr_frame is None
+
+        terminar.set()
+        await task
+        await asyncio.sleep(0)
+        return supervisor.active_count
+
+    assert asyncio.run(main()) == 0
+    tipos = [eventos.queue.get_nowait()["type"] for _ in range(eventos.queue.qsize())]
+    assert tipos == ["call.started", "call.ended"]
+
+
+def test_sin_reserva_respeta_la_capacidad():
+    supervisor = SessionSupervisor(max_concurrent_calls=1)
+
+    async def main():
+        terminar = asyncio.Event()
+        assert supervisor.reserve("call_1")
+        # El cupo está reservado por otra llamada
+        assert supervisor.start_session("call_2", _llamada(terminar)) is None
+        task = supervisor.start_session("call_1", _llamada(terminar))
+        terminar.set()
+        await task
+
+    asyncio.run(main())
+
+
+def test_cancelar_y_apagar():
+    supervisor = SessionSupervisor(shutdown_timeout=1)
+
+    async def main():
+        terminar = asyncio.Event()
+        tareas = [supervisor.start_session(f"call_{n}", _llamada(terminar)) for n in range(3)]
+
+        assert await supervisor.cancel_session("call_0")
+        assert not await supervisor.cancel_session("call_0")
+        assert tareas[0].cancelled()
+
+        await supervisor.shutdown()
+        assert all(task.cancelled() for task in tareas)
+        assert not supervisor.has_capacity()
+        assert not supervisor.reserve("call_9")
+        return supervisor.active_count
+
+    assert asyncio.run(main()) == 0
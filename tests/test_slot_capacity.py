@@ -0,0 +1,77 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import database_async
+from conftest import run_async
+from database import MAX_CITAS_POR_HORARIO
+
+FECHA = "2030-01-07 10:00 AM"
+
+
+def _contador(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT citas_agendadas FROM capacidad_horario WHERE ciudad = 'Cali'").fetchall()
+    finally:
+        conn.close()
+
+
+def test_reservas_concurrentes_respetan_el_cupo(db_path, sent_emails):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        resultados = list(executor.map(
+            lambda _: database.crear_cita(1, FECHA, "sangre", "Cali", db_path=db_path), range(20)
+        ))
+
+    exitosas = [r for r in resultados if r["success"]]
+    rechazadas = [r for r in resultados if not r["success"]]
+    assert len(exitosas) == MAX_CITAS_POR_HORARIO
+    assert all(r["citas_programadas"] == MAX_CITAS_POR_HORARIO for r in rechazadas)
+    assert len(sent_emails) == MAX_CITAS_POR_HORARIO
+    assert _contador(db_path) == [(MAX_CITAS_POR_HORARIO,)]
+
+
+def test_reservas_concurrentes_async_respetan_el_cupo(db_path, sent_emails, tool_modules):
+    async def reservar():
+        return await asyncio.gather(*(
+            database_async.crear_cita(1, FECHA, "sangre", "Cali", db_path=db_path) for _ in range(20)
+        ))
+
+    resultados = run_async(reservar())
+
+    assert sum(r["success"] for r in resultados) == MAX_CITAS_POR_HORARIO
+    assert len(sent_emails) == MAX_CITAS_POR_HORARIO
+    assert _contador(db_path) == [(MAX_CITAS_POR_HORARIO,)]
+
+
+def test_disponibilidad_refleja_el_contador(db_path, sent_emails):
+    for _ in range(MAX_CITAS_POR_HORARIO - 1):
+        database.crear_cita(1, FECHA, "sangre", "Cali", db_path=db_path)
+
+    disponibilidad = database.verificar_disponibilidad_citas(FECHA, "Cali", db_path=db_path)
+    assert disponibilidad["citas_programadas"] == MAX_CITAS_POR_HORARIO - 1
+    assert disponibilidad["disponible"]
+
+    database.crear_cita(1, FECHA, "sangre", "Cali", db_path=db_path)
+    assert not database.verificar_disponibilidad_citas(FECHA, "Cali", db_path=db_path)["disponible"]
+    # Otra ciudad no comparte el cupo
+    assert database.crear_cita(1, FECHA, "sangre", "Bogotá", db_path=db_path)["success"]
+
+
+def test_eliminar_cita_libera_el_cupo(db_path, sent_emails):
+    citas = [database.crear_cita(1, FECHA, "sangre", "Cali", db_path=db_path) for _ in range(MAX_CITAS_POR_HORARIO)]
+    assert not database.crear_cita(1, FECHA, "sangre", "Cali", db_path=db_path)["success"]
+
+    database.eliminar_cita(citas[0]["cita_id"], db_path=db_path)
+
+    assert _contador(db_path) == [(MAX_CITAS_POR_HORARIO - 1,)]
+    assert database.crear_cita(1, FECHA, "sangre", "Cali", db_path=db_path)["success"]
+
+
+def test_usuario_inexistente_no_ocupa_cupo(db_path, sent_emails):
+    resultado = database.crear_cita(99, FECHA, "sangre", "Cali", db_path=db_path)
+
+    assert not resultado["success"]
+    assert _contador(db_path) == []
+    assert sent_emails == []
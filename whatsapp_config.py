@@ -79,6 +79,7 @@ Para información detallada sobre historia, tecnología, paquetes de servicios,
 
 ## Gestión de Citas
 **`verificar_disponibilidad_citas`** - Verificar disponibilidad para agendar
+**`buscar_horarios_disponibles`** - Próximos horarios con cupo en una ciudad (úsala si no hay hora exacta o la pedida no está disponible, en vez de probar horario por horario)
 **`crear_cita`** - Agendar cita nueva (envía correo de confirmación automáticamente)
 **`eliminar_cita`** - Cancelar una cita existente
 